@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useCallback } from 'react';
+import React, { useState, useEffect, useCallback, useRef } from 'react';
 import {
   Box,
   AppBar,
@@ -37,7 +37,9 @@ const App = () => {
   const [activeRoom, setActiveRoom] = useState(null);
   const [chatSummary, setChatSummary] = useState(null);
   const [messages, setMessages] = useState([]);
-  const [pendingChatHistory, setPendingChatHistory] = useState([]);
+  const [historyCursor, setHistoryCursor] = useState(null);
+  const [loadingHistory, setLoadingHistory] = useState(false);
+  const activeRoomRef = useRef(null);
 
   // UI state
   const [loading, setLoading] = useState(false);
@@ -145,34 +147,40 @@ const App = () => {
         });
       });
 
-      socketManager.on('chat_history', (data) => {
-        console.log('Chat history received:', data);
-        console.log('Data session_id:', data.session_id);
-        
-        // Always store chat history temporarily first, then process based on activeRoom
-        setPendingChatHistory(prev => {
-          // Check if this message already exists in pending history
-          const exists = prev.some(msg => 
-            msg.content === data.content && 
-            msg.timestamp === data.timestamp && 
-            msg.role === data.role
-          );
-          
-          if (exists) {
-            console.log('Chat history message already exists in pending, skipping');
-            return prev;
-          }
-          
-          console.log('Storing chat history temporarily');
-          return [...prev, {
-            role: data.role,
-            content: data.content,
-            timestamp: data.timestamp,
-            session_id: data.session_id,
-            message_type: data.message_type,
-            metadata: data.metadata
-          }];
+      // Handshake: the server confirms the join, then we ask for history
+      socketManager.on('agent_room_joined', (data) => {
+        if (activeRoomRef.current?.roomId !== data.roomId) {
+          return;
+        }
+        setLoadingHistory(true);
+        socketManager.requestChatHistory(data.roomId);
+      });
+
+      socketManager.on('chat_history_batch', (data) => {
+        if (activeRoomRef.current?.roomId !== data.roomId) {
+          console.log('Chat history for another room, skipping');
+          return;
+        }
+
+        // Each batch is older than everything already shown
+        setMessages(prev => {
+          const messageKey = msg => `${msg.role}|${msg.timestamp}|${msg.content}`;
+          const known = new Set(prev.map(messageKey));
+          const older = data.messages
+            .filter(msg => !known.has(messageKey(msg)))
+            .map(msg => ({
+              id: msg.id,
+              role: msg.role,
+              content: msg.content,
+              timestamp: msg.timestamp,
+              session_id: msg.session_id,
+              message_type: msg.message_type,
+              metadata: msg.metadata
+            }));
+          return [...older, ...prev];
         });
+        setHistoryCursor(data.next_cursor);
+        setLoadingHistory(false);
       });
 
       socketManager.on('session_closed', (data) => {
@@ -214,33 +222,9 @@ const App = () => {
     };
   }, []);
 
-  // Process pending chat history when activeRoom is set
   useEffect(() => {
-    if (activeRoom && pendingChatHistory.length > 0) {
-      console.log('Processing pending chat history:', pendingChatHistory.length, 'messages');
-      setMessages(prev => {
-        const newMessages = [...prev];
-        
-        // Add pending messages that don't already exist
-        pendingChatHistory.forEach(pendingMsg => {
-          const exists = newMessages.some(msg => 
-            msg.content === pendingMsg.content && 
-            msg.timestamp === pendingMsg.timestamp && 
-            msg.role === pendingMsg.role
-          );
-          
-          if (!exists) {
-            newMessages.push(pendingMsg);
-          }
-        });
-        
-        return newMessages;
-      });
-      
-      // Clear pending chat history
-      setPendingChatHistory([]);
-    }
-  }, [activeRoom, pendingChatHistory]);
+    activeRoomRef.current = activeRoom;
+  }, [activeRoom]);
 
   const showNotification = useCallback((message, severity = 'info') => {
     setNotification({ open: true, message, severity });
@@ -293,10 +277,10 @@ const App = () => {
     const escalation = escalations.find(esc => esc.roomId === roomId);
     console.log('Found escalation:', escalation);
     
-    // Clear messages and pending chat history first
-    console.log('Clearing messages array and pending chat history');
+    // Clear messages and history paging first
+    console.log('Clearing messages array and history cursor');
     setMessages([]);
-    setPendingChatHistory([]);
+    setHistoryCursor(null);
     
     // Set as active room
     const newActiveRoom = {
@@ -312,6 +296,7 @@ const App = () => {
     };
     console.log('Setting active room:', newActiveRoom);
     setActiveRoom(newActiveRoom);
+    activeRoomRef.current = newActiveRoom;
     
     // Fetch session summary
     if (escalation?.sessionId) {
@@ -344,6 +329,14 @@ const App = () => {
     showNotification(`Joined room ${roomId}`, 'success');
   }, [escalations, showNotification]);
 
+  const handleLoadOlder = useCallback(() => {
+    if (!activeRoom || historyCursor === null || loadingHistory) {
+      return;
+    }
+    setLoadingHistory(true);
+    socketManager.requestChatHistory(activeRoom.roomId, historyCursor);
+  }, [activeRoom, historyCursor, loadingHistory]);
+
   const handleSendMessage = useCallback((roomId, message) => {
     if (!socketManager.isConnected()) {
       showNotification('Not connected to server', 'error');
@@ -505,6 +498,9 @@ const App = () => {
                   onSendMessage={handleSendMessage}
                   onCloseSession={handleCloseSession}
                   onJoinRoom={handleJoinRoom}
+                  hasOlderMessages={historyCursor !== null}
+                  loadingOlder={loadingHistory}
+                  onLoadOlder={handleLoadOlder}
                   isConnected={isConnected}
                   loading={loading}
                 />
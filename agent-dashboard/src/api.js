@@ -32,8 +32,9 @@ class ApiService {
   }
 
   // Escalation endpoints
-  async getEscalations(status = 'pending', limit = 50) {
-    return this.request(`/escalations?status=${status}&limit=${limit}`);
+  async getEscalations(status = 'pending', limit = 50, cursor = null) {
+    const cursorParam = cursor ? `&cursor=${encodeURIComponent(cursor)}` : '';
+    return this.request(`/escalations?status=${status}&limit=${limit}${cursorParam}`);
   }
 
   async assignEscalation(escalationId, agentId) {
@@ -29,6 +29,9 @@ const ChatWindow = ({
   onSendMessage,
   onCloseSession, 
   onJoinRoom,
+  hasOlderMessages = false,
+  loadingOlder = false,
+  onLoadOlder,
   isConnected,
   loading 
 }) => {
@@ -36,6 +39,7 @@ const ChatWindow = ({
   const [isTyping, setIsTyping] = useState(false);
   const messagesEndRef = useRef(null);
   const inputRef = useRef(null);
+  const lastMessageRef = useRef(null);
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
@@ -47,9 +51,13 @@ const ChatWindow = ({
     }
   }, [activeRoom]);
 
-  // Scroll to bottom when messages change
+  // Scroll to bottom when a new message arrives, but not when older history is prepended
   useEffect(() => {
-    scrollToBottom();
+    const lastMessage = messages[messages.length - 1];
+    if (lastMessage !== lastMessageRef.current) {
+      lastMessageRef.current = lastMessage;
+      scrollToBottom();
+    }
   }, [messages]);
 
   const handleSendMessage = () => {
@@ -222,8 +230,20 @@ const ChatWindow = ({
       }}>
         {messages.length > 0 ? (
           <List sx={{ p: 0 }}>
+            {hasOlderMessages && (
+              <Box sx={{ display: 'flex', justifyContent: 'center', mb: 1 }}>
+                <Button
+                  size="small"
+                  onClick={onLoadOlder}
+                  disabled={loadingOlder || !isConnected}
+                  startIcon={loadingOlder ? <CircularProgress size={14} /> : null}
+                >
+                  {loadingOlder ? 'Loading...' : 'Load older messages'}
+                </Button>
+              </Box>
+            )}
             {messages.map((msg, index) => (
-              <ListItem key={index} sx={{ 
+              <ListItem key={msg.id ? `msg_${msg.id}` : `local_${index}`} sx={{ 
                 display: 'flex', 
                 justifyContent: getMessageAlignment(msg.role),
                 mb: 1,
@@ -13,7 +13,8 @@ class SocketManager {
     }
 
     this.socket = io(serverUrl, {
-      transports: ['polling', 'websocket'],
+      // WebSocket first: it does not need sticky sessions across server workers
+      transports: ['websocket', 'polling'],
       autoConnect: true,
       upgrade: true,
       rememberUpgrade: true,
@@ -97,9 +98,14 @@ class SocketManager {
       this.emit('agent_left', data);
     });
 
-    this.socket.on('chat_history', (data) => {
-      console.log('Chat history received:', data);
-      this.emit('chat_history', data);
+    this.socket.on('agent_room_joined', (data) => {
+      console.log('Room joined, ready for history:', data);
+      this.emit('agent_room_joined', data);
+    });
+
+    this.socket.on('chat_history_batch', (data) => {
+      console.log('Chat history batch received:', data.messages?.length, 'messages');
+      this.emit('chat_history_batch', data);
     });
 
     this.socket.on('new_message', (data) => {
@@ -133,25 +139,29 @@ class SocketManager {
     }
 
     try {
-      // Add a small delay to ensure connection is stable
-      setTimeout(() => {
-        if (this.socket && this.socket.connected) {
-          this.socket.emit('agent_join_room', {
-            roomId,
-            agentId,
-            timestamp: new Date().toISOString()
-          });
-          
-          console.log(`Agent ${agentId} joining room ${roomId}`);
-        } else {
-          console.error('Socket disconnected during join attempt');
-        }
-      }, 100);
+      this.socket.emit('agent_join_room', {
+        roomId,
+        agentId,
+        timestamp: new Date().toISOString()
+      });
+
+      console.log(`Agent ${agentId} joining room ${roomId}`);
     } catch (error) {
       console.error('Error joining room:', error);
     }
   }
 
+  // Request a page of chat history; without a cursor the server sends the
+  // current escalation context, with one it sends the next older page
+  requestChatHistory(roomId, cursor = null) {
+    if (!this.socket || !this.connected) {
+      console.error('Socket not connected');
+      return;
+    }
+
+    this.socket.emit('request_chat_history', { roomId, cursor });
+  }
+
   // Leave a chat room
   leaveRoom(roomId, agentId = 'agent_001') {
     if (!this.socket || !this.connected) {
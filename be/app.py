@@ -15,12 +15,16 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-from utils.db import db, init_db, get_db_uri
+from utils.db import db, get_db_uri, check_db_connection
+from utils.migrations import run_migrations
+from utils.socketio_manager import create_client_manager
 from models import *
 
 from routes import chat_bp, admin_bp
 
 from services.websocket_service import WebSocketService
+from services.registry import service_registry
+from services.ingestion_jobs import ingestion_job_manager
 
 def create_app():
     """Create and configure Flask application"""
@@ -35,13 +39,19 @@ def create_app():
     db.init_app(app)
     CORS(app, origins="*")
     
-    # Initialize Socket.IO
+    # Initialize Socket.IO. With SOCKETIO_MESSAGE_QUEUE set, emits to rooms are
+    # relayed through the queue so every worker reaches its own clients.
+    # Long-polling needs sticky sessions across workers; without them only
+    # WebSocket connections are accepted.
+    sticky_sessions = os.getenv('SOCKETIO_STICKY_SESSIONS', 'true').lower() == 'true'
     socketio = SocketIO(
         app, 
+        async_mode=os.getenv('SOCKETIO_ASYNC_MODE', 'threading'),
+        client_manager=create_client_manager(),
         cors_allowed_origins="*",
         logger=True,
         engineio_logger=True,
-        transports=['polling', 'websocket'],
+        transports=['polling', 'websocket'] if sticky_sessions else ['websocket'],
         allow_upgrades=True,
         ping_timeout=60,
         ping_interval=25,
@@ -52,14 +62,18 @@ def create_app():
     # Initialize WebSocket service
     websocket_service = WebSocketService(socketio)
     
+    # PDF uploads are extracted and indexed by background ingestion workers
+    ingestion_job_manager.bind(socketio)
+    ingestion_job_manager.start()
+    
     # Register blueprints
     app.register_blueprint(chat_bp)
     app.register_blueprint(admin_bp)
     
-    # Initialize database
+    # Initialize database and apply pending schema migrations
     with app.app_context():
-        db.create_all()
-        print("Database tables created successfully")
+        applied = run_migrations()
+        print(f"Database ready ({len(applied)} migrations applied)")
     
     # Routes
     @app.route('/')
@@ -70,22 +84,37 @@ def create_app():
             'endpoints': {
                 'chat': '/api/ask, /api/escalate, /api/sessions',
                 'admin': '/api/ingest, /api/users, /api/agents',
+                'health': '/api/health, /api/health/ready, /api/status',
                 'websocket': 'Connect to /socket.io/ for real-time chat'
             }
         }
     
     @app.route('/api/status')
     def status():
+        services = service_registry.status()
         return {
-            'status': 'operational',
+            'status': 'operational' if service_registry.is_ready() else 'starting',
             'services': {
-                'database': 'connected',
-                'rag': 'ready',
-                'llm': 'ready',
+                'database': check_db_connection(),
+                'rag': services['rag']['state'],
+                'llm': services['llm']['state'],
                 'escalation': 'ready'
+            },
+            'warmup': services,
+            'uptime_seconds': service_registry.uptime_seconds(),
+            'chat_queue': websocket_service.task_queue.stats(),
+            'ingestion': ingestion_job_manager.stats(),
+            'socketio': {
+                'async_mode': socketio.async_mode,
+                'message_queue': type(socketio.server.manager).__name__
             }
         }
     
+    # Load models, the vector store and documents in the background so the
+    # app answers health checks immediately; without warm-up they load on first use
+    if service_registry.warmup_enabled:
+        service_registry.warm_up(['pdf', 'llm', 'rag'])
+    
     return app, socketio
 
 def main():
@@ -99,6 +128,7 @@ def main():
     print(f"Starting AI-powered Telecom Support Chatbot...")
     print(f"Debug mode: {debug}")
     print(f"Port: {port}")
+    print(f"Async mode: {socketio.async_mode}")
     
     socketio.run(
         app,
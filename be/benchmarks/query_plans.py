@@ -0,0 +1,194 @@
+"""
+Query-plan check and timing for the hot chat queries.
+
+Seeds a temporary SQLite database, runs EXPLAIN QUERY PLAN on the queries
+used by chat history loading, session summaries, escalation listings and
+session listings, and fails if any of them scans a table or sorts in a
+temporary B-tree instead of using the expected index.
+
+Usage (from the ``be`` directory):
+    python benchmarks/query_plans.py [--sessions 2000] [--messages 20]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import func, and_, or_
+from utils.db import db
+from utils.migrations import run_migrations
+from models.chat_models import ChatSession, ChatMessage, Escalation
+from models.user_models import User
+from services.escalation_service import escalation_service
+
+def create_app(database_uri):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+def seed(sessions, messages_per_session):
+    start = datetime.utcnow() - timedelta(days=30)
+    statuses = ['active', 'escalated', 'closed']
+    escalation_statuses = ['pending', 'handled', 'resolved']
+
+    db.session.execute(User.__table__.insert(), [
+        {'user_id': f'user_{i}', 'name': f'User {i}', 'created_at': start}
+        for i in range(sessions)
+    ])
+    db.session.execute(ChatSession.__table__.insert(), [
+        {
+            'id': i + 1, 'session_id': f'session_{i}', 'user_id': f'user_{i}', 'room_id': f'room_{i}',
+            'status': statuses[i % 3], 'created_at': start + timedelta(minutes=i), 'updated_at': start
+        }
+        for i in range(sessions)
+    ])
+    db.session.execute(ChatMessage.__table__.insert(), [
+        {
+            'session_id': i + 1, 'role': 'user' if j % 2 == 0 else 'ai', 'content': f'message {j}',
+            'timestamp': start + timedelta(minutes=i, seconds=j * 10),
+            'message_type': 'escalation' if j == messages_per_session - 1 else 'text'
+        }
+        for i in range(sessions) for j in range(messages_per_session)
+    ])
+    db.session.execute(Escalation.__table__.insert(), [
+        {
+            'session_id': i + 1, 'reason': 'Frustration detected', 'priority': 'medium',
+            'status': escalation_statuses[i % 3], 'triggered_at': start + timedelta(minutes=i),
+            'created_at': start + timedelta(minutes=i)
+        }
+        for i in range(sessions)
+    ])
+    db.session.commit()
+
+
+def hot_queries(session_id, since):
+    """The queries issued by the services and routes, keyed by the index each should use"""
+    return {
+        'session history (summaries)': (
+            'ix_chat_messages_session_timestamp',
+            ChatMessage.query.filter_by(session_id=session_id).order_by(ChatMessage.timestamp.asc())
+        ),
+        'escalation context (agent join)': (
+            'ix_chat_messages_session_timestamp',
+            ChatMessage.query.filter(
+                ChatMessage.session_id == session_id,
+                or_(ChatMessage.message_type != 'escalation', ChatMessage.escalation_id == 1),
+                ChatMessage.timestamp >= since
+            ).order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc()).limit(50)
+        ),
+        'older history page (agent load older)': (
+            'ix_chat_messages_session_id_id',
+            ChatMessage.query.filter(
+                ChatMessage.session_id == session_id,
+                or_(ChatMessage.message_type != 'escalation', ChatMessage.escalation_id == 1),
+                ChatMessage.id < 10000
+            ).order_by(ChatMessage.id.desc()).limit(50)
+        ),
+        'latest message id (summary cache)': (
+            'ix_chat_messages_session_id_id',
+            db.session.query(func.max(ChatMessage.id)).filter(ChatMessage.session_id == session_id)
+        ),
+        'pending escalations (listing)': (
+            'ix_escalations_status_created_at_id',
+            db.session.query(Escalation.id, ChatSession.room_id, User.name).join(
+                ChatSession, ChatSession.id == Escalation.session_id
+            ).outerjoin(
+                User, User.user_id == ChatSession.user_id
+            ).filter(Escalation.status == 'pending').order_by(
+                Escalation.created_at.desc(), Escalation.id.desc()
+            ).limit(51)
+        ),
+        'pending escalations (next page)': (
+            'ix_escalations_status_created_at_id',
+            db.session.query(Escalation.id).filter(
+                Escalation.status == 'pending',
+                or_(Escalation.created_at < since,
+                    and_(Escalation.created_at == since, Escalation.id < 1000))
+            ).order_by(Escalation.created_at.desc(), Escalation.id.desc()).limit(51)
+        ),
+        'latest open escalation of session': (
+            'ix_escalations_session_created_at',
+            escalation_service.open_escalations_query(session_id).limit(1)
+        ),
+        'pending escalation of session (assign)': (
+            'ix_escalations_session_status_created_at',
+            Escalation.query.filter_by(session_id=session_id, status='pending').limit(1)
+        ),
+        'sessions by status': (
+            'ix_chat_sessions_status_created_at',
+            ChatSession.query.filter_by(status='escalated').order_by(ChatSession.created_at.desc()).limit(50)
+        ),
+        'all sessions': (
+            'ix_chat_sessions_created_at',
+            ChatSession.query.order_by(ChatSession.created_at.desc()).limit(50)
+        ),
+    }
+
+
+def explain(query):
+    compiled = query.statement.compile(dialect=db.engine.dialect, compile_kwargs={"render_postcompile": True})
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    with db.engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).fetchall()
+    return [row[-1] for row in rows]
+
+
+def time_query(query, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        query.all()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=2000)
+    parser.add_argument('--messages', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        with app.app_context():
+            run_migrations()
+            seed(args.sessions, args.messages)
+
+            session_id = args.sessions // 2
+            since = datetime.utcnow() - timedelta(days=15)
+            failures = []
+
+            for name, (expected_index, query) in hot_queries(session_id, since).items():
+                plan = explain(query)
+                full_scan = any(
+                    step.startswith('SCAN') and 'INDEX' not in step and 'CONSTANT ROW' not in step
+                    and ('chat_messages' in step or 'escalations' in step or 'chat_sessions' in step)
+                    for step in plan
+                )
+                temp_sort = any('TEMP B-TREE' in step for step in plan)
+                uses_index = any(expected_index in step for step in plan)
+                ok = uses_index and not full_scan and not temp_sort
+
+                print(f"{'OK  ' if ok else 'FAIL'} {name:40s} {time_query(query, args.repeat):8.3f} ms")
+                for step in plan:
+                    print(f"       {step}")
+                if not ok:
+                    failures.append(name)
+
+            if failures:
+                print(f"\n{len(failures)} queries do not use their index: {', '.join(failures)}")
+                return 1
+
+            print("\nAll hot queries use their indexes")
+            return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
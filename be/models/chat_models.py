@@ -7,6 +7,11 @@ from utils.db import db
 class ChatSession(db.Model):
     """Chat session model"""
     __tablename__ = 'chat_sessions'
+    __table_args__ = (
+        # get_sessions: filter by status, newest first (and newest first across all statuses)
+        db.Index('ix_chat_sessions_status_created_at', 'status', 'created_at'),
+        db.Index('ix_chat_sessions_created_at', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     session_id = db.Column(db.String(100), unique=True, nullable=False)
@@ -36,6 +41,14 @@ class ChatSession(db.Model):
 class ChatMessage(db.Model):
     """Individual chat message model"""
     __tablename__ = 'chat_messages'
+    __table_args__ = (
+        # Session history in time order (summaries, agent history)
+        db.Index('ix_chat_messages_session_timestamp', 'session_id', 'timestamp'),
+        # Escalation messages of a session
+        db.Index('ix_chat_messages_session_type', 'session_id', 'message_type'),
+        # Id-ordered history, latest message id and cursor pagination
+        db.Index('ix_chat_messages_session_id_id', 'session_id', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     session_id = db.Column(db.Integer, db.ForeignKey('chat_sessions.id'), nullable=False)
@@ -44,6 +57,7 @@ class ChatMessage(db.Model):
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     message_type = db.Column(db.String(20), default='text')  # text, system, escalation
     message_metadata = db.Column(db.JSON, nullable=True)  # Additional message metadata
+    escalation_id = db.Column(db.Integer, db.ForeignKey('escalations.id'), nullable=True, index=True)  # Set on escalation messages
     
     # Relationships
     session = db.relationship('ChatSession', backref='messages', lazy=True)
@@ -56,6 +70,7 @@ class ChatMessage(db.Model):
             'content': self.content,
             'timestamp': self.timestamp.isoformat(),
             'message_type': self.message_type,
+            'escalation_id': self.escalation_id,
             'metadata': self.message_metadata
         }
 
@@ -63,6 +78,15 @@ class ChatMessage(db.Model):
 class Escalation(db.Model):
     """Escalation tracking model"""
     __tablename__ = 'escalations'
+    __table_args__ = (
+        # Escalation listings: filter by status, newest first with id tie-break (keyset pagination)
+        db.Index('ix_escalations_status_created_at_id', 'status', 'created_at', 'id'),
+        # Pending escalation of a session (agent assignment, summaries)
+        db.Index('ix_escalations_session_status_created_at', 'session_id', 'status', 'created_at'),
+        # Latest open (pending or handled) escalation of a session: walks the
+        # session's escalations newest first instead of sorting the IN results
+        db.Index('ix_escalations_session_created_at', 'session_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     session_id = db.Column(db.Integer, db.ForeignKey('chat_sessions.id'), nullable=False)
@@ -1,24 +1,40 @@
 """
 Admin API routes for document ingestion and management
 """
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from services.rag_service import rag_service
+from services.llm_service import llm_service
 from services.pdf_processor import pdf_processor
 from models.user_models import User, Agent
 from models.chat_models import ChatSession, Escalation
 from services.escalation_service import escalation_service
-from utils.db import db
+from services.registry import service_registry
+from services.ingestion_jobs import ingestion_job_manager
+from utils.db import db, check_db_connection
 import logging
 import os
+import gzip
+import json
 from werkzeug.utils import secure_filename
 
 logger = logging.getLogger(__name__)
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/api')
 
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+STREAM_READ_SIZE = 1 << 16
+
 @admin_bp.route('/ingest', methods=['POST'])
 def ingest_documents():
-    """Upload documents to ChromaDB knowledge base"""
+    """Upload documents to ChromaDB knowledge base.
+    
+    Takes ``{"documents": [...]}``, or one JSON document per line with
+    ``Content-Type: application/x-ndjson`` (optionally ``Content-Encoding: gzip``)
+    for large imports, which are read and embedded batch by batch.
+    """
+    if request.mimetype in NDJSON_MIMETYPES:
+        return _ingest_ndjson()
+    
     try:
         data = request.get_json()
         if not data or 'documents' not in data:
@@ -31,14 +47,16 @@ def ingest_documents():
             if 'content' not in doc:
                 return jsonify({'error': 'Each document must have content'}), 400
         
-        # Add documents to RAG service
-        success = rag_service.add_documents(documents)
+        # Add documents to RAG service, one bounded batch at a time
+        batches = list(rag_service.ingest_document_stream(documents))
         
-        if success:
+        if not any('error' in batch for batch in batches):
             return jsonify({
                 'success': True,
                 'message': f'Successfully ingested {len(documents)} documents',
-                'count': len(documents)
+                'count': len(documents),
+                'chunks_added': sum(batch['added'] for batch in batches),
+                'chunks_unchanged': sum(batch['unchanged'] for batch in batches)
             })
         else:
             return jsonify({'error': 'Failed to ingest documents'}), 500
@@ -47,77 +65,185 @@ def ingest_documents():
         logger.error(f"Error ingesting documents: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
+def _iter_lines(stream):
+    """Lines of a binary stream, read in fixed-size blocks"""
+    pending = b''
+    for block in iter(lambda: stream.read(STREAM_READ_SIZE), b''):
+        pending += block
+        *lines, pending = pending.split(b'\n')
+        yield from lines
+    if pending:
+        yield pending
+
+def _read_ndjson_documents(stream, skipped: list):
+    """Parse NDJSON documents lazily; invalid lines are recorded in ``skipped``"""
+    for line_number, line in enumerate(_iter_lines(stream), 1):
+        if not line.strip():
+            continue
+        try:
+            doc = json.loads(line)
+        except ValueError as e:
+            skipped.append({'line': line_number, 'error': f'Invalid JSON: {str(e)}'})
+            continue
+        if not isinstance(doc, dict) or not isinstance(doc.get('content'), str):
+            skipped.append({'line': line_number, 'error': 'Each document must have content'})
+            continue
+        yield doc
+
+def _ingest_ndjson():
+    """Stream NDJSON documents into the knowledge base, answering with one NDJSON result line per batch"""
+    stream = request.stream
+    if request.content_encoding == 'gzip':
+        stream = gzip.GzipFile(fileobj=stream, mode='rb')
+    
+    def generate():
+        skipped = []
+        totals = {'documents': 0, 'chunks': 0, 'added': 0, 'unchanged': 0, 'skipped': 0, 'failed_batches': 0}
+        try:
+            for result in rag_service.ingest_document_stream(_read_ndjson_documents(stream, skipped)):
+                result['skipped'] = skipped[:]
+                del skipped[:]
+                for key in ('documents', 'chunks', 'added', 'unchanged'):
+                    totals[key] += result.get(key, 0)
+                totals['skipped'] += len(result['skipped'])
+                totals['failed_batches'] += 'error' in result
+                yield json.dumps(result) + '\n'
+            error = None
+        except (OSError, EOFError) as e:
+            # Truncated or corrupt gzip body; batches sent so far are already ingested
+            logger.error(f"Error reading NDJSON ingest stream: {str(e)}")
+            error = f'Could not read request body: {str(e)}'
+        
+        totals['skipped'] += len(skipped)
+        summary = {'done': True, 'success': error is None and not totals['failed_batches'], **totals}
+        if skipped:
+            summary['skipped_lines'] = skipped
+        if error:
+            summary['error'] = error
+        logger.info(f"NDJSON ingest finished: {totals}")
+        yield json.dumps(summary) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+UPLOAD_CHUNK_SIZE = 1 << 20
+MAX_UPLOAD_BYTES = int(os.getenv('MAX_UPLOAD_MB', 100)) * 1024 * 1024
+
+def _save_upload(stream, file_path: str) -> int:
+    """Copy an upload stream to ``file_path`` in chunks; returns the size in bytes.
+    
+    The file is written under a temporary name and moved into place when
+    complete, so PDF reloads never see a partial upload.
+    """
+    tmp_path = f"{file_path}.part"
+    size = 0
+    try:
+        with open(tmp_path, 'wb') as f:
+            for chunk in iter(lambda: stream.read(UPLOAD_CHUNK_SIZE), b''):
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise ValueError(f'File is larger than {MAX_UPLOAD_BYTES // (1024 * 1024)}MB')
+                f.write(chunk)
+        os.replace(tmp_path, file_path)
+        return size
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
 @admin_bp.route('/upload-pdf', methods=['POST'])
 def upload_pdf():
-    """Upload PDF file to resources folder and process it"""
+    """Save an uploaded PDF and queue its extraction and indexing.
+    
+    Accepts a multipart ``file`` field, or the raw PDF as the request body
+    (``Content-Type: application/pdf`` with a ``filename`` query parameter),
+    which is streamed to disk without being buffered first. Returns 202 with
+    a job id; progress is available from ``/api/ingest/jobs/<id>`` and the
+    ``ingest_progress`` Socket.IO event.
+    """
     try:
-        if 'file' not in request.files:
+        if request.mimetype == 'application/pdf':
+            original_name = request.args.get('filename', '')
+            stream = request.stream
+        elif 'file' in request.files:
+            file = request.files['file']
+            original_name = file.filename
+            stream = file.stream
+        else:
             return jsonify({'error': 'No file provided'}), 400
         
-        file = request.files['file']
-        if file.filename == '':
+        if original_name == '':
             return jsonify({'error': 'No file selected'}), 400
         
-        if not file.filename.lower().endswith('.pdf'):
+        if not original_name.lower().endswith('.pdf'):
             return jsonify({'error': 'Only PDF files are allowed'}), 400
         
         # Secure filename and save to resources folder
-        filename = secure_filename(file.filename)
+        filename = secure_filename(original_name)
         file_path = os.path.join('resources', filename)
         
         # Ensure resources directory exists
         os.makedirs('resources', exist_ok=True)
         
-        # Save file
-        file.save(file_path)
-        
-        # Process the PDF
-        result = pdf_processor.add_pdf_file(file_path)
-        
-        if result['success']:
-            # Add to RAG service
-            rag_document = {
-                'content': result['content'],
-                'title': result['filename'],
-                'source': 'pdf_upload',
-                'file_path': result['file_path'],
-                'extraction_method': result['extraction_method']
-            }
-            
-            rag_success = rag_service.add_documents([rag_document])
-            
-            if rag_success:
-                return jsonify({
-                    'success': True,
-                    'message': f'Successfully uploaded and processed PDF: {filename}',
-                    'filename': filename,
-                    'extraction_method': result['extraction_method'],
-                    'content_length': len(result['content'])
-                })
-            else:
-                return jsonify({'error': 'Failed to add PDF to knowledge base'}), 500
-        else:
-            return jsonify({
-                'error': f'Failed to process PDF: {result.get("error", "Unknown error")}'
-            }), 500
+        try:
+            size = _save_upload(stream, file_path)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 413
+        
+        job = ingestion_job_manager.submit(file_path, filename, size)
+        if job is None:
+            return jsonify({'error': 'Too many uploads are being processed, please retry later'}), 503
+        
+        return jsonify({
+            'success': True,
+            'message': f'Uploaded {filename}; processing started',
+            'filename': filename,
+            'job_id': job.id,
+            'status_url': f'/api/ingest/jobs/{job.id}'
+        }), 202
             
     except Exception as e:
         logger.error(f"Error uploading PDF: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
+@admin_bp.route('/ingest/jobs', methods=['GET'])
+def list_ingestion_jobs():
+    """Recent ingestion jobs, newest first"""
+    limit = request.args.get('limit', 20, type=int)
+    return jsonify({
+        'success': True,
+        'jobs': ingestion_job_manager.list_jobs(limit),
+        'stats': ingestion_job_manager.stats()
+    })
+
+@admin_bp.route('/ingest/jobs/<job_id>', methods=['GET'])
+def get_ingestion_job(job_id):
+    """State and progress of an ingestion job"""
+    status = ingestion_job_manager.get_status(job_id)
+    if status is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'success': True, 'job': status})
+
 @admin_bp.route('/reload-pdfs', methods=['POST'])
 def reload_pdfs():
-    """Reload all PDFs from resources folder"""
+    """Rebuild the knowledge base from the resources folder into a new collection version.
+    
+    Queries keep using the current collection until the new one has been
+    validated; ``?force=true`` allows the rebuilt collection to be much smaller.
+    """
     try:
-        success = rag_service.reload_pdfs()
+        force = request.args.get('force', 'false').lower() == 'true'
+        result = rag_service.rebuild_collection(force=force)
         
-        if success:
+        if 'error' not in result:
             return jsonify({
                 'success': True,
-                'message': 'Successfully reloaded all PDFs from resources folder'
+                'message': 'Successfully reloaded all PDFs from resources folder',
+                **result
             })
         else:
-            return jsonify({'error': 'Failed to reload PDFs'}), 500
+            return jsonify({
+                'error': f"Failed to reload PDFs: {result['error']}",
+                'active_collection': result['active_collection']
+            }), 500
             
     except Exception as e:
         logger.error(f"Error reloading PDFs: {str(e)}")
@@ -249,28 +375,24 @@ def update_agent_availability(agent_id):
 
 @admin_bp.route('/escalations', methods=['GET'])
 def get_escalations():
-    """Get all escalations for agent dashboard"""
+    """Get escalations for agent dashboard (keyset-paginated via ?cursor=)"""
     try:
         status = request.args.get('status', 'pending')
         limit = request.args.get('limit', 50, type=int)
+        cursor = request.args.get('cursor')
+        # analysis_data is part of the payload by default; ?include_analysis=false leaves the bulky column out
+        include_analysis = request.args.get('include_analysis', 'true').lower() == 'true'
         
-        query = Escalation.query
-        if status != 'all':
-            query = query.filter_by(status=status)
-        
-        escalations = query.order_by(Escalation.created_at.desc()).limit(limit).all()
-        
-        escalation_data = []
-        for escalation in escalations:
-            session = ChatSession.query.get(escalation.session_id)
-            escalation_info = escalation.to_dict()
-            escalation_info['session'] = session.to_dict() if session else None
-            escalation_data.append(escalation_info)
+        try:
+            page = escalation_service.list_escalations(status, limit, cursor, include_analysis)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         return jsonify({
             'success': True,
-            'escalations': escalation_data,
-            'count': len(escalation_data)
+            'escalations': page['escalations'],
+            'count': len(page['escalations']),
+            'next_cursor': page['next_cursor']
         })
         
     except Exception as e:
@@ -345,7 +467,7 @@ def get_session_summary(session_id):
     try:
         from services.session_summary_service import session_summary_service
         
-        summary = session_summary_service.generate_session_summary(session_id)
+        summary = session_summary_service.get_session_summary_cached(session_id)
         
         if 'error' in summary:
             return jsonify({'error': summary['error']}), 404
@@ -382,18 +504,33 @@ def get_sessions():
         logger.error(f"Error getting sessions: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
+@admin_bp.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Get hit/miss counters of the retrieval and extraction caches"""
+    try:
+        extraction_cache = pdf_processor.extraction_cache
+        return jsonify({
+            'success': True,
+            'query_cache': rag_service.get_cache_stats(),
+            'response_cache': llm_service.get_cache_stats(),
+            'extraction_cache': extraction_cache.stats() if extraction_cache else {'enabled': False}
+        })
+        
+    except Exception as e:
+        logger.error(f"Error getting cache stats: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
 
 @admin_bp.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
+    """Liveness check: answers as soon as the app serves requests, while services may still warm up"""
     try:
+        services = service_registry.status()
         return jsonify({
             'status': 'healthy',
-            'services': {
-                'rag': 'operational',
-                'llm': 'operational',
-                'database': 'operational'
-            }
+            'ready': service_registry.is_ready(),
+            'uptime_seconds': service_registry.uptime_seconds(),
+            'services': {name: info['state'] for name, info in services.items()}
         })
     except Exception as e:
         logger.error(f"Health check failed: {str(e)}")
@@ -401,3 +538,22 @@ def health_check():
             'status': 'unhealthy',
             'error': str(e)
         }), 500
+
+
+@admin_bp.route('/health/ready', methods=['GET'])
+def readiness_check():
+    """Readiness check: database reachable and all critical services initialized"""
+    try:
+        database = check_db_connection()
+        ready = service_registry.is_ready() and database == 'connected'
+        return jsonify({
+            'ready': ready,
+            'database': database,
+            'services': service_registry.status()
+        }), 200 if ready else 503
+    except Exception as e:
+        logger.error(f"Readiness check failed: {str(e)}")
+        return jsonify({
+            'ready': False,
+            'error': str(e)
+        }), 503
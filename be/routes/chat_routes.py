@@ -26,19 +26,23 @@ def ask_ai():
         
         user_message = data['message']
         
-        # Get relevant context
-        context = rag_service.get_context_for_query(user_message)
+        # Get relevant context and retrieval confidence from a single search
+        retrieval = rag_service.retrieve(user_message)
         
         # Generate response
         response = llm_service.generate_response(
             user_message=user_message,
-            context=context
+            context=retrieval.context
         )
         
         return jsonify({
             'response': response['response'],
-            'confidence': response['confidence'],
-            'context_used': bool(context)
+            'confidence': retrieval.confidence,
+            'context_used': bool(retrieval.context),
+            'context_tokens': retrieval.context_tokens,
+            'context_budget': retrieval.context_budget,
+            'context_documents': retrieval.context_documents,
+            'tokens_used': response.get('tokens_used', 0)
         })
         
     except Exception as e:
@@ -0,0 +1,235 @@
+import os
+import re
+import gzip
+import json
+import math
+import heapq
+import tempfile
+import threading
+from collections import Counter
+from typing import Dict, Any, List, Iterable, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# USSD codes (*121#, *123*1#) stay single tokens; numbers and currency
+# amounts ("₹399", "Rs. 399", "INR 499.50") become the bare amount so they
+# match "399 plan"; the rest is split into lower-cased alphanumeric words ("5g", "dth")
+TOKEN_PATTERN = re.compile(r'(\*[\d*]+#)|(?:(?:[₹$]|\b(?:rs|inr)\.?)\s*)?(\d+(?:\.\d+)?)(?!\w)|(\w+)')
+# Bump when tokenization changes; snapshots of other versions are rebuilt
+TOKENIZER_VERSION = 2
+
+
+def tokenize(text: str) -> List[str]:
+    return [code or amount or word for code, amount, word in TOKEN_PATTERN.findall(text.lower())]
+
+
+class BM25Index:
+    """In-process BM25 inverted index over the chunks of one Chroma collection.
+
+    The index is persisted as a gzipped snapshot plus an append-only journal
+    of added and removed chunks, so updates only append a line; the journal
+    is folded into a new snapshot once it outgrows it. Files written by
+    another process are picked up by ``refresh``.
+    """
+
+    def __init__(self, directory: str, name: str, k1: float = 1.5, b: float = 0.75):
+        self.directory = directory
+        self.name = name
+        self.k1 = k1
+        self.b = b
+        self.snapshot_path = os.path.join(directory, f"{name}.snapshot.json.gz")
+        self.journal_path = os.path.join(directory, f"{name}.journal.ndjson")
+        self._lock = threading.RLock()
+        self._reset()
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _reset(self):
+        self._doc_lengths = {}  # chunk id -> number of tokens
+        self._doc_terms = {}  # chunk id -> term frequencies
+        self._postings = {}  # term -> {chunk id: term frequency}
+        self._total_length = 0
+        self._journal_entries = 0
+        self._file_state = None
+
+    def __len__(self) -> int:
+        return len(self._doc_lengths)
+
+    def _stat_files(self) -> Tuple:
+        state = []
+        for path in (self.snapshot_path, self.journal_path):
+            try:
+                stat = os.stat(path)
+                state.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                state.append(None)
+        return tuple(state)
+
+    # In-memory updates
+
+    def _add(self, doc_id: str, terms: Dict[str, int]):
+        self._remove(doc_id)
+        length = sum(terms.values())
+        self._doc_lengths[doc_id] = length
+        self._doc_terms[doc_id] = terms
+        self._total_length += length
+        for term, frequency in terms.items():
+            self._postings.setdefault(term, {})[doc_id] = frequency
+
+    def _remove(self, doc_id: str):
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self._total_length -= self._doc_lengths.pop(doc_id)
+        for term in terms:
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+
+    # Persistence
+
+    def _load(self):
+        with self._lock:
+            self._reset()
+            try:
+                with gzip.open(self.snapshot_path, 'rt', encoding='utf-8') as f:
+                    snapshot = json.load(f)
+                if snapshot.get('tokenizer', 1) != TOKENIZER_VERSION:
+                    # Left empty so the owner rebuilds it; the journal holds terms of the same version
+                    logger.info(f"BM25 snapshot {self.snapshot_path} uses an older tokenizer")
+                    self._file_state = self._stat_files()
+                    return
+                for doc_id, terms in snapshot['docs'].items():
+                    self._add(doc_id, terms)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.warning(f"Discarding unreadable BM25 snapshot {self.snapshot_path}: {str(e)}")
+                self._reset()
+
+            try:
+                with open(self.journal_path, encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            break  # a write that was cut short; later lines cannot be trusted
+                        self._apply(entry)
+                        self._journal_entries += 1
+            except FileNotFoundError:
+                pass
+            self._file_state = self._stat_files()
+
+    def _apply(self, entry: Dict[str, Any]):
+        if entry['op'] == 'add':
+            for doc_id, terms in entry['docs'].items():
+                self._add(doc_id, terms)
+        elif entry['op'] == 'remove':
+            for doc_id in entry['ids']:
+                self._remove(doc_id)
+
+    def _append(self, entry: Dict[str, Any]):
+        # One write per entry, appended, so concurrent writers do not interleave lines
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, separators=(',', ':')) + '\n')
+        self._journal_entries += 1
+        if self._journal_entries > max(1000, len(self._doc_lengths) // 10):
+            self.compact()
+        else:
+            self._file_state = self._stat_files()
+
+    def compact(self):
+        """Write a snapshot of the whole index and start an empty journal"""
+        with self._lock:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as raw, gzip.open(raw, 'wt', encoding='utf-8') as f:
+                    json.dump({'tokenizer': TOKENIZER_VERSION, 'docs': self._doc_terms}, f, separators=(',', ':'))
+                os.replace(tmp_path, self.snapshot_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            open(self.journal_path, 'w').close()
+            self._journal_entries = 0
+            self._file_state = self._stat_files()
+
+    def refresh(self) -> bool:
+        """Reload the index if another process changed its files; returns whether it did"""
+        if self._stat_files() == self._file_state:
+            return False
+        self._load()
+        return True
+
+    def delete_files(self):
+        for path in (self.snapshot_path, self.journal_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    # Public API
+
+    def add(self, ids: List[str], texts: List[str]):
+        """Index (or re-index) chunks"""
+        if not ids:
+            return
+        docs = {doc_id: dict(Counter(tokenize(text))) for doc_id, text in zip(ids, texts)}
+        with self._lock:
+            for doc_id, terms in docs.items():
+                self._add(doc_id, terms)
+            self._append({'op': 'add', 'docs': docs})
+
+    def remove(self, ids: Iterable[str]):
+        with self._lock:
+            ids = [doc_id for doc_id in ids if doc_id in self._doc_lengths]
+            if not ids:
+                return
+            for doc_id in ids:
+                self._remove(doc_id)
+            self._append({'op': 'remove', 'ids': ids})
+
+    def rebuild(self, docs: Iterable[Tuple[str, str]]):
+        """Replace the whole index with ``(id, text)`` pairs"""
+        with self._lock:
+            self._reset()
+            for doc_id, text in docs:
+                self._add(doc_id, dict(Counter(tokenize(text))))
+            self.compact()
+
+    def search(self, query: str, n_results: int = 5) -> List[Tuple[str, float]]:
+        """Best matching chunk ids with their BM25 scores"""
+        terms = set(tokenize(query))
+        with self._lock:
+            doc_count = len(self._doc_lengths)
+            if not doc_count or not terms:
+                return []
+            average_length = self._total_length / doc_count
+            scores = Counter()
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, frequency in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[doc_id] / average_length)
+                    scores[doc_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return heapq.nlargest(n_results, scores.items(), key=lambda item: item[1])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'chunks': len(self._doc_lengths),
+            'terms': len(self._postings),
+            'journal_entries': self._journal_entries
+        }
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Merge ranked id lists; each list contributes 1 / (k + rank) per id"""
+    scores = Counter()
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
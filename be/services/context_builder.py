@@ -0,0 +1,154 @@
+import os
+import re
+import zlib
+from dataclasses import dataclass, field
+from typing import Dict, Any, List
+import logging
+import numpy as np
+from .text_chunker import SENTENCE_BOUNDARY_PATTERN, TOKEN_PATTERN
+
+logger = logging.getLogger(__name__)
+
+SHINGLE_WORDS = 3
+MINHASH_PRIME = (1 << 31) - 1
+
+
+class TokenCounter:
+    """Counts tokens with a local Hugging Face tokenizer, or approximates them
+    by words and punctuation when none is available"""
+
+    def __init__(self, tokenizer=None):
+        self.tokenizer = tokenizer
+        self.name = getattr(tokenizer, 'name_or_path', None) or 'approximate'
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.tokenizer is not None:
+            try:
+                return len(self.tokenizer.encode(text, add_special_tokens=False, verbose=False))
+            except Exception as e:
+                logger.warning(f"Tokenizer failed, falling back to approximate counts: {str(e)}")
+                self.tokenizer = None
+                self.name = 'approximate'
+        return len(TOKEN_PATTERN.findall(text))
+
+
+def create_token_counter(default_tokenizer=None) -> TokenCounter:
+    """Token counter for ``RAG_CONTEXT_TOKENIZER`` (a locally available Hugging Face
+    tokenizer, e.g. the LLM's), else for ``default_tokenizer``"""
+    name = os.getenv('RAG_CONTEXT_TOKENIZER')
+    if name:
+        try:
+            from transformers import AutoTokenizer
+            return TokenCounter(AutoTokenizer.from_pretrained(name))
+        except Exception as e:
+            logger.warning(f"Could not load tokenizer {name}: {str(e)}")
+    return TokenCounter(default_tokenizer)
+
+
+class MinHasher:
+    """MinHash signatures of word shingles, for estimating Jaccard similarity"""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, MINHASH_PRIME, size=num_perm).astype(np.uint64)
+        self.b = rng.randint(0, MINHASH_PRIME, size=num_perm).astype(np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        words = re.findall(r'\w+', text.lower())
+        shingles = {' '.join(words[i:i + SHINGLE_WORDS]) for i in range(max(1, len(words) - SHINGLE_WORDS + 1))}
+        hashes = np.array([zlib.crc32(s.encode('utf-8')) % MINHASH_PRIME for s in shingles], dtype=np.uint64)
+        # (a * x + b) mod p for every permutation and shingle; operands stay below 2^62
+        return ((np.outer(self.a, hashes) + self.b[:, None]) % MINHASH_PRIME).min(axis=1)
+
+    @staticmethod
+    def similarity(first: np.ndarray, second: np.ndarray) -> float:
+        return float(np.mean(first == second))
+
+
+@dataclass
+class BuiltContext:
+    """Prompt context assembled from retrieved documents"""
+    text: str = ""
+    tokens: int = 0
+    budget: int = 0
+    documents: List[Dict[str, Any]] = field(default_factory=list)
+    duplicates_skipped: int = 0
+    skipped: int = 0
+    trimmed: int = 0
+
+
+class ContextBuilder:
+    """Packs retrieved documents into a prompt context under a token budget.
+
+    Documents are taken in rank order. Near-duplicates of a document already
+    included are dropped; a document that does not fit is cut back to the
+    sentences that do, or skipped, and packing continues with the next one.
+    """
+
+    def __init__(self,
+                 token_counter: TokenCounter = None,
+                 max_tokens: int = None,
+                 dedup_threshold: float = None,
+                 min_fragment_tokens: int = None):
+        self.token_counter = token_counter or TokenCounter()
+        self.max_tokens = max_tokens or int(os.getenv('RAG_CONTEXT_TOKENS', 512))
+        self.dedup_threshold = dedup_threshold or float(os.getenv('RAG_CONTEXT_DEDUP_THRESHOLD', 0.8))
+        # Smaller leftovers are not worth a truncated passage
+        self.min_fragment_tokens = min_fragment_tokens or int(os.getenv('RAG_CONTEXT_MIN_FRAGMENT_TOKENS', 32))
+        self.separator = "\n\n"
+        self.minhasher = MinHasher()
+
+    def build(self, documents: List[Dict[str, Any]], max_tokens: int = None) -> BuiltContext:
+        budget = max_tokens or self.max_tokens
+        result = BuiltContext(budget=budget)
+        separator_tokens = self.token_counter.count(self.separator)
+        parts = []
+        signatures = []
+
+        for doc in documents:
+            content = doc['content'].strip()
+            if not content:
+                continue
+
+            signature = self.minhasher.signature(content)
+            if any(MinHasher.similarity(signature, kept) >= self.dedup_threshold for kept in signatures):
+                result.duplicates_skipped += 1
+                continue
+
+            remaining = budget - result.tokens - (separator_tokens if parts else 0)
+            tokens = self.token_counter.count(content)
+            if tokens > remaining:
+                content, tokens = self._trim_to_sentences(content, remaining)
+                if not content:
+                    result.skipped += 1
+                    continue
+                result.trimmed += 1
+
+            parts.append(content)
+            signatures.append(signature)
+            result.documents.append(doc)
+            result.tokens += tokens + (separator_tokens if len(parts) > 1 else 0)
+
+        result.text = self.separator.join(parts)
+        return result
+
+    def _trim_to_sentences(self, content: str, budget: int):
+        """Leading whole sentences of ``content`` that fit in ``budget`` tokens"""
+        if budget < self.min_fragment_tokens:
+            return '', 0
+
+        kept = []
+        used = 0
+        for sentence in SENTENCE_BOUNDARY_PATTERN.split(content):
+            # Counted separately, plus one token for the joining space
+            tokens = self.token_counter.count(sentence) + (1 if kept else 0)
+            if used + tokens > budget:
+                break
+            kept.append(sentence)
+            used += tokens
+
+        if not kept or used < self.min_fragment_tokens:
+            return '', 0
+        return ' '.join(kept), used
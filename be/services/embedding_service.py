@@ -0,0 +1,50 @@
+import os
+from typing import Sequence
+import logging
+import numpy as np
+from chromadb import Documents, EmbeddingFunction, Embeddings
+from sentence_transformers import SentenceTransformer
+
+logger = logging.getLogger(__name__)
+
+class SentenceTransformerEmbedder(EmbeddingFunction):
+    """Chroma embedding function backed by a single in-process SentenceTransformer"""
+
+    def __init__(self,
+                 model_name: str = None,
+                 batch_size: int = None,
+                 num_threads: int = None,
+                 normalize: bool = True):
+        self.model_name = model_name or os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+        self.batch_size = batch_size or int(os.getenv('EMBEDDING_BATCH_SIZE', 64))
+        self.normalize = normalize
+
+        num_threads = num_threads or int(os.getenv('EMBEDDING_NUM_THREADS', 0))
+        if num_threads > 0:
+            import torch
+            torch.set_num_threads(num_threads)
+            logger.info(f"Embedding model limited to {num_threads} CPU threads")
+
+        self.model = SentenceTransformer(self.model_name)
+        logger.info(f"Loaded embedding model {self.model_name} (batch_size={self.batch_size})")
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        """Encode texts in batches into a float32 matrix of (optionally) unit-length rows"""
+        if not texts:
+            return np.zeros((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+
+        embeddings = self.model.encode(
+            list(texts),
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=self.normalize,
+            show_progress_bar=False
+        )
+        return embeddings.astype(np.float32, copy=False)
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """Encode a single query string"""
+        return self.encode([query])[0]
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return self.encode(input).tolist()
@@ -1,14 +1,21 @@
 from typing import Dict, Any, List, Optional
 from models.chat_models import ChatSession, Escalation
+from models.user_models import User
 from utils.db import db
+from sqlalchemy import and_, or_
+import base64
 import logging
 import re
 from datetime import datetime, timedelta
 from collections import defaultdict
+from services.keyword_matcher import keyword_matcher, KeywordMatches
+from services.session_state import session_state_store, query_fingerprint
 
 logger = logging.getLogger(__name__)
 
 class EscalationService:
+    KEYWORD_TABLES = ('critical_telecom_topics', 'frustration_keywords', 'escalation_phrases', 'negative_intensity_words')
+    
     def __init__(self):
         """Initialize enhanced escalation service for telecom support"""
         self.escalation_rules = {
@@ -54,6 +61,25 @@ class EscalationService:
             'medium': ['refund request', 'payment failure', 'contract termination'],
             'low': ['general complaint', 'technical issue', 'billing question']
         }
+        
+        self._register_keywords()
+    
+    def _register_keywords(self):
+        """Compile keyword tables into the shared matcher"""
+        keyword_matcher.register('escalation', {
+            table: self.escalation_rules[table] for table in self.KEYWORD_TABLES
+        })
+    
+    def update_rules(self, **rules) -> Dict[str, Any]:
+        """Update escalation rules at runtime; keyword tables are recompiled immediately"""
+        unknown = [name for name in rules if name not in self.escalation_rules]
+        if unknown:
+            raise ValueError(f"Unknown escalation rules: {', '.join(unknown)}")
+        
+        self.escalation_rules.update(rules)
+        if any(name in self.KEYWORD_TABLES for name in rules):
+            self._register_keywords()
+        return self.escalation_rules
     
     def should_escalate(self, session_id: int, user_message: str, confidence: float, 
                       message_count: int = 0, session_duration: int = 0) -> Dict[str, Any]:
@@ -64,11 +90,18 @@ class EscalationService:
             if not session:
                 return {'should_escalate': False, 'reason': 'Session not found'}
             
+            # Sessions with an agent, or waiting for one, are not escalated and announced again
+            if session.status == 'escalated' or self.has_open_escalation(session_id):
+                return {'should_escalate': False, 'reasons': [], 'reason': 'Session already escalated'}
+            
+            # One pass over the message serves every keyword-based check
+            matches = keyword_matcher.match(user_message)
+            
             escalation_analysis = {
                 'ai_performance': self._check_ai_performance(confidence, session_id),
-                'user_behavior': self._check_user_behavior(user_message, message_count, session_duration, session_id),
-                'topic_sensitivity': self._check_topic_sensitivity(user_message),
-                'sentiment_signals': self._check_sentiment_signals(user_message)
+                'user_behavior': self._check_user_behavior(user_message, message_count, session_duration, session_id, matches),
+                'topic_sensitivity': self._check_topic_sensitivity(user_message, matches),
+                'sentiment_signals': self._check_sentiment_signals(user_message, matches)
             }
             
             # Determine if escalation is needed
@@ -112,8 +145,7 @@ class EscalationService:
             reasons.append(f"Critical low confidence ({confidence:.2f} < {self.escalation_rules['low_retrieval_confidence']})")
             should_escalate = True
         
-        # Check for repeated fallback responses (would need message history)
-        # This is a placeholder for when message storage is implemented
+        # Check for repeated fallback responses
         fallback_count = self._get_fallback_count(session_id)
         if fallback_count >= self.escalation_rules['repeated_fallback_threshold']:
             reasons.append(f"Repeated fallback responses ({fallback_count} times)")
@@ -127,7 +159,8 @@ class EscalationService:
         }
     
     def _check_user_behavior(self, user_message: str, message_count: int, 
-                           session_duration: int, session_id: int) -> Dict[str, Any]:
+                           session_duration: int, session_id: int,
+                           matches: Optional[KeywordMatches] = None) -> Dict[str, Any]:
         """Category 2: User Behavior - Repeated queries, long threads, frustration patterns"""
         reasons = []
         should_escalate = False
@@ -149,7 +182,8 @@ class EscalationService:
             should_escalate = True
         
         # User explicitly asking for human help
-        if any(phrase in user_message.lower() for phrase in self.escalation_rules['escalation_phrases']):
+        matches = matches or keyword_matcher.match(user_message)
+        if matches.any('escalation.escalation_phrases'):
             reasons.append("User explicitly requested human assistance")
             should_escalate = True
         
@@ -161,28 +195,27 @@ class EscalationService:
             'repeated_queries': repeated_queries
         }
     
-    def _check_topic_sensitivity(self, user_message: str) -> Dict[str, Any]:
+    def _check_topic_sensitivity(self, user_message: str,
+                                 matches: Optional[KeywordMatches] = None) -> Dict[str, Any]:
         """Category 3: Topic Sensitivity - Critical telecom topics requiring human intervention"""
         reasons = []
         should_escalate = False
         priority = 'low'
         
-        message_lower = user_message.lower()
-        found_topics = []
+        matches = matches or keyword_matcher.match(user_message)
+        found_topics = matches.found('escalation.critical_telecom_topics')
         
         # Check for critical telecom topics
-        for topic in self.escalation_rules['critical_telecom_topics']:
-            if topic in message_lower:
-                found_topics.append(topic)
-                should_escalate = True
-                
-                # Determine priority
-                if topic in self.escalation_priorities['critical']:
-                    priority = 'critical'
-                elif topic in self.escalation_priorities['high']:
-                    priority = 'high'
-                elif topic in self.escalation_priorities['medium']:
-                    priority = 'medium'
+        for topic in found_topics:
+            should_escalate = True
+            
+            # Determine priority
+            if topic in self.escalation_priorities['critical']:
+                priority = 'critical'
+            elif topic in self.escalation_priorities['high']:
+                priority = 'high'
+            elif topic in self.escalation_priorities['medium']:
+                priority = 'medium'
         
         if found_topics:
             reasons.append(f"Critical telecom topic: {', '.join(found_topics)}")
@@ -194,40 +227,38 @@ class EscalationService:
             'priority': priority
         }
     
-    def _check_sentiment_signals(self, user_message: str) -> Dict[str, Any]:
+    def _check_sentiment_signals(self, user_message: str,
+                                 matches: Optional[KeywordMatches] = None) -> Dict[str, Any]:
         """Category 4: Sentiment Signals - Negative tone and emotional distress detection"""
         reasons = []
         should_escalate = False
         sentiment_score = 0
         
-        message_lower = user_message.lower()
+        matches = matches or keyword_matcher.match(user_message)
         
         # Check for frustration keywords
-        frustration_found = [kw for kw in self.escalation_rules['frustration_keywords'] 
-                           if kw in message_lower]
+        frustration_found = matches.found('escalation.frustration_keywords')
         if frustration_found:
             reasons.append(f"Frustration detected: {', '.join(frustration_found)}")
             should_escalate = True
             sentiment_score += len(frustration_found) * 2
         
         # Check for escalation phrases
-        escalation_phrases_found = [phrase for phrase in self.escalation_rules['escalation_phrases'] 
-                                  if phrase in message_lower]
+        escalation_phrases_found = matches.found('escalation.escalation_phrases')
         if escalation_phrases_found:
             reasons.append(f"Escalation request: {', '.join(escalation_phrases_found)}")
             should_escalate = True
             sentiment_score += len(escalation_phrases_found) * 3
         
         # Check for negative intensity words
-        intensity_words_found = [word for word in self.escalation_rules['negative_intensity_words'] 
-                               if word in message_lower]
+        intensity_words_found = matches.found('escalation.negative_intensity_words')
         if intensity_words_found:
             reasons.append(f"High emotional intensity: {', '.join(intensity_words_found)}")
             sentiment_score += len(intensity_words_found)
         
         # Check for repeated negative words (basic pattern)
-        negative_word_count = sum(1 for word in self.escalation_rules['frustration_keywords'] 
-                                if message_lower.count(word) > 1)
+        negative_word_count = sum(1 for word in frustration_found 
+                                if matches.count('escalation.frustration_keywords', word) > 1)
         if negative_word_count > 0:
             reasons.append(f"Repeated negative language ({negative_word_count} instances)")
             should_escalate = True
@@ -299,6 +330,18 @@ class EscalationService:
             logger.error(f"Error resolving previous escalations: {str(e)}")
             # Don't raise here as this is not critical
     
+    @staticmethod
+    def open_escalations_query(session_id: int):
+        """Pending or agent-handled escalations of a session, newest first"""
+        return Escalation.query.filter(
+            Escalation.session_id == session_id,
+            Escalation.status.in_(['pending', 'handled'])
+        ).order_by(Escalation.created_at.desc())
+    
+    def has_open_escalation(self, session_id: int) -> bool:
+        """Whether the session has a pending or agent-handled escalation"""
+        return self.open_escalations_query(session_id).first() is not None
+    
     def get_available_agents(self) -> List[Dict[str, Any]]:
         """Get list of available agents"""
         try:
@@ -359,15 +402,24 @@ class EscalationService:
         return 'low'
     
     def _get_fallback_count(self, session_id: int) -> int:
-        """Get count of fallback responses for session (placeholder)"""
-        # This would need message history storage to implement properly
-        # For now, return 0 as placeholder
-        return 0
+        """Get count of fallback (failed or low-confidence) AI responses for session"""
+        state = session_state_store.get(session_id)
+        return state.fallback_count if state else 0
     
     def _detect_repeated_queries(self, user_message: str, session_id: int) -> bool:
-        """Detect if user is repeating similar queries (placeholder)"""
-        # This would need message history to detect patterns
-        # For now, check for obvious repetition in current message
+        """Detect if user is repeating similar queries"""
+        state = session_state_store.get(session_id)
+        if state and state.recent_queries:
+            fingerprint = query_fingerprint(user_message)
+            if state.recent_queries[-1] == fingerprint:
+                # The current message is already recorded: compare against earlier ones only
+                repeats = state.last_query_repeats
+            else:
+                repeats = state.similar_query_count(fingerprint, session_state_store.similarity_threshold)
+            if repeats + 1 >= self.escalation_rules['repeated_query_threshold']:
+                return True
+        
+        # Also check for obvious repetition within the current message
         words = user_message.lower().split()
         if len(words) > 5:  # Only check longer messages
             word_freq = defaultdict(int)
@@ -384,16 +436,20 @@ class EscalationService:
     def get_escalation_summary(self, session_id: int) -> Dict[str, Any]:
         """Enhanced escalation summary for telecom support"""
         try:
-            session = ChatSession.query.get(session_id)
-            if not session:
-                return {}
-            
-            # Get user info
-            from models.user_models import User
-            user = User.query.filter_by(user_id=session.user_id).first()
+            # Session, user and latest escalation in one round trip
+            row = db.session.query(ChatSession, User, Escalation).outerjoin(
+                User, User.user_id == ChatSession.user_id
+            ).outerjoin(
+                Escalation, Escalation.session_id == ChatSession.id
+            ).filter(
+                ChatSession.id == session_id
+            ).order_by(
+                Escalation.created_at.desc(), Escalation.id.desc()
+            ).first()
             
-            # Get escalation details
-            escalation = Escalation.query.filter_by(session_id=session_id).first()
+            if not row:
+                return {}
+            session, user, escalation = row
             
             return {
                 'session_id': session_id,
@@ -409,6 +465,92 @@ class EscalationService:
             logger.error(f"Error getting escalation summary: {str(e)}")
             return {}
     
+    def list_escalations(self, status: str = 'pending', limit: int = 50,
+                         cursor: Optional[str] = None, include_analysis: bool = False) -> Dict[str, Any]:
+        """List escalations joined with their session and user in a single query.
+        
+        Results are ordered newest first and paginated by keyset: pass the
+        returned ``next_cursor`` to fetch the following page.
+        """
+        columns = [
+            Escalation.id, Escalation.session_id, Escalation.reason, Escalation.priority,
+            Escalation.status, Escalation.assigned_agent_id, Escalation.triggered_at,
+            Escalation.handled_at, Escalation.created_at,
+            ChatSession.session_id.label('session_uuid'), ChatSession.user_id, ChatSession.agent_id,
+            ChatSession.room_id, ChatSession.status.label('session_status'),
+            ChatSession.created_at.label('session_created_at'), ChatSession.updated_at.label('session_updated_at'),
+            User.name.label('user_name')
+        ]
+        if include_analysis:
+            columns.append(Escalation.analysis_data)
+        
+        query = db.session.query(*columns).join(
+            ChatSession, ChatSession.id == Escalation.session_id
+        ).outerjoin(
+            User, User.user_id == ChatSession.user_id
+        )
+        if status != 'all':
+            query = query.filter(Escalation.status == status)
+        
+        if cursor:
+            cursor_created_at, cursor_id = self._decode_cursor(cursor)
+            query = query.filter(or_(
+                Escalation.created_at < cursor_created_at,
+                and_(Escalation.created_at == cursor_created_at, Escalation.id < cursor_id)
+            ))
+        
+        rows = query.order_by(Escalation.created_at.desc(), Escalation.id.desc()).limit(limit + 1).all()
+        
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = self._encode_cursor(rows[-1].created_at, rows[-1].id) if has_more and rows else None
+        
+        return {
+            'escalations': [self._escalation_row_to_dict(row, include_analysis) for row in rows],
+            'next_cursor': next_cursor
+        }
+    
+    def _escalation_row_to_dict(self, row, include_analysis: bool = False) -> Dict[str, Any]:
+        """Compact escalation projection shared by the REST listing and the socket replay"""
+        escalation = {
+            'id': row.id,
+            'session_id': row.session_id,
+            'reason': row.reason,
+            'priority': row.priority,
+            'assigned_agent_id': row.assigned_agent_id,
+            'triggered_at': row.triggered_at.isoformat() if row.triggered_at else None,
+            'handled_at': row.handled_at.isoformat() if row.handled_at else None,
+            'status': row.status,
+            'created_at': row.created_at.isoformat() if row.created_at else None,
+            'session': {
+                'id': row.session_id,
+                'session_id': row.session_uuid,
+                'user_id': row.user_id,
+                'agent_id': row.agent_id,
+                'room_id': row.room_id,
+                'status': row.session_status,
+                'created_at': row.session_created_at.isoformat() if row.session_created_at else None,
+                'updated_at': row.session_updated_at.isoformat() if row.session_updated_at else None
+            },
+            'user_name': row.user_name
+        }
+        if include_analysis:
+            escalation['analysis_data'] = row.analysis_data
+        return escalation
+    
+    @staticmethod
+    def _encode_cursor(created_at: datetime, escalation_id: int) -> str:
+        raw = f"{created_at.isoformat()}|{escalation_id}"
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+    
+    @staticmethod
+    def _decode_cursor(cursor: str):
+        try:
+            raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+            created_at, escalation_id = raw.rsplit('|', 1)
+            return datetime.fromisoformat(created_at), int(escalation_id)
+        except Exception:
+            raise ValueError('Invalid cursor')
     
 
 # Global escalation service instance
@@ -0,0 +1,126 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from typing import Dict, Any, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """On-disk cache of per-page PDF extraction results.
+
+    Entries are keyed by the SHA-256 of the PDF bytes and the extractor
+    version (which covers the extraction settings), so renamed or re-uploaded
+    copies hit the cache and any change to the file or the extractor misses
+    it. Each entry is a small gzipped JSON file holding the page texts,
+    their extraction method and layout signals.
+    """
+
+    def __init__(self, directory: str = None, version: str = '1'):
+        self.directory = directory or os.getenv('PDF_EXTRACTION_CACHE_DIR', 'extraction_cache')
+        self.version = version
+        self.version_tag = hashlib.sha256(version.encode('utf-8')).hexdigest()[:12]
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, sha256: str) -> str:
+        return os.path.join(self.directory, f"{sha256}.{self.version_tag}.json.gz")
+
+    def get(self, sha256: str) -> Optional[List[Dict[str, Any]]]:
+        """Cached pages as ``{'index', 'method', 'text', ...}`` dicts, or None"""
+        path = self._path(sha256)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                entry = json.load(f)
+            if entry.get('version') != self.version or entry.get('sha256') != sha256:
+                raise ValueError('entry does not match its key')
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        except Exception as e:
+            logger.warning(f"Discarding unreadable extraction cache entry {path}: {str(e)}")
+            self._remove(path)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        fields = entry['fields']
+        return [dict(zip(fields, row)) for row in entry['pages']]
+
+    def put(self, sha256: str, pages: List[Dict[str, Any]], filename: str = None):
+        """Store pages; rows are written as lists under a shared field header to keep files small"""
+        fields = sorted({key for page in pages for key in page})
+        entry = {
+            'version': self.version,
+            'sha256': sha256,
+            'filename': filename,
+            'created_at': time.time(),
+            'fields': fields,
+            'pages': [[page.get(field) for field in fields] for page in pages]
+        }
+        path = self._path(sha256)
+        try:
+            # Write-then-rename so concurrent readers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as raw, gzip.open(raw, 'wt', encoding='utf-8') as f:
+                json.dump(entry, f, separators=(',', ':'))
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Extraction cache write failed for {filename or sha256}: {str(e)}")
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def prune(self, keep_sha256s=None) -> int:
+        """Delete entries of other extractor versions and, if given, of files no longer present"""
+        removed = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json.gz'):
+                continue
+            sha256, _, rest = name.partition('.')
+            stale_version = not rest.startswith(self.version_tag)
+            if stale_version or (keep_sha256s is not None and sha256 not in keep_sha256s):
+                self._remove(os.path.join(self.directory, name))
+                removed += 1
+        if removed:
+            logger.info(f"Pruned {removed} extraction cache entries")
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        entries = [name for name in os.listdir(self.directory) if name.endswith('.json.gz')]
+        with self._lock:
+            return {
+                'directory': self.directory,
+                'version': self.version,
+                'entries': len(entries),
+                'bytes': sum(os.path.getsize(os.path.join(self.directory, name)) for name in entries),
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+def create_extraction_cache(version: str) -> Optional[ExtractionCache]:
+    """Build the extraction cache unless disabled with PDF_EXTRACTION_CACHE=false"""
+    if os.getenv('PDF_EXTRACTION_CACHE', 'true').lower() != 'true':
+        return None
+    return ExtractionCache(version=version)
@@ -0,0 +1,298 @@
+import os
+import re
+import json
+import time
+import uuid
+import queue
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+import logging
+from .registry import eventlet_patched
+
+logger = logging.getLogger(__name__)
+
+# Share of the overall progress reached when each stage starts
+STAGE_START = {'queued': 0.0, 'extracting': 0.05, 'chunking': 0.6, 'embedding': 0.65, 'completed': 1.0}
+STAGE_END = {'extracting': 0.6, 'chunking': 0.65, 'embedding': 1.0}
+
+JOB_ID_PATTERN = re.compile(r'[0-9a-f]{32}')
+
+
+class IngestionJob:
+    """Extraction, chunking and embedding of one uploaded PDF"""
+
+    def __init__(self, file_path: str, filename: str, size: int):
+        self.id = uuid.uuid4().hex
+        self.file_path = file_path
+        self.filename = filename
+        self.size = size
+        self.state = 'queued'  # queued, extracting, chunking, embedding, completed, failed
+        self.stage_done = 0
+        self.stage_total = 0
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def finished(self) -> bool:
+        return self.state in ('completed', 'failed')
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'job_id': self.id,
+            'filename': self.filename,
+            'size': self.size,
+            'state': self.state,
+            'stage_done': self.stage_done,
+            'stage_total': self.stage_total,
+            'progress': round(self.progress * 100, 1),
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+
+class IngestionJobManager:
+    """Runs PDF ingestion jobs on background workers and reports their progress.
+
+    Uploads only save the file and queue a job, so the HTTP request returns
+    at once. Jobs run on native threads (eventlet's thread pool when it is
+    monkey-patched, so extraction and embedding never block the hub), and
+    every state change is emitted as ``ingest_progress`` to the job's room,
+    which clients join with the ``watch_ingest_job`` event. Under eventlet
+    the emits are relayed by a green thread. Jobs run in
+    the process that accepted the upload; their state is also written to a
+    small JSON file per job, so any worker on the host can report it.
+    """
+
+    def __init__(self, num_workers: int = None, max_pending: int = None, max_jobs: int = None,
+                 directory: str = None):
+        self.num_workers = num_workers or int(os.getenv('INGEST_WORKERS', 1))
+        self.max_pending = max_pending or int(os.getenv('INGEST_QUEUE_MAX', 20))
+        self.max_jobs = max_jobs or int(os.getenv('INGEST_JOBS_KEPT', 200))
+        self.directory = directory or os.getenv('INGEST_JOBS_DIR', 'ingest_jobs')
+        os.makedirs(self.directory, exist_ok=True)
+        self._emit = None
+        self._outbox = None  # progress events waiting for the green relay under eventlet
+        self._queue = queue.Queue()
+        self._jobs = OrderedDict()  # job id -> job, oldest first
+        self._lock = threading.Lock()
+        self._started = False
+
+    @staticmethod
+    def room(job_id: str) -> str:
+        return f"ingest_{job_id}"
+
+    def bind(self, socketio):
+        """Emit progress events through the Socket.IO server"""
+        self._emit = socketio.emit
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+
+        if eventlet_patched():
+            import eventlet
+            from eventlet import patcher
+            self._outbox = patcher.original('queue').Queue()
+            for _ in range(self.num_workers):
+                eventlet.spawn(self._green_worker)
+            eventlet.spawn(self._relay_progress)
+        else:
+            for _ in range(self.num_workers):
+                threading.Thread(target=self._worker, name='ingest-worker', daemon=True).start()
+        logger.info(f"Started {self.num_workers} ingestion workers")
+
+    def submit(self, file_path: str, filename: str, size: int) -> Optional[IngestionJob]:
+        """Queue a saved upload; returns None when too many jobs are pending"""
+        if not self._started:
+            self.start()
+
+        with self._lock:
+            pending = sum(1 for job in self._jobs.values() if not job.finished)
+            if pending >= self.max_pending:
+                return None
+            job = IngestionJob(file_path, filename, size)
+            self._jobs[job.id] = job
+            # Forget the oldest finished jobs
+            while len(self._jobs) > self.max_jobs:
+                oldest = next((job_id for job_id, old in self._jobs.items() if old.finished), None)
+                if oldest is None:
+                    break
+                del self._jobs[oldest]
+                self._remove_state(oldest)
+
+        self._save_state(job)
+        self._queue.put(job)
+        logger.info(f"Queued ingestion job {job.id} for {filename}")
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        """A job running in this process"""
+        return self._jobs.get(job_id)
+
+    def get_status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """State of a job accepted by any worker sharing the jobs directory"""
+        job = self._jobs.get(job_id)
+        if job:
+            return job.to_dict()
+        if not JOB_ID_PATTERN.fullmatch(job_id or ''):
+            return None
+        try:
+            with open(self._state_path(job_id), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Could not read state of ingestion job {job_id}: {str(e)}")
+            return None
+
+    def list_jobs(self, limit: int = 20):
+        with self._lock:
+            jobs = list(self._jobs.values())[-limit:]
+        return [job.to_dict() for job in reversed(jobs)]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            states = [job.state for job in self._jobs.values()]
+        return {
+            'workers': self.num_workers,
+            'max_pending': self.max_pending,
+            'pending': sum(1 for state in states if state not in ('completed', 'failed')),
+            'completed': states.count('completed'),
+            'failed': states.count('failed')
+        }
+
+    def _state_path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def _save_state(self, job: IngestionJob):
+        # Write-then-rename so other workers never read a partial file
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(job.to_dict(), f)
+            os.replace(tmp_path, self._state_path(job.id))
+        except Exception as e:
+            logger.warning(f"Could not save state of ingestion job {job.id}: {str(e)}")
+
+    def _remove_state(self, job_id: str):
+        try:
+            os.remove(self._state_path(job_id))
+        except OSError:
+            pass
+
+    def _update(self, job: IngestionJob, state: str = None, done: int = None, total: int = None):
+        if state and state != job.state:
+            job.state = state
+            job.stage_done, job.stage_total = 0, 0
+        if total is not None:
+            job.stage_total = total
+        if done is not None:
+            job.stage_done = done
+
+        if job.state in STAGE_END:
+            start, end = STAGE_START[job.state], STAGE_END[job.state]
+            fraction = job.stage_done / job.stage_total if job.stage_total else 0.0
+            job.progress = start + (end - start) * fraction
+        elif job.state == 'completed':
+            job.progress = 1.0
+
+        self._save_state(job)
+        if self._outbox is not None:
+            # Called on a native thread: green sockets may only be written from the hub
+            self._outbox.put(job.to_dict())
+        else:
+            self._send(job.to_dict())
+
+    def _send(self, payload: Dict[str, Any]):
+        if self._emit:
+            try:
+                self._emit('ingest_progress', payload, room=self.room(payload['job_id']))
+            except Exception as e:
+                logger.warning(f"Could not emit progress of ingestion job {payload['job_id']}: {str(e)}")
+
+    def _relay_progress(self):
+        import eventlet
+        while True:
+            try:
+                self._send(self._outbox.get_nowait())
+            except queue.Empty:
+                eventlet.sleep(0.1)
+
+    def _worker(self):
+        while True:
+            self._process(self._queue.get())
+
+    def _green_worker(self):
+        from eventlet import tpool
+        while True:
+            tpool.execute(self._process, self._queue.get())
+
+    def _process(self, job: IngestionJob):
+        try:
+            self._run(job)
+        except Exception as e:
+            logger.error(f"Ingestion job {job.id} failed: {str(e)}")
+            job.error = str(e)
+            job.finished_at = time.time()
+            self._update(job, 'failed')
+
+    def _run(self, job: IngestionJob):
+        # Imported here so the manager can be created before the heavy services
+        from .pdf_processor import pdf_processor
+        from .rag_service import rag_service
+
+        job.started_at = time.time()
+        self._update(job, 'extracting', 0, 1)
+        result = pdf_processor.add_pdf_file(job.file_path)
+        if not result['success']:
+            job.error = f"Failed to process PDF: {result.get('error', 'Unknown error')}"
+            job.finished_at = time.time()
+            self._update(job, 'failed')
+            return
+        self._update(job, done=1)
+
+        rag_document = {
+            'content': result['content'],
+            'title': result['filename'],
+            'source': 'pdf_upload',
+            'file_path': result['file_path'],
+            'extraction_method': result['extraction_method']
+        }
+
+        def on_progress(stage: str, done: int, total: int):
+            self._update(job, stage, done, total)
+
+        # Re-uploading a file replaces its previously indexed chunks
+        ingest = rag_service.ingest_documents([rag_document], prune_stale=True, progress=on_progress)
+        job.finished_at = time.time()
+        if 'error' in ingest:
+            job.error = 'Failed to add PDF to knowledge base'
+            self._update(job, 'failed')
+            return
+
+        job.result = {
+            'extraction_method': result['extraction_method'],
+            'page_methods': result.get('page_methods', {}),
+            'from_cache': result.get('from_cache', False),
+            'content_length': len(result['content']),
+            'chunks': ingest['chunks'],
+            'chunks_added': ingest['added'],
+            'chunks_removed': ingest['removed'],
+            'seconds': round(job.finished_at - job.started_at, 2)
+        }
+        logger.info(f"Ingestion job {job.id} for {job.filename} completed in {job.result['seconds']}s")
+        self._update(job, 'completed')
+
+# Global ingestion job manager instance
+ingestion_job_manager = IngestionJobManager()
@@ -0,0 +1,127 @@
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Iterable
+import logging
+
+logger = logging.getLogger(__name__)
+
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+class KeywordMatches:
+    """Keyword hits of one text, grouped by ``namespace.category``"""
+
+    def __init__(self, counts: Dict[str, Counter], order: Dict[str, Dict[str, int]]):
+        self._counts = counts
+        self._order = order
+
+    def found(self, category: str) -> List[str]:
+        """Distinct keywords of a category found in the text, in table order"""
+        counts = self._counts.get(category)
+        if not counts:
+            return []
+        order = self._order.get(category, {})
+        return sorted(counts, key=lambda keyword: order.get(keyword, 0))
+
+    def count(self, category: str, keyword: str = None) -> int:
+        """Occurrences of one keyword, or of all keywords of a category"""
+        counts = self._counts.get(category)
+        if not counts:
+            return 0
+        if keyword is not None:
+            return counts.get(keyword, 0)
+        return sum(counts.values())
+
+    def any(self, category: str) -> bool:
+        return bool(self._counts.get(category))
+
+    def merge(self, other: 'KeywordMatches') -> 'KeywordMatches':
+        """Combine hits of several texts (e.g. all user messages of a session)"""
+        counts = {category: Counter(counter) for category, counter in self._counts.items()}
+        for category, counter in other._counts.items():
+            counts.setdefault(category, Counter()).update(counter)
+        return KeywordMatches(counts, self._order or other._order)
+
+
+class _WordTrie:
+    """Immutable word-level trie over every registered keyword phrase.
+
+    There are no failure links: matching walks the trie again from every
+    word of the text, at most ``max_depth`` (the longest phrase's word
+    count) words ahead, so a text of n words costs O(n * max_depth) steps.
+    """
+
+    def __init__(self, tables: Dict[str, Dict[str, List[str]]]):
+        self.root = {}
+        self.order = {}
+        self.max_depth = 0
+
+        for namespace, categories in tables.items():
+            for category, keywords in categories.items():
+                qualified = f"{namespace}.{category}"
+                self.order[qualified] = {}
+                for index, keyword in enumerate(keywords):
+                    words = WORD_PATTERN.findall(keyword.lower())
+                    if not words:
+                        continue
+                    node = self.root
+                    for word in words:
+                        node = node.setdefault(word, {})
+                    node.setdefault(None, []).append((qualified, keyword))
+                    self.order[qualified].setdefault(keyword, index)
+                    self.max_depth = max(self.max_depth, len(words))
+
+    @staticmethod
+    def _step(node: dict, word: str):
+        child = node.get(word)
+        if child is None and len(word) > 3 and word.endswith('s'):
+            # Simple plural fallback: "bills" matches "bill", "charges" matches "charge"
+            child = node.get(word[:-1])
+        return child
+
+    def match(self, text: str) -> KeywordMatches:
+        words = WORD_PATTERN.findall(text.lower())
+        counts = {}
+
+        for start in range(len(words)):
+            node = self.root
+            for word in words[start:start + self.max_depth]:
+                node = self._step(node, word)
+                if node is None:
+                    break
+                for category, keyword in node.get(None, ()):
+                    counts.setdefault(category, Counter())[keyword] += 1
+
+        return KeywordMatches(counts, self.order)
+
+
+class KeywordMatcher:
+    """Shared multi-pattern matcher for all keyword tables.
+
+    Services register their keyword lists under a namespace; the matcher
+    compiles every table into one word trie, so one scan of a message
+    (with lookahead bounded by the longest phrase) reports the hits of
+    every category. Registering a namespace
+    again swaps in a freshly built trie, which makes rule changes take
+    effect without a restart.
+    """
+
+    def __init__(self):
+        self._tables = {}
+        self._lock = threading.Lock()
+        self._trie = _WordTrie({})
+
+    def register(self, namespace: str, tables: Dict[str, Iterable[str]]):
+        """Register (or hot-reload) the keyword tables of a namespace"""
+        with self._lock:
+            self._tables[namespace] = {category: list(keywords) for category, keywords in tables.items()}
+            self._trie = _WordTrie(self._tables)
+        logger.info(f"Keyword matcher rebuilt with namespace '{namespace}' "
+                    f"({sum(len(k) for k in self._tables[namespace].values())} keywords)")
+
+    def match(self, text: str) -> KeywordMatches:
+        # The trie is replaced, never mutated, so reads need no lock
+        return self._trie.match(text or '')
+
+# Global keyword matcher instance
+keyword_matcher = KeywordMatcher()
@@ -1,7 +1,9 @@
 import os
-from groq import Groq
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Iterator, List
 import logging
+from .response_cache import create_response_cache
+from .keyword_matcher import keyword_matcher
+from .registry import service_registry
 
 logger = logging.getLogger(__name__)
 
@@ -12,43 +14,163 @@ class LLMService:
         if not api_key:
             raise ValueError("GROQ_API_KEY environment variable is required")
         
+        from groq import Groq
         self.client = Groq(api_key=api_key)
         self.model = "llama-3.1-8b-instant"  
+        self.response_cache = create_response_cache()
+        self.completion_params = {
+            'temperature': 0.7,
+            'max_tokens': 500,
+            'top_p': 0.9
+        }
+        self.fallback_response = "I apologize, but I'm having trouble processing your request right now. Please try again later."
+        self.frustration_keywords = [
+            'angry', 'frustrated', 'annoyed', 'upset', 'mad', 'irritated',
+            'not working', 'broken', 'terrible', 'awful', 'horrible',
+            'refund', 'cancel', 'complaint', 'sue', 'legal'
+        ]
+        keyword_matcher.register('sentiment', {'frustration_keywords': self.frustration_keywords})
     
     def generate_response(self, 
                         user_message: str, 
                         context: str = "") -> Dict[str, Any]:
         """Generate AI response using Groq API"""
         try:
-            system_prompt = self._build_system_prompt(context)
-            messages = [{"role": "system", "content": system_prompt}]
-            messages.append({"role": "user", "content": user_message})
+            if self.response_cache:
+                cached = self.response_cache.get(self.model, user_message, context)
+                if cached:
+                    return {
+                        'response': cached['response'],
+                        'confidence': 0.8,  # Default confidence
+                        'model': self.model,
+                        'tokens_used': 0,
+                        'cached': True
+                    }
+            
             response = self.client.chat.completions.create(
                 model=self.model,
-                messages=messages,
-                temperature=0.7,
-                max_tokens=500,
-                top_p=0.9
+                messages=self._build_messages(user_message, context),
+                **self.completion_params
             )
             
             ai_response = response.choices[0].message.content
+            tokens_used = response.usage.total_tokens if response.usage else 0
+            
+            if self.response_cache and ai_response:
+                self.response_cache.put(self.model, user_message, context, ai_response, tokens_used)
             
             return {
                 'response': ai_response,
                 'confidence': 0.8,  # Default confidence
                 'model': self.model,
-                'tokens_used': response.usage.total_tokens if response.usage else 0
+                'tokens_used': tokens_used
             }
             
         except Exception as e:
             logger.error(f"Error generating response: {str(e)}")
             return {
-                'response': "I apologize, but I'm having trouble processing your request right now. Please try again later.",
+                'response': self.fallback_response,
                 'confidence': 0.1,
                 'model': self.model,
                 'error': str(e)
             }
     
+    def stream_response(self, 
+                        user_message: str, 
+                        context: str = "") -> Iterator[Dict[str, Any]]:
+        """Stream AI response from Groq as ``{'delta': ...}`` events.
+        
+        The last event has ``done=True`` and carries the complete response in
+        the same shape as ``generate_response``.
+        """
+        if self.response_cache:
+            cached = self.response_cache.get(self.model, user_message, context)
+            if cached:
+                yield {'delta': cached['response']}
+                yield {
+                    'done': True,
+                    'response': cached['response'],
+                    'confidence': 0.8,
+                    'model': self.model,
+                    'tokens_used': 0,
+                    'cached': True
+                }
+                return
+        
+        parts = []
+        tokens_used = 0
+        stream = None
+        try:
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=self._build_messages(user_message, context),
+                stream=True,
+                **self.completion_params
+            )
+            
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    yield {'delta': delta}
+                
+                # Groq reports usage on the final chunk
+                x_groq = getattr(chunk, 'x_groq', None)
+                usage = getattr(x_groq, 'usage', None) if x_groq else None
+                if usage:
+                    tokens_used = usage.total_tokens
+            
+            ai_response = ''.join(parts)
+            if self.response_cache and ai_response:
+                self.response_cache.put(self.model, user_message, context, ai_response, tokens_used)
+            
+            yield {
+                'done': True,
+                'response': ai_response,
+                'confidence': 0.8,  # Default confidence
+                'model': self.model,
+                'tokens_used': tokens_used
+            }
+            
+        except Exception as e:
+            logger.error(f"Error streaming response: {str(e)}")
+            if not parts:
+                yield {'delta': self.fallback_response}
+            yield {
+                'done': True,
+                'response': ''.join(parts) or self.fallback_response,
+                'confidence': 0.1,
+                'model': self.model,
+                'error': str(e)
+            }
+        finally:
+            # Also runs when the consumer stops early (cancelled reply, generator closed):
+            # release the HTTP connection instead of leaving Groq streaming into it
+            if stream is not None:
+                self._close_stream(stream)
+    
+    @staticmethod
+    def _close_stream(stream):
+        try:
+            close = getattr(stream, 'close', None) or getattr(getattr(stream, 'response', None), 'close', None)
+            if close:
+                close()
+        except Exception as e:
+            logger.warning(f"Error closing response stream: {str(e)}")
+    
+    def _build_messages(self, user_message: str, context: str = "") -> List[Dict[str, str]]:
+        """Build chat completion messages"""
+        return [
+            {"role": "system", "content": self._build_system_prompt(context)},
+            {"role": "user", "content": user_message}
+        ]
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss and token counters of the response cache"""
+        if not self.response_cache:
+            return {'backend': 'disabled'}
+        return self.response_cache.stats()
+    
     def _build_system_prompt(self, context: str = "") -> str:
         """Build system prompt for telecom support"""
         base_prompt = """You are a helpful AI assistant for a telecom support system. 
@@ -69,22 +191,15 @@ class LLMService:
     
     def analyze_sentiment(self, message: str) -> Dict[str, Any]:
         """Analyze sentiment and detect frustration"""
-        frustration_keywords = [
-            'angry', 'frustrated', 'annoyed', 'upset', 'mad', 'irritated',
-            'not working', 'broken', 'terrible', 'awful', 'horrible',
-            'refund', 'cancel', 'complaint', 'sue', 'legal'
-        ]
-        
-        message_lower = message.lower()
-        frustration_score = sum(1 for keyword in frustration_keywords if keyword in message_lower)
+        keywords_found = keyword_matcher.match(message).found('sentiment.frustration_keywords')
         
-        sentiment_score = min(1.0, frustration_score / len(frustration_keywords))
+        sentiment_score = min(1.0, len(keywords_found) / len(self.frustration_keywords))
         
         return {
             'sentiment_score': sentiment_score,
             'is_frustrated': sentiment_score > 0.3,
-            'frustration_keywords_found': [kw for kw in frustration_keywords if kw in message_lower]
+            'frustration_keywords_found': keywords_found
         }
 
-# Global LLM service instance
-llm_service = LLMService()
+# Global LLM service instance, created on first use or by the startup warm-up
+llm_service = service_registry.lazy('llm', LLMService)
@@ -1,21 +1,133 @@
 import os
+import itertools
+import threading
+import multiprocessing
 import logging
-from typing import List, Dict, Any, Optional
-import fitz  # PyMuPDF
-import pytesseract
-from PIL import Image
-import cv2
-import numpy as np
-from pdfplumber import PDF
-import io
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Dict, Any, Optional, Iterator, Tuple, Callable
+from .registry import service_registry
+from .extraction_cache import create_extraction_cache, file_sha256
+
+# PyMuPDF, pdfplumber, OpenCV and Tesseract are imported where they are used,
+# so importing this module stays cheap
 
 logger = logging.getLogger(__name__)
 
+OCR_ZOOM = 2.0
+
+# Bump when extraction output changes so cached results are not reused
+EXTRACTOR_VERSION = 3
+
+# Page marker labels; the chunker lower-cases them into chunk metadata
+METHOD_LABELS = {'pymupdf': 'PyMuPDF', 'pdfplumber': 'pdfplumber', 'ocr': 'OCR'}
+
+# Extraction steps below are module-level so worker processes can run them
+
+def _page_image_coverage(page) -> float:
+    """Share of the page area covered by embedded images (scans cover nearly all of it)"""
+    page_area = abs(page.rect) or 1.0
+    covered = sum(abs(page.rect & info['bbox']) for info in page.get_image_info())
+    return min(1.0, covered / page_area)
+
+
+def _read_text_layer(pdf_path: str) -> Dict[str, Any]:
+    """Text layer of every page via PyMuPDF, with the density signals used to pick a strategy"""
+    try:
+        import fitz  # PyMuPDF
+        pages = []
+        with fitz.open(pdf_path) as doc:
+            for page in doc:
+                text = page.get_text()
+                pages.append({
+                    'text': text,
+                    'chars': sum(1 for ch in text if not ch.isspace()),
+                    'image_coverage': _page_image_coverage(page),
+                    # Vector-drawn pages (outlined text, charts) have no text layer either
+                    'has_drawings': bool(page.get_drawings()) if not text.strip() else False
+                })
+        return {'pages': pages, 'error': None}
+    except Exception as e:
+        return {'pages': [], 'error': f"PyMuPDF: {str(e)}"}
+
+
+def _read_with_pdfplumber(pdf_path: str, page_indexes: Optional[List[int]] = None) -> Dict[str, Any]:
+    """Text of some (default: all) pages via pdfplumber (good for complex layouts)"""
+    try:
+        import pdfplumber
+        with pdfplumber.open(pdf_path) as pdf:
+            if page_indexes is None:
+                page_indexes = list(range(len(pdf.pages)))
+            pages = [(index, pdf.pages[index].extract_text() or '') for index in page_indexes]
+        return {'pages': pages, 'error': None}
+    except Exception as e:
+        return {'pages': [], 'error': f"pdfplumber: {str(e)}"}
+
+
+def _pixmap_to_array(pix):
+    """Raw pixmap samples as a (height, width[, channels]) array, without encoding to an image format"""
+    import numpy as np
+    rows = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)
+    image = rows[:, :pix.width * pix.n]
+    if pix.n > 1:
+        image = image.reshape(pix.height, pix.width, pix.n)
+    return np.ascontiguousarray(image)
+
+
+def _preprocess_for_ocr(image):
+    """Denoise, boost contrast and binarize a page image to improve OCR accuracy"""
+    try:
+        import cv2
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        image = cv2.medianBlur(image, 3)
+        image = cv2.convertScaleAbs(image, alpha=1.2, beta=10)
+        _, image = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        return image
+    except Exception as e:
+        logger.warning(f"Image preprocessing failed: {str(e)}")
+        return image
+
+
+def _ocr_pages(pdf_path: str, page_indexes: List[int], zoom: float = OCR_ZOOM) -> List[Tuple[int, Optional[str]]]:
+    """OCR a batch of pages (for scanned PDFs); failed pages come back as None"""
+    results = []
+    try:
+        import fitz  # PyMuPDF
+        import pytesseract
+        with fitz.open(pdf_path) as doc:
+            matrix = fitz.Matrix(zoom, zoom)
+            for index in page_indexes:
+                # Render straight to grayscale and hand the samples to OpenCV
+                pix = doc.load_page(index).get_pixmap(matrix=matrix, colorspace=fitz.csGRAY, alpha=False)
+                image = _preprocess_for_ocr(_pixmap_to_array(pix))
+                results.append((index, pytesseract.image_to_string(image, lang='eng')))
+    except Exception as e:
+        logger.warning(f"OCR failed for {pdf_path} pages {page_indexes[0] + 1}-{page_indexes[-1] + 1}: {str(e)}")
+
+    done = {index for index, _ in results}
+    results.extend((index, None) for index in page_indexes if index not in done)
+    return sorted(results)
+
+
 class PDFProcessor:
-    def __init__(self, resources_folder: str = "resources"):
+    def __init__(self, resources_folder: str = "resources", max_workers: int = None):
         """Initialize PDF processor with resources folder path"""
         self.resources_folder = resources_folder
         self.supported_formats = ['.pdf']
+        self.max_workers = max_workers or int(os.getenv('PDF_WORKERS', min(4, os.cpu_count() or 1)))
+        self.ocr_pages_per_task = int(os.getenv('PDF_OCR_PAGES_PER_TASK', 4))
+        # A page whose text layer has fewer non-space characters than this is "sparse"
+        self.min_page_chars = int(os.getenv('PDF_MIN_PAGE_CHARS', 40))
+        # Sparse pages mostly covered by images are treated as scans and OCRed directly
+        self.ocr_image_coverage = float(os.getenv('PDF_OCR_IMAGE_COVERAGE', 0.5))
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        # Cached results depend on the extractor and the settings that route pages
+        self.extraction_cache = create_extraction_cache(
+            f"{EXTRACTOR_VERSION}:{self.min_page_chars}:{self.ocr_image_coverage}:{OCR_ZOOM}"
+        )
         if not os.path.exists(self.resources_folder):
             os.makedirs(self.resources_folder)
             logger.info(f"Created resources folder: {self.resources_folder}")
@@ -33,128 +145,208 @@ class PDFProcessor:
         logger.info(f"Found {len(pdf_files)} PDF files in {self.resources_folder}")
         return pdf_files
     
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                # spawn, not fork: the parent may already run PyTorch and ChromaDB threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+                logger.info(f"Started PDF extraction pool with {self.max_workers} workers")
+            return self._executor
+    
+    def _run(self, func: Callable, tasks: List[tuple]) -> Iterator:
+        """Run ``func`` over argument tuples on the worker pool, yielding results in task order"""
+        if self.max_workers <= 1 or len(tasks) <= 1:
+            return itertools.starmap(func, tasks)
+        return self._get_executor().map(func, *zip(*tasks))
+    
+    def shutdown(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+    
+    def _page_batches(self, page_indexes: List[int]) -> List[List[int]]:
+        size = max(1, self.ocr_pages_per_task)
+        return [page_indexes[i:i + size] for i in range(0, len(page_indexes), size)]
+    
     def extract_text_from_pdf(self, pdf_path: str) -> Dict[str, Any]:
         """Extract text from PDF using multiple methods"""
-        try:
-            text_content = self._extract_with_pymupdf(pdf_path)
-            
-            if not text_content.strip():
-                text_content = self._extract_with_pdfplumber(pdf_path)
-            
-            if not text_content.strip():
-                text_content = self._extract_with_ocr(pdf_path)
-            
-            return {
-                'file_path': pdf_path,
-                'filename': os.path.basename(pdf_path),
-                'content': text_content,
-                'extraction_method': 'pymupdf' if text_content else 'ocr',
-                'success': bool(text_content.strip())
-            }
-            
-        except Exception as e:
-            logger.error(f"Error extracting text from {pdf_path}: {str(e)}")
-            return {
-                'file_path': pdf_path,
-                'filename': os.path.basename(pdf_path),
-                'content': '',
-                'extraction_method': 'failed',
-                'success': False,
-                'error': str(e)
-            }
+        return self.extract_pdfs([pdf_path])[0]
     
-    def _extract_with_pymupdf(self, pdf_path: str) -> str:
-        """Extract text using PyMuPDF (fastest for text-based PDFs)"""
-        try:
-            doc = fitz.open(pdf_path)
-            text_content = []
-            
-            for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
-                text = page.get_text()
-                if text.strip():
-                    text_content.append(f"--- Page {page_num + 1} ---\n{text}")
-            
-            doc.close()
-            return "\n\n".join(text_content)
-            
-        except Exception as e:
-            logger.warning(f"PyMuPDF extraction failed for {pdf_path}: {str(e)}")
-            return ""
+    def extract_pdfs(self, pdf_paths: List[str]) -> List[Dict[str, Any]]:
+        """Extract several PDFs, reusing cached pages for files extracted before.
+
+        Files are looked up in the extraction cache by content hash; only the
+        misses are extracted, and their pages are cached unless some step
+        failed. Results keep the input order.
+        """
+        hashes = {}
+        cached = {}
+        if self.extraction_cache is not None:
+            for path in pdf_paths:
+                try:
+                    hashes[path] = file_sha256(path)
+                except OSError as e:
+                    logger.warning(f"Could not hash {path}: {str(e)}")
+                    continue
+                pages = self.extraction_cache.get(hashes[path])
+                if pages is not None:
+                    cached[path] = pages
+        
+        missing = [path for path in pdf_paths if path not in cached]
+        extracted = dict(zip(missing, self._extract_uncached(missing))) if missing else {}
+        
+        results = []
+        for path in pdf_paths:
+            if path in cached:
+                result = self._build_result(path, cached[path])
+                result['from_cache'] = True
+            else:
+                pages, error = extracted[path]
+                result = self._build_result(path, pages, error)
+                result['from_cache'] = False
+                if error is None and path in hashes:
+                    self.extraction_cache.put(hashes[path], pages, os.path.basename(path))
+            result['sha256'] = hashes.get(path)
+            results.append(result)
+        
+        if cached:
+            logger.info(f"Extraction cache hits: {len(cached)} of {len(pdf_paths)} PDFs")
+        return results
     
-    def _extract_with_pdfplumber(self, pdf_path: str) -> str:
-        """Extract text using pdfplumber (good for complex layouts)"""
+    def _extract_uncached(self, pdf_paths: List[str]) -> List[Tuple[List[Dict[str, Any]], Optional[str]]]:
+        """Extract PDFs, choosing an extraction method per page.
+
+        Every file's PyMuPDF text layer is read first. Pages with enough text
+        keep it; sparse pages that are mostly images go to OCR; other sparse
+        pages are retried with pdfplumber and, if they have images or drawings
+        but still no text, OCRed as well. pdfplumber and OCR work is batched
+        onto the worker pool across all files. Returns each file's page dicts
+        and the error of any failed step.
+        """
         try:
-            text_content = []
-            with PDF(open(pdf_path, 'rb')) as pdf:
-                for page_num, page in enumerate(pdf.pages):
-                    text = page.extract_text()
-                    if text and text.strip():
-                        text_content.append(f"--- Page {page_num + 1} ---\n{text}")
+            layers = dict(zip(pdf_paths, self._run(_read_text_layer, [(path,) for path in pdf_paths])))
+            pages = {path: {} for path in pdf_paths}  # path -> page index -> (text, method)
+            errors = {path: layer['error'] for path, layer in layers.items() if layer['error']}
             
-            return "\n\n".join(text_content)
+            # 1. Keep dense text layers, route scanned pages to OCR, the rest to pdfplumber
+            plumber_pages = {}
+            ocr_pages = {path: [] for path in pdf_paths}
+            for path, layer in layers.items():
+                if layer['error']:
+                    plumber_pages[path] = None  # unreadable by PyMuPDF: let pdfplumber try every page
+                    continue
+                for index, page in enumerate(layer['pages']):
+                    if page['chars'] >= self.min_page_chars:
+                        pages[path][index] = (page['text'], 'pymupdf')
+                    elif page['image_coverage'] >= self.ocr_image_coverage:
+                        ocr_pages[path].append(index)
+                    else:
+                        pages[path][index] = (page['text'], 'pymupdf')
+                        plumber_pages.setdefault(path, []).append(index)
             
-        except Exception as e:
-            logger.warning(f"pdfplumber extraction failed for {pdf_path}: {str(e)}")
-            return ""
-    
-    def _extract_with_ocr(self, pdf_path: str) -> str:
-        """Extract text using OCR (for scanned PDFs)"""
-        try:
-            doc = fitz.open(pdf_path)
-            text_content = []
+            # 2. pdfplumber for sparse pages; still-empty pages with graphics go to OCR
+            plumber_tasks = list(plumber_pages.items())
+            for (path, requested), result in zip(plumber_tasks, self._run(_read_with_pdfplumber, plumber_tasks)):
+                if result['error']:
+                    errors[path] = result['error']
+                layer_pages = layers[path]['pages']
+                for index, text in result['pages']:
+                    chars = sum(1 for ch in text if not ch.isspace())
+                    current_text = pages[path].get(index, ('', None))[0]
+                    if chars > len(current_text.strip()):
+                        pages[path][index] = (text, 'pdfplumber')
+                    if chars < self.min_page_chars and index < len(layer_pages) and (
+                            layer_pages[index]['image_coverage'] > 0 or layer_pages[index]['has_drawings']):
+                        ocr_pages[path].append(index)
             
-            for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
-                mat = fitz.Matrix(2.0, 2.0)  
-                pix = page.get_pixmap(matrix=mat)
-                img_data = pix.tobytes("png")
-                
-                image = Image.open(io.BytesIO(img_data))
-                
-                processed_image = self._preprocess_image_for_ocr(image)
-                
-                text = pytesseract.image_to_string(processed_image, lang='eng')
-                
-                if text.strip():
-                    text_content.append(f"--- Page {page_num + 1} (OCR) ---\n{text}")
+            # 3. OCR batches of all files share the pool
+            ocr_tasks = [
+                (path, batch)
+                for path in pdf_paths
+                for batch in self._page_batches(sorted(ocr_pages[path]))
+            ]
+            for (path, _), batch in zip(ocr_tasks, self._run(_ocr_pages, ocr_tasks)):
+                for index, text in batch:
+                    if text is None:
+                        # Keep the file out of the cache so the page is OCRed again next time
+                        errors.setdefault(path, f"OCR failed on page {index + 1}")
+                        continue
+                    current_text = pages[path].get(index, ('', None))[0]
+                    if len(text.strip()) >= len(current_text.strip()):
+                        pages[path][index] = (text, 'ocr')
             
-            doc.close()
-            return "\n\n".join(text_content)
+            return [
+                (self._page_records(pages[path], layers[path]['pages']), errors.get(path))
+                for path in pdf_paths
+            ]
             
         except Exception as e:
-            logger.warning(f"OCR extraction failed for {pdf_path}: {str(e)}")
-            return ""
+            if isinstance(e, BrokenProcessPool):
+                # A crashed worker (e.g. in Tesseract) breaks the pool; start a fresh one next time
+                self.shutdown()
+            logger.error(f"Error extracting text from {len(pdf_paths)} PDFs: {str(e)}")
+            return [([], str(e)) for _ in pdf_paths]
     
-    def _preprocess_image_for_ocr(self, image: Image.Image) -> Image.Image:
-        """Preprocess image to improve OCR accuracy"""
-        try:
-            img_array = np.array(image)
-            
-            if len(img_array.shape) == 3:
-                img_array = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-            
-            img_array = cv2.medianBlur(img_array, 3)
-            
-            img_array = cv2.convertScaleAbs(img_array, alpha=1.2, beta=10)
-            
-            _, img_array = cv2.threshold(img_array, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-            
-            return Image.fromarray(img_array)
-            
-        except Exception as e:
-            logger.warning(f"Image preprocessing failed: {str(e)}")
-            return image
+    def _page_records(self, pages: Dict[int, Tuple[str, str]], layer_pages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Page texts with their method and layout signals, as stored in the extraction cache"""
+        records = []
+        for index, (text, method) in sorted(pages.items()):
+            layout = layer_pages[index] if index < len(layer_pages) else {}
+            records.append({
+                'index': index,
+                'method': method,
+                'text': text,
+                'chars': sum(1 for ch in text if not ch.isspace()),
+                'image_coverage': round(layout.get('image_coverage', 0.0), 3)
+            })
+        return records
+    
+    def _build_result(self, pdf_path: str, pages: List[Dict[str, Any]], error: str = None) -> Dict[str, Any]:
+        """Assemble page texts behind ``--- Page N (method) ---`` markers, which the chunker
+        turns into per-chunk page and extraction_method metadata"""
+        page_methods = Counter()
+        sections = []
+        for page in pages:
+            if page['text'].strip():
+                page_methods[page['method']] += 1
+                sections.append(f"--- Page {page['index'] + 1} ({METHOD_LABELS[page['method']]}) ---\n{page['text']}")
+        
+        text_content = "\n\n".join(sections)
+        success = bool(text_content.strip())
+        if not success:
+            extraction_method = 'failed'
+        elif len(page_methods) == 1:
+            extraction_method = next(iter(page_methods))
+        else:
+            extraction_method = 'mixed'
+        
+        result = {
+            'file_path': pdf_path,
+            'filename': os.path.basename(pdf_path),
+            'content': text_content,
+            'extraction_method': extraction_method,
+            'page_methods': dict(page_methods),
+            'success': success
+        }
+        if not success:
+            result['error'] = error or 'No text could be extracted'
+            logger.error(f"Error extracting text from {pdf_path}: {result['error']}")
+        elif page_methods.keys() - {'pymupdf'}:
+            logger.info(f"Extracted {pdf_path} page methods: {dict(page_methods)}")
+        return result
     
     def process_all_pdfs(self) -> List[Dict[str, Any]]:
         """Process all PDF files in the resources folder"""
         pdf_files = self.get_pdf_files()
-        processed_documents = []
-        
-        for pdf_path in pdf_files:
-            logger.info(f"Processing PDF: {pdf_path}")
-            result = self.extract_text_from_pdf(pdf_path)
-            processed_documents.append(result)
+        logger.info(f"Processing {len(pdf_files)} PDFs with {self.max_workers} workers")
+        processed_documents = self.extract_pdfs(pdf_files)
+        if self.extraction_cache is not None:
+            # Entries of removed files and older extractor versions are no longer needed
+            self.extraction_cache.prune({doc['sha256'] for doc in processed_documents if doc.get('sha256')})
         
         successful_extractions = [doc for doc in processed_documents if doc['success']]
         logger.info(f"Successfully processed {len(successful_extractions)} out of {len(pdf_files)} PDF files")
@@ -194,5 +386,5 @@ class PDFProcessor:
         
         return self.extract_text_from_pdf(file_path)
 
-# Global PDF processor instance
-pdf_processor = PDFProcessor()
+# Global PDF processor instance, created on first use
+pdf_processor = service_registry.lazy('pdf', PDFProcessor)
@@ -0,0 +1,149 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+import logging
+import numpy as np
+from .bm25_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+class QueryResultCache:
+    """LRU/TTL cache of search results keyed on normalized query text.
+
+    An optional semantic tier serves near-duplicate queries whose embedding
+    cosine similarity to a cached query is above ``similarity_threshold``
+    (embeddings are expected to be unit length) and whose exact tokens
+    (numbers, amounts, USSD codes) are the same, since embeddings barely
+    tell "*121#" from "*123#". Set the threshold to 0 to disable it.
+    """
+
+    def __init__(self,
+                 max_entries: int = None,
+                 ttl_seconds: int = None,
+                 similarity_threshold: float = None):
+        self.max_entries = max_entries or int(os.getenv('RAG_QUERY_CACHE_SIZE', 1024))
+        self.ttl_seconds = ttl_seconds or int(os.getenv('RAG_QUERY_CACHE_TTL', 3600))
+        self.similarity_threshold = similarity_threshold if similarity_threshold is not None \
+            else float(os.getenv('RAG_QUERY_CACHE_SIMILARITY', 0.95))
+
+        self._entries = OrderedDict()  # (normalized query, n_results) -> entry
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._matrix_keys = []
+
+        self.generation = 0
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def semantic_enabled(self) -> bool:
+        return self.similarity_threshold > 0
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        """Normalize query text for exact matching (keeps USSD characters like * and #)"""
+        query = re.sub(r'[^\w\s*#]', ' ', query.lower())
+        return re.sub(r'\s+', ' ', query).strip()
+
+    def get(self, query: str, n_results: int) -> Optional[List[Dict[str, Any]]]:
+        """Exact-tier lookup on normalized query text"""
+        key = (self.normalize(query), n_results)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry['expires_at'] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._copy(entry['results'])
+            if entry:
+                self._remove(key)
+            if not self.semantic_enabled:
+                self.misses += 1
+            return None
+
+    @staticmethod
+    def exact_tokens(query: str) -> frozenset:
+        """Tokens a near-duplicate query must share: those with digits or USSD characters"""
+        return frozenset(token for token in tokenize(query) if not token.isalpha())
+
+    def get_similar(self, query: str, embedding: np.ndarray, n_results: int) -> Optional[List[Dict[str, Any]]]:
+        """Semantic-tier lookup; only called after an exact-tier miss"""
+        exact_tokens = self.exact_tokens(query)
+        with self._lock:
+            if self._matrix is None:
+                self._rebuild_matrix()
+
+            if self._matrix is not None and len(self._matrix_keys):
+                similarities = self._matrix @ embedding
+                now = time.monotonic()
+                for index in np.argsort(-similarities):
+                    if similarities[index] < self.similarity_threshold:
+                        break
+                    key = self._matrix_keys[index]
+                    entry = self._entries.get(key)
+                    if key[1] == n_results and entry and entry['expires_at'] > now \
+                            and entry['exact_tokens'] == exact_tokens:
+                        self._entries.move_to_end(key)
+                        self.semantic_hits += 1
+                        return self._copy(entry['results'])
+
+            self.misses += 1
+            return None
+
+    def put(self, query: str, n_results: int, results: List[Dict[str, Any]],
+            embedding: Optional[np.ndarray] = None, generation: Optional[int] = None):
+        """Store results unless the collection changed since the search started"""
+        key = (self.normalize(query), n_results)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+
+            self._entries[key] = {
+                'results': self._copy(results),
+                'embedding': embedding,
+                'exact_tokens': self.exact_tokens(query),
+                'expires_at': time.monotonic() + self.ttl_seconds
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def invalidate(self):
+        """Drop every entry; called whenever the underlying collection changes"""
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+            self._matrix_keys = []
+            self.generation += 1
+            self.invalidations += 1
+        logger.info("Query result cache invalidated")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.semantic_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'semantic_hits': self.semantic_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.hits + self.semantic_hits) / lookups, 4) if lookups else 0.0,
+                'invalidations': self.invalidations
+            }
+
+    def _remove(self, key: Tuple[str, int]):
+        self._entries.pop(key, None)
+        self._matrix = None
+
+    def _rebuild_matrix(self):
+        keys = [key for key, entry in self._entries.items() if entry['embedding'] is not None]
+        self._matrix_keys = keys
+        self._matrix = np.stack([self._entries[key]['embedding'] for key in keys]) if keys else None
+
+    @staticmethod
+    def _copy(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [dict(doc) for doc in results]
@@ -1,36 +1,178 @@
 import os
-import chromadb
-from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Any
+import re
+import json
+import time
+import hashlib
+import itertools
+import threading
+from typing import List, Dict, Any, Optional, Tuple, Callable, Iterable, Iterator
 import logging
+from dataclasses import dataclass, field
+import numpy as np
 from .pdf_processor import pdf_processor
+from .text_chunker import text_chunker
+from .query_cache import QueryResultCache
+from .bm25_index import BM25Index, reciprocal_rank_fusion
+from .context_builder import ContextBuilder, create_token_counter
+from .registry import service_registry
 
 logger = logging.getLogger(__name__)
 
+COLLECTION_NAME = "telecom_knowledge"
+VERSIONED_COLLECTION_PATTERN = re.compile(rf'^{COLLECTION_NAME}_v(\d+)$')
+# Chunks of these sources are rebuilt from the resources folder on reload
+PDF_SOURCES = ('pdf_file', 'pdf_upload')
+
 class RAGService:
+    CHUNK_METADATA_FIELDS = ('file_path', 'extraction_method', 'page', 'heading', 'chunk_index', 'chunk_count')
+    
     def __init__(self):
         """Initialize RAG service with ChromaDB"""
-        self.client = chromadb.PersistentClient(path="./chroma_db")
+        # Heavy imports (ChromaDB, PyTorch) happen here, not when the module is imported
+        import chromadb
+        from .embedding_service import SentenceTransformerEmbedder
         
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        self.db_path = "./chroma_db"
+        self.client = chromadb.PersistentClient(path=self.db_path)
         
-        try:
-            self.collection = self.client.get_collection("telecom_knowledge")
-        except:
-            self.collection = self.client.create_collection(
-                name="telecom_knowledge",
-                metadata={"description": "Telecom support knowledge base"}
-            )
+        # One model instance serves both ingestion and queries
+        self.embedder = SentenceTransformerEmbedder()
+        self.embedding_model = self.embedder.model
+        self.ingest_batch_size = int(os.getenv('RAG_INGEST_BATCH_SIZE', 256))
+        self.stream_batch_documents = int(os.getenv('RAG_STREAM_BATCH_DOCUMENTS', 200))
+        self.query_cache = QueryResultCache()
+        # Cosine similarities mapped to confidence 0 and 1; escalation thresholds are read on this scale
+        self.confidence_min_similarity = float(os.getenv('RAG_CONFIDENCE_MIN_SIMILARITY', 0.15))
+        self.confidence_max_similarity = float(os.getenv('RAG_CONFIDENCE_MAX_SIMILARITY', 0.55))
+        # Prompt context is budgeted in tokens of the embedding model's tokenizer unless configured otherwise
+        self.context_builder = ContextBuilder(create_token_counter(getattr(self.embedding_model, 'tokenizer', None)))
+        
+        # Reloads build a new telecom_knowledge_v{n} collection next to the active
+        # one and switch this pointer file once it is validated
+        self.pointer_path = os.path.join(self.db_path, 'active_collection.json')
+        self.keep_previous_collections = int(os.getenv('RAG_KEEP_PREVIOUS_COLLECTIONS', 1))
+        self.reload_min_ratio = float(os.getenv('RAG_RELOAD_MIN_RATIO', 0.5))
+        self._write_lock = threading.RLock()
+        self._pointer_mtime = None
+        self.collection, self.collection_version = self._open_active_collection()
+        
+        # Keyword index over the same chunks, fused with vector results by reciprocal rank
+        self.hybrid_enabled = os.getenv('RAG_HYBRID_SEARCH', 'true').lower() == 'true'
+        self.rrf_k = int(os.getenv('RAG_RRF_K', 60))
+        self.bm25_path = os.path.join(self.db_path, 'bm25')
+        self.bm25 = self._open_bm25(self.collection)
         self._auto_load_pdfs()
     
+    def _collection_versions(self) -> Dict[int, str]:
+        """Knowledge-base collections by version; the unversioned legacy collection is version 0"""
+        versions = {}
+        for collection in self.client.list_collections():
+            match = VERSIONED_COLLECTION_PATTERN.match(collection.name)
+            if match:
+                versions[int(match.group(1))] = collection.name
+            elif collection.name == COLLECTION_NAME:
+                versions[0] = collection.name
+        return versions
+    
+    def _read_pointer(self) -> Optional[Dict[str, Any]]:
+        try:
+            self._pointer_mtime = os.stat(self.pointer_path).st_mtime_ns
+            with open(self.pointer_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def _write_pointer(self, name: str, version: int):
+        """Point every process at a collection; the rename makes the switch atomic"""
+        tmp_path = f"{self.pointer_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'collection': name, 'version': version, 'activated_at': time.time()}, f)
+        os.replace(tmp_path, self.pointer_path)
+        self._pointer_mtime = os.stat(self.pointer_path).st_mtime_ns
+    
+    def _open_active_collection(self):
+        pointer = self._read_pointer()
+        if pointer:
+            try:
+                collection = self.client.get_collection(pointer['collection'], embedding_function=self.embedder)
+                return collection, pointer['version']
+            except Exception as e:
+                logger.warning(f"Active collection {pointer.get('collection')} is unavailable: {str(e)}")
+        
+        # No usable pointer: adopt the newest existing collection, or start at v1
+        versions = self._collection_versions()
+        if versions:
+            version = max(versions)
+            collection = self.client.get_collection(versions[version], embedding_function=self.embedder)
+        else:
+            version = 1
+            collection = self._create_collection(version)
+        self._write_pointer(collection.name, version)
+        return collection, version
+    
+    def _create_collection(self, version: int):
+        return self.client.create_collection(
+            name=f"{COLLECTION_NAME}_v{version}",
+            metadata={"description": "Telecom support knowledge base", "version": version},
+            embedding_function=self.embedder
+        )
+    
+    def _open_bm25(self, collection) -> BM25Index:
+        """Load the collection's keyword index, rebuilding it if it does not match the collection"""
+        index = BM25Index(self.bm25_path, collection.name)
+        count = collection.count()
+        if len(index) != count:
+            logger.info(f"Building BM25 index for {collection.name} ({count} chunks)")
+            index.rebuild(self._iter_collection_texts(collection))
+        return index
+    
+    def _iter_collection_texts(self, collection):
+        offset = 0
+        while True:
+            page = collection.get(include=['documents'], limit=self.ingest_batch_size, offset=offset)
+            if not page['ids']:
+                return
+            offset += len(page['ids'])
+            yield from zip(page['ids'], page['documents'])
+    
+    def _sync_active_collection(self):
+        """Follow a collection switch or keyword-index update made by another process sharing ``chroma_db``"""
+        if self.bm25.refresh():
+            # Another process changed the collection: cached results may miss its chunks
+            self.query_cache.invalidate()
+        try:
+            if os.stat(self.pointer_path).st_mtime_ns == self._pointer_mtime:
+                return
+        except OSError:
+            return
+        pointer = self._read_pointer()
+        if pointer and pointer['collection'] != self.collection.name:
+            try:
+                collection = self.client.get_collection(pointer['collection'], embedding_function=self.embedder)
+                self.bm25 = self._open_bm25(collection)
+                self.collection = collection
+                self.collection_version = pointer['version']
+                self.query_cache.invalidate()
+                logger.info(f"Switched to knowledge-base collection {pointer['collection']}")
+            except Exception as e:
+                logger.error(f"Could not switch to collection {pointer['collection']}: {str(e)}")
+    
+    def get_collection_info(self) -> Dict[str, Any]:
+        return {
+            'active_collection': self.collection.name,
+            'version': self.collection_version,
+            'chunks': self.collection.count(),
+            'versions': sorted(self._collection_versions()),
+            'bm25': self.bm25.stats()
+        }
+    
     def _auto_load_pdfs(self):
         """Automatically load PDFs from resources folder on startup"""
         try:
             try:
-                existing_docs = self.collection.get()
-                if existing_docs and existing_docs['ids'] and len(existing_docs['ids']) > 0:
-                    logger.info(f"Collection already has {len(existing_docs['ids'])} documents, skipping auto-load")
+                existing_count = self.collection.count()
+                if existing_count > 0:
+                    logger.info(f"Collection already has {existing_count} documents, skipping auto-load")
                     return
             except Exception:
                 pass
@@ -51,113 +193,456 @@ class RAGService:
             logger.error(f"Error auto-loading PDFs: {str(e)}")
     
     def reload_pdfs(self) -> bool:
-        """Reload all PDFs from resources folder"""
+        """Rebuild the knowledge base from the resources folder without interrupting queries"""
+        return 'error' not in self.rebuild_collection()
+    
+    def rebuild_collection(self, force: bool = False) -> Dict[str, Any]:
+        """Build the next collection version, validate it and make it the active one.
+        
+        The new collection gets the current PDF chunks plus every non-PDF
+        chunk of the active collection, and the chunks of PDFs that reached
+        the resources folder after it was read (uploads finishing during
+        extraction). Embeddings of chunks that are already
+        indexed are copied instead of recomputed. Queries keep using the
+        active collection until the pointer is switched; if validation fails
+        the new collection is dropped and nothing changes; ``force`` skips the
+        check against shrinking below ``RAG_RELOAD_MIN_RATIO`` of the active
+        collection. Older versions beyond ``RAG_KEEP_PREVIOUS_COLLECTIONS``
+        are deleted afterwards.
+        """
+        start = time.time()
+        # Extraction and chunking are slow and touch no collection, so ingests go on meanwhile
         try:
-            self.collection.delete(where={})
-            self._auto_load_pdfs()
-            return True
+            listed_paths = pdf_processor.get_pdf_files()
+            pdf_documents = pdf_processor.get_documents_for_rag()
+            pdf_chunks = self._chunks_by_id(pdf_documents)
+            rebuilt_paths = {os.path.abspath(path) for path in listed_paths}
+            rebuilt_paths.update(os.path.abspath(doc['file_path']) for doc in pdf_documents)
+        except Exception as e:
+            logger.error(f"Error preparing knowledge-base rebuild: {str(e)}")
+            return {'error': str(e), 'active_collection': self.collection.name}
+        
+        # Writes wait for the build so nothing is added to the collection being replaced
+        with self._write_lock:
+            self._sync_active_collection()
+            active = self.collection
+            version = max(self._collection_versions(), default=0) + 1
+            name = f"{COLLECTION_NAME}_v{version}"
             
+            try:
+                collection = self._create_collection(version)
+            except Exception as e:
+                logger.error(f"Error preparing knowledge-base rebuild: {str(e)}")
+                return {'error': str(e), 'active_collection': active.name}
+            
+            try:
+                stats = self._fill_collection(collection, active, pdf_chunks, rebuilt_paths)
+                self._validate_collection(collection, active, stats, check_size=not force)
+            except Exception as e:
+                logger.error(f"Rebuild of {name} failed, keeping {active.name}: {str(e)}")
+                self._delete_collection(name)
+                return {'error': str(e), 'active_collection': active.name}
+            
+            bm25 = self._open_bm25(collection)
+            self._write_pointer(name, version)
+            self.collection, self.collection_version, self.bm25 = collection, version, bm25
+            self.query_cache.invalidate()
+            removed = self._collect_old_collections()
+            
+            result = {
+                'active_collection': name,
+                'version': version,
+                'previous_collection': active.name,
+                'documents': len(pdf_documents),
+                'chunks': stats['expected'],
+                'copied': stats['copied'],
+                'reused_embeddings': stats['reused'],
+                'embedded': stats['embedded'],
+                'removed_collections': removed,
+                'seconds': round(time.time() - start, 2)
+            }
+            logger.info(f"Activated knowledge-base collection {name}: {result}")
+            return result
+    
+    def _chunks_by_id(self, documents: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        chunk_by_id = {}
+        for chunk in text_chunker.chunk_documents(documents):
+            chunk_by_id.setdefault(self._chunk_id(chunk), chunk)
+        return chunk_by_id
+    
+    @staticmethod
+    def _carried_over(metadata: Dict[str, Any], rebuilt_paths: set) -> bool:
+        """Whether a chunk of the active collection is copied as is into a rebuilt one"""
+        if metadata.get('source') not in PDF_SOURCES:
+            return True
+        # PDFs the rebuild did not read, unless they have been deleted since
+        file_path = metadata.get('file_path')
+        return bool(file_path) and os.path.abspath(file_path) not in rebuilt_paths and os.path.exists(file_path)
+    
+    def _fill_collection(self, collection, active, chunk_by_id: Dict[str, Dict[str, Any]],
+                         rebuilt_paths: set) -> Dict[str, Any]:
+        stats = {'copied': 0, 'reused': 0, 'embedded': 0, 'probe': None}
+        
+        # 1. Carry over chunks that did not come from the rebuilt PDFs, with their embeddings
+        offset = 0
+        while True:
+            page = active.get(include=['documents', 'metadatas', 'embeddings'],
+                              limit=self.ingest_batch_size, offset=offset)
+            if not page['ids']:
+                break
+            offset += len(page['ids'])
+            keep = [i for i, metadata in enumerate(page['metadatas'])
+                    if self._carried_over(metadata or {}, rebuilt_paths)]
+            if keep:
+                collection.add(
+                    ids=[page['ids'][i] for i in keep],
+                    embeddings=[page['embeddings'][i] for i in keep],
+                    documents=[page['documents'][i] for i in keep],
+                    metadatas=[page['metadatas'][i] for i in keep]
+                )
+                stats['copied'] += len(keep)
+                stats['probe'] = stats['probe'] or page['documents'][keep[0]]
+        
+        # 2. Add the current PDF chunks, embedding only those not indexed before
+        pdf_ids = list(chunk_by_id)
+        for start in range(0, len(pdf_ids), self.ingest_batch_size):
+            batch_ids = pdf_ids[start:start + self.ingest_batch_size]
+            existing = active.get(ids=batch_ids, include=['embeddings'])
+            embeddings = dict(zip(existing['ids'], existing['embeddings'] if existing['embeddings'] is not None else []))
+            reused = [doc_id for doc_id in batch_ids if doc_id in embeddings]
+            missing = [doc_id for doc_id in batch_ids if doc_id not in embeddings]
+            if reused:
+                collection.add(
+                    ids=reused,
+                    embeddings=[embeddings[doc_id] for doc_id in reused],
+                    documents=[chunk_by_id[doc_id]['content'] for doc_id in reused],
+                    metadatas=[self._build_chunk_metadata(chunk_by_id[doc_id]) for doc_id in reused]
+                )
+            if missing:
+                collection.add(
+                    ids=missing,
+                    documents=[chunk_by_id[doc_id]['content'] for doc_id in missing],
+                    metadatas=[self._build_chunk_metadata(chunk_by_id[doc_id]) for doc_id in missing]
+                )
+            stats['reused'] += len(reused)
+            stats['embedded'] += len(missing)
+        if pdf_ids:
+            stats['probe'] = chunk_by_id[pdf_ids[0]]['content']
+        
+        stats['expected'] = stats['copied'] + len(pdf_ids)
+        return stats
+    
+    def _validate_collection(self, collection, active, stats: Dict[str, Any], check_size: bool = True):
+        """Raise if the rebuilt collection is incomplete, much smaller than the active one or not queryable"""
+        count = collection.count()
+        if count != stats['expected']:
+            raise ValueError(f"{collection.name} has {count} chunks, expected {stats['expected']}")
+        
+        active_count = active.count()
+        if check_size and active_count and count < active_count * self.reload_min_ratio:
+            raise ValueError(f"{collection.name} has {count} chunks, fewer than "
+                             f"{self.reload_min_ratio:.0%} of the {active_count} in {active.name}")
+        
+        if stats['probe']:
+            # Smoke query through the embedding model
+            results = collection.query(query_texts=[stats['probe'][:500]], n_results=1)
+            if not results['ids'] or not results['ids'][0]:
+                raise ValueError(f"Smoke query against {collection.name} returned no results")
+    
+    def _delete_collection(self, name: str):
+        try:
+            self.client.delete_collection(name)
         except Exception as e:
-            logger.error(f"Error reloading PDFs: {str(e)}")
-            return False
+            logger.warning(f"Could not delete collection {name}: {str(e)}")
+        BM25Index(self.bm25_path, name).delete_files()
+    
+    def _collect_old_collections(self) -> List[str]:
+        """Delete inactive versions, keeping the newest few for in-flight queries and rollback"""
+        versions = self._collection_versions()
+        previous = sorted((v for v in versions if v != self.collection_version), reverse=True)
+        removed = [versions[v] for v in previous[self.keep_previous_collections:]]
+        for name in removed:
+            self._delete_collection(name)
+        if removed:
+            logger.info(f"Removed old knowledge-base collections: {removed}")
+        return removed
+    
+    def add_documents(self, documents: List[Dict[str, Any]], prune_stale: bool = False) -> bool:
+        """Chunk documents and add the chunks to the knowledge base"""
+        result = self.ingest_documents(documents, prune_stale=prune_stale)
+        return 'error' not in result
+    
+    def ingest_documents(self, documents: List[Dict[str, Any]], prune_stale: bool = False,
+                         progress: Optional[Callable[[str, int, int], None]] = None) -> Dict[str, Any]:
+        """Upsert documents by content hash, embedding only chunks that are not indexed yet.
+        
+        With ``prune_stale`` every document is treated as the full current
+        version of its source (``file_path`` or ``title``), so chunks of that
+        source which no longer appear are deleted. ``progress(stage, done, total)``
+        is called for the chunking stage and after every embedded batch.
+        """
+        with self._write_lock:
+            self._sync_active_collection()
+            return self._ingest_documents(documents, prune_stale, progress)
     
-    def add_documents(self, documents: List[Dict[str, Any]]) -> bool:
-        """Add documents to the knowledge base"""
+    def _ingest_documents(self, documents: List[Dict[str, Any]], prune_stale: bool,
+                          progress: Optional[Callable[[str, int, int], None]]) -> Dict[str, Any]:
         try:
-            existing_ids = set()
-            try:
-                existing_docs = self.collection.get()
-                if existing_docs and existing_docs['ids']:
-                    existing_ids = set(existing_docs['ids'])
-            except Exception:
-                pass
+            if progress:
+                progress('chunking', 0, len(documents))
+            chunks = text_chunker.chunk_documents(documents)
             
-            texts = []
-            metadatas = []
-            ids = []
+            chunk_by_id = {}
+            ids_by_source = {}
+            for chunk in chunks:
+                doc_id = self._chunk_id(chunk)
+                chunk_by_id.setdefault(doc_id, chunk)
+                ids_by_source.setdefault(self._source_key(chunk), set()).add(doc_id)
             
-            for i, doc in enumerate(documents):
-                doc_id = f"doc_{i}"
-                
-                if doc_id in existing_ids:
-                    logger.warning(f"Document {doc_id} already exists, skipping")
-                    continue
-                
-                texts.append(doc['content'])
-                metadatas.append({
-                    'title': doc.get('title', ''),
-                    'category': doc.get('category', ''),
-                    'source': doc.get('source', '')
-                })
-                ids.append(doc_id)
+            # Only look up the incoming ids instead of scanning the whole collection
+            existing_ids = set()
+            if chunk_by_id:
+                existing = self.collection.get(ids=list(chunk_by_id.keys()), include=[])
+                existing_ids = set(existing['ids'])
             
-            if texts:
+            new_ids = [doc_id for doc_id in chunk_by_id if doc_id not in existing_ids]
+            if progress:
+                progress('embedding', 0, len(new_ids))
+            for start in range(0, len(new_ids), self.ingest_batch_size):
+                batch_ids = new_ids[start:start + self.ingest_batch_size]
                 self.collection.add(
-                    documents=texts,
-                    metadatas=metadatas,
-                    ids=ids
+                    documents=[chunk_by_id[doc_id]['content'] for doc_id in batch_ids],
+                    metadatas=[self._build_chunk_metadata(chunk_by_id[doc_id]) for doc_id in batch_ids],
+                    ids=batch_ids
                 )
-                logger.info(f"Added {len(texts)} new documents to knowledge base")
-            else:
-                logger.info("No new documents to add (all already exist)")
+                self.bm25.add(batch_ids, [chunk_by_id[doc_id]['content'] for doc_id in batch_ids])
+                if progress:
+                    progress('embedding', start + len(batch_ids), len(new_ids))
             
-            return True
+            removed = 0
+            if prune_stale:
+                for source_key, current_ids in ids_by_source.items():
+                    if not source_key:
+                        continue
+                    field, value = source_key
+                    indexed = self.collection.get(where={field: value}, include=[])
+                    stale_ids = [doc_id for doc_id in indexed['ids'] if doc_id not in current_ids]
+                    if stale_ids:
+                        self.collection.delete(ids=stale_ids)
+                        self.bm25.remove(stale_ids)
+                        removed += len(stale_ids)
+            
+            if new_ids or removed:
+                self.query_cache.invalidate()
+            
+            result = {
+                'documents': len(documents),
+                'chunks': len(chunk_by_id),
+                'added': len(new_ids),
+                'unchanged': len(chunk_by_id) - len(new_ids),
+                'removed': removed
+            }
+            logger.info(f"Ingested {result['documents']} documents: {result['added']} chunks added, "
+                        f"{result['unchanged']} unchanged, {result['removed']} removed")
+            return result
             
         except Exception as e:
             logger.error(f"Error adding documents: {str(e)}")
-            return False
+            return {'error': str(e)}
+    
+    def ingest_document_stream(self, documents: Iterable[Dict[str, Any]],
+                               batch_documents: int = None) -> Iterator[Dict[str, Any]]:
+        """Ingest documents from an iterable in fixed-size batches, yielding each batch's result.
+        
+        Only one batch of documents and its chunks is held in memory at a
+        time, so arbitrarily large imports can be fed from a reader.
+        """
+        batch_documents = batch_documents or self.stream_batch_documents
+        documents = iter(documents)
+        for number in itertools.count(1):
+            batch = list(itertools.islice(documents, batch_documents))
+            if not batch:
+                return
+            result = self.ingest_documents(batch)
+            result['batch'] = number
+            result.setdefault('documents', len(batch))
+            yield result
+    
+    def _source_key(self, chunk: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+        """Identify the source document a chunk belongs to"""
+        if chunk.get('file_path'):
+            return ('file_path', chunk['file_path'])
+        if chunk.get('title'):
+            return ('title', chunk['title'])
+        return None
+    
+    def _chunk_id(self, chunk: Dict[str, Any]) -> str:
+        """Stable content-addressed id: hash of the source identity and chunk text"""
+        source_key = self._source_key(chunk)
+        source = source_key[1] if source_key else ''
+        digest = hashlib.sha256(f"{source}\x00{chunk['content']}".encode('utf-8')).hexdigest()
+        return f"chunk_{digest[:32]}"
+    
+    def _build_chunk_metadata(self, chunk: Dict[str, Any]) -> Dict[str, Any]:
+        """Build Chroma metadata for a chunk (Chroma only accepts scalar, non-null values)"""
+        metadata = {
+            'title': chunk.get('title', ''),
+            'category': chunk.get('category', ''),
+            'source': chunk.get('source', '')
+        }
+        for key in self.CHUNK_METADATA_FIELDS:
+            value = chunk.get(key)
+            if isinstance(value, (str, int, float, bool)):
+                metadata[key] = value
+        return metadata
     
     def search_relevant_docs(self, query: str, n_results: int = 5) -> List[Dict[str, Any]]:
-        """Search for relevant documents using semantic similarity"""
+        """Search for relevant documents by semantic similarity, fused with BM25 keyword
+        matches when hybrid search is on; served from the query cache when possible"""
         try:
-            results = self.collection.query(
-                query_texts=[query],
-                n_results=n_results
-            )
+            self._sync_active_collection()
+            cached = self.query_cache.get(query, n_results)
+            if cached is not None:
+                return cached
+            
+            generation = self.query_cache.generation
+            query_embedding = None
+            if self.query_cache.semantic_enabled:
+                query_embedding = self.embedder.embed_query(query)
+                cached = self.query_cache.get_similar(query, query_embedding, n_results)
+                if cached is not None:
+                    self.query_cache.put(query, n_results, cached, query_embedding, generation)
+                    return cached
+            
+            if self.hybrid_enabled and query_embedding is None:
+                # Fused results may include keyword hits whose distance is computed from this embedding
+                query_embedding = self.embedder.embed_query(query)
+            
+            if query_embedding is not None:
+                # Reuse the embedding computed for the semantic tier
+                results = self.collection.query(
+                    query_embeddings=[query_embedding.tolist()],
+                    n_results=n_results
+                )
+            else:
+                results = self.collection.query(
+                    query_texts=[query],
+                    n_results=n_results
+                )
             
             relevant_docs = []
             if results['documents'] and results['documents'][0]:
                 for i, doc in enumerate(results['documents'][0]):
                     relevant_docs.append({
+                        'id': results['ids'][0][i],
                         'content': doc,
                         'metadata': results['metadatas'][0][i] if results['metadatas'] else {},
                         'distance': results['distances'][0][i] if results['distances'] else 0
                     })
             
+            if self.hybrid_enabled:
+                relevant_docs = self._fuse_with_keyword_hits(query, query_embedding, relevant_docs, n_results)
+            
+            self.query_cache.put(query, n_results, relevant_docs, query_embedding, generation)
             return relevant_docs
             
         except Exception as e:
             logger.error(f"Error searching documents: {str(e)}")
             return []
     
-    def get_context_for_query(self, query: str, max_context_length: int = 2000) -> str:
-        """Get relevant context for a query"""
-        relevant_docs = self.search_relevant_docs(query)
+    def _fuse_with_keyword_hits(self, query: str, query_embedding: np.ndarray, vector_docs: List[Dict[str, Any]],
+                                n_results: int) -> List[Dict[str, Any]]:
+        """Merge the top ``n_results`` of the vector and BM25 rankings with reciprocal-rank fusion"""
+        keyword_hits = self.bm25.search(query, n_results)
+        if not keyword_hits:
+            return vector_docs
         
-        context_parts = []
-        current_length = 0
+        fused = reciprocal_rank_fusion(
+            [[doc['id'] for doc in vector_docs], [doc_id for doc_id, _ in keyword_hits]],
+            k=self.rrf_k
+        )[:n_results]
         
-        for doc in relevant_docs:
-            content = doc['content']
-            if current_length + len(content) <= max_context_length:
-                context_parts.append(content)
-                current_length += len(content)
-            else:
-                break
+        docs_by_id = {doc['id']: doc for doc in vector_docs}
+        missing = [doc_id for doc_id, _ in fused if doc_id not in docs_by_id]
+        if missing:
+            fetched = self.collection.get(ids=missing, include=['documents', 'metadatas', 'embeddings'])
+            for i, doc_id in enumerate(fetched['ids']):
+                # Squared L2, the metric Chroma reports for the vector hits
+                embedding = np.asarray(fetched['embeddings'][i], dtype=np.float32)
+                docs_by_id[doc_id] = {
+                    'id': doc_id,
+                    'content': fetched['documents'][i],
+                    'metadata': fetched['metadatas'][i] or {},
+                    'distance': float(np.sum((embedding - query_embedding) ** 2))
+                }
         
-        return "\n\n".join(context_parts)
+        keyword_ids = {doc_id for doc_id, _ in keyword_hits}
+        vector_ids = {doc['id'] for doc in vector_docs}
+        relevant_docs = []
+        for doc_id, score in fused:
+            if doc_id in docs_by_id:
+                relevant_docs.append({
+                    **docs_by_id[doc_id],
+                    'rrf_score': round(score, 6),
+                    'matched_by': [name for name, ids in (('vector', vector_ids), ('keyword', keyword_ids)) if doc_id in ids]
+                })
+        return relevant_docs
     
-    def calculate_confidence(self, query: str, response: str) -> float:
-        """Calculate confidence score for a response based on relevant documents"""
-        relevant_docs = self.search_relevant_docs(query, n_results=3)
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters of the query result cache"""
+        return self.query_cache.stats()
+    
+    def retrieve(self, query: str, n_results: int = 5, max_context_tokens: int = None) -> 'RetrievalResult':
+        """Run a single retrieval and derive both the prompt context and the confidence from it"""
+        relevant_docs = self.search_relevant_docs(query, n_results=n_results)
+        context = self.context_builder.build(relevant_docs, max_context_tokens)
         
+        return RetrievalResult(
+            query=query,
+            documents=relevant_docs,
+            context=context.text,
+            confidence=self._confidence_from_docs(relevant_docs[:3]),
+            context_tokens=context.tokens,
+            context_budget=context.budget,
+            context_documents=len(context.documents)
+        )
+    
+    def _confidence_from_docs(self, relevant_docs: List[Dict[str, Any]]) -> float:
+        """Map retrieval distances to a confidence score in [0.1, 1]"""
         if not relevant_docs:
             return 0.3  # Low confidence if no relevant docs found
         
-        avg_distance = sum(doc['distance'] for doc in relevant_docs) / len(relevant_docs)
-        confidence = max(0.1, 1.0 - avg_distance)
+        # Embeddings are normalized, so the squared L2 distance is 2 - 2 * cosine
+        avg_similarity = sum(1.0 - doc['distance'] / 2 for doc in relevant_docs) / len(relevant_docs)
+        # Rescale the band of cosine similarities MiniLM gives real matches to [0, 1]
+        low, high = self.confidence_min_similarity, self.confidence_max_similarity
+        confidence = (avg_similarity - low) / (high - low)
         
-        return min(1.0, confidence)
+        return min(1.0, max(0.1, confidence))
+    
+    def get_context_for_query(self, query: str, max_context_tokens: int = None) -> str:
+        """Get relevant context for a query, within ``max_context_tokens`` (default ``RAG_CONTEXT_TOKENS``)"""
+        return self.retrieve(query, max_context_tokens=max_context_tokens).context
+    
+    def calculate_confidence(self, query: str, response: str) -> float:
+        """Calculate confidence score for a response based on relevant documents"""
+        return self._confidence_from_docs(self.search_relevant_docs(query, n_results=3))
+
+
+@dataclass
+class RetrievalResult:
+    """Documents retrieved for one query, with the context and confidence derived from them"""
+    query: str
+    documents: List[Dict[str, Any]] = field(default_factory=list)
+    context: str = ""
+    confidence: float = 0.3
+    context_tokens: int = 0
+    context_budget: int = 0
+    context_documents: int = 0
+    
+    @property
+    def distances(self) -> List[float]:
+        return [doc['distance'] for doc in self.documents]
 
-# Global RAG service instance
-rag_service = RAGService()
+# Global RAG service instance, created on first use or by the startup warm-up
+rag_service = service_registry.lazy('rag', RAGService)
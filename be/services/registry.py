@@ -0,0 +1,165 @@
+import os
+import sys
+import time
+import threading
+from typing import Callable, Dict, Any, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+def eventlet_patched() -> bool:
+    """Whether eventlet has replaced ``threading`` with green threads"""
+    # Only consulted if the app already imported eventlet (wsgi.py does before patching)
+    patcher = sys.modules.get('eventlet.patcher')
+    return patcher is not None and patcher.is_monkey_patched('thread')
+
+
+def _native_lock():
+    # Shared between the warm-up's native thread and green request handlers
+    if eventlet_patched():
+        from eventlet import patcher
+        return patcher.original('threading').Lock()
+    return threading.Lock()
+
+
+class _ServiceEntry:
+    def __init__(self, name: str, factory: Callable, critical: bool):
+        self.name = name
+        self.factory = factory
+        self.critical = critical
+        self.instance = None
+        self.state = 'pending'  # pending, loading, ready, failed
+        self.error = None
+        self.load_seconds = None
+        self.lock = _native_lock()
+
+
+class LazyService:
+    """Stand-in for a service singleton that creates it on first attribute access"""
+
+    __slots__ = ('_registry', '_name')
+
+    def __init__(self, registry: 'ServiceRegistry', name: str):
+        object.__setattr__(self, '_registry', registry)
+        object.__setattr__(self, '_name', name)
+
+    def __getattr__(self, attr):
+        return getattr(self._registry.get(self._name), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._registry.get(self._name), attr, value)
+
+    def __repr__(self):
+        return f"<LazyService {self._name} ({self._registry.state(self._name)})>"
+
+
+class ServiceRegistry:
+    """Creates heavy service singletons on first use or in a background warm-up.
+
+    Modules register a factory and export the returned ``LazyService`` proxy
+    under the usual global name, so importing a service is cheap and the
+    application can answer liveness checks while models, vector stores and
+    documents are still loading. Readiness means every critical service has
+    been created successfully.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.warmup_enabled = os.getenv('SERVICE_WARMUP', 'true').lower() == 'true'
+
+    def lazy(self, name: str, factory: Callable, critical: bool = True) -> LazyService:
+        """Register a service factory and return its proxy"""
+        with self._lock:
+            if name not in self._entries:
+                self._entries[name] = _ServiceEntry(name, factory, critical)
+        return LazyService(self, name)
+
+    def get(self, name: str):
+        """Return the service instance, creating it on first use"""
+        entry = self._entries[name]
+        if entry.instance is not None:
+            return entry.instance
+
+        # Concurrent callers wait for the one creating the service
+        self._acquire(entry.lock)
+        try:
+            if entry.instance is not None:
+                return entry.instance
+
+            entry.state = 'loading'
+            start = time.time()
+            try:
+                instance = entry.factory()
+            except Exception as e:
+                entry.state = 'failed'
+                entry.error = str(e)
+                logger.error(f"Failed to initialize service '{name}': {str(e)}")
+                raise
+
+            entry.instance = instance
+            entry.load_seconds = round(time.time() - start, 3)
+            entry.state = 'ready'
+            entry.error = None
+            logger.info(f"Service '{name}' ready in {entry.load_seconds}s")
+            return instance
+        finally:
+            entry.lock.release()
+
+    @staticmethod
+    def _acquire(lock):
+        if not eventlet_patched():
+            lock.acquire()
+            return
+        # A green thread must not block the hub on a native lock held by the warm-up
+        import eventlet
+        while not lock.acquire(blocking=False):
+            eventlet.sleep(0.05)
+
+    def state(self, name: str) -> str:
+        return self._entries[name].state
+
+    def is_ready(self) -> bool:
+        return all(entry.state == 'ready' for entry in self._entries.values() if entry.critical)
+
+    def warm_up(self, names: Optional[List[str]] = None):
+        """Create services on a background OS thread, in registration order by default.
+
+        Under eventlet the thread comes from eventlet's native thread pool;
+        a green thread would block the hub, and every request, while models load.
+        """
+        names = names or list(self._entries)
+
+        def run():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception:
+                    # Already logged; the service is retried on first use
+                    pass
+
+        if eventlet_patched():
+            import eventlet
+            from eventlet import tpool
+            return eventlet.spawn(tpool.execute, run)
+        thread = threading.Thread(target=run, name='service-warmup', daemon=True)
+        thread.start()
+        return thread
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            name: {
+                'state': entry.state,
+                'critical': entry.critical,
+                'load_seconds': entry.load_seconds,
+                'error': entry.error
+            }
+            for name, entry in self._entries.items()
+        }
+
+    def uptime_seconds(self) -> int:
+        return int(time.time() - self.started_at)
+
+# Global service registry instance
+service_registry = ServiceRegistry()
@@ -0,0 +1,220 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ResponseCacheBackend(ABC):
+    """Storage interface for cached LLM responses"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Entry stored under ``key``, or None if missing or expired"""
+
+    @abstractmethod
+    def set(self, key: str, entry: Dict[str, Any], ttl_seconds: int):
+        """Store ``entry`` for ``ttl_seconds``"""
+
+    @abstractmethod
+    def clear(self):
+        """Drop every entry"""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        """Backend name and size counters"""
+
+
+class InMemoryResponseCache(ResponseCacheBackend):
+    """Per-process LRU store"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry:
+                return None
+            if entry['expires_at'] <= time.time():
+                del self._entries[key]
+                return None
+            entry['hits'] += 1
+            self._entries.move_to_end(key)
+            return dict(entry)
+
+    def set(self, key: str, entry: Dict[str, Any], ttl_seconds: int):
+        with self._lock:
+            self._entries[key] = dict(entry, hits=0, created_at=time.time(), expires_at=time.time() + ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'backend': 'memory',
+                'entries': len(self._entries),
+                'tokens_saved': sum(e['hits'] * e['tokens_used'] for e in self._entries.values())
+            }
+
+
+class SQLiteResponseCache(ResponseCacheBackend):
+    """Disk store shared by every worker process on the host"""
+
+    def __init__(self, path: str = 'llm_cache.db', max_entries: int = 10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS response_cache (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    tokens_used INTEGER NOT NULL DEFAULT 0,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_response_cache_expires_at ON response_cache (expires_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        conn = self._connect()
+        with conn:
+            row = conn.execute(
+                "SELECT model, response, tokens_used, hits, created_at, expires_at "
+                "FROM response_cache WHERE key = ? AND expires_at > ?",
+                (key, time.time())
+            ).fetchone()
+            if not row:
+                return None
+            conn.execute("UPDATE response_cache SET hits = hits + 1 WHERE key = ?", (key,))
+
+        return {
+            'model': row[0],
+            'response': json.loads(row[1]),
+            'tokens_used': row[2],
+            'hits': row[3] + 1,
+            'created_at': row[4],
+            'expires_at': row[5]
+        }
+
+    def set(self, key: str, entry: Dict[str, Any], ttl_seconds: int):
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO response_cache "
+                "(key, model, response, tokens_used, hits, created_at, expires_at) VALUES (?, ?, ?, ?, 0, ?, ?)",
+                (key, entry['model'], json.dumps(entry['response']), entry['tokens_used'], now, now + ttl_seconds)
+            )
+            conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (now,))
+            conn.execute(
+                "DELETE FROM response_cache WHERE key IN ("
+                "SELECT key FROM response_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def clear(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM response_cache")
+
+    def stats(self) -> Dict[str, Any]:
+        row = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(hits * tokens_used), 0) FROM response_cache WHERE expires_at > ?",
+            (time.time(),)
+        ).fetchone()
+        return {
+            'backend': 'sqlite',
+            'path': self.path,
+            'entries': row[0],
+            'tokens_saved': row[1]
+        }
+
+
+class ResponseCache:
+    """LLM response cache keyed by model, normalized user message and context fingerprint"""
+
+    def __init__(self, backend: ResponseCacheBackend, ttl_seconds: int = 3600):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model: str, user_message: str, context: str) -> str:
+        normalized_message = re.sub(r'\s+', ' ', user_message.lower()).strip()
+        context_hash = hashlib.sha256(context.encode('utf-8')).hexdigest()
+        return hashlib.sha256(f"{model}\x00{normalized_message}\x00{context_hash}".encode('utf-8')).hexdigest()
+
+    def get(self, model: str, user_message: str, context: str) -> Optional[Dict[str, Any]]:
+        try:
+            entry = self.backend.get(self.make_key(model, user_message, context))
+        except Exception as e:
+            logger.warning(f"Response cache lookup failed: {str(e)}")
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def put(self, model: str, user_message: str, context: str, response: str, tokens_used: int):
+        try:
+            self.backend.set(
+                self.make_key(model, user_message, context),
+                {'model': model, 'response': response, 'tokens_used': tokens_used},
+                self.ttl_seconds
+            )
+        except Exception as e:
+            logger.warning(f"Response cache write failed: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.backend.stats()
+        stats.update({'hits': self.hits, 'misses': self.misses})
+        return stats
+
+
+def create_response_cache() -> Optional[ResponseCache]:
+    """Build the response cache configured by LLM_CACHE_* environment variables"""
+    backend_name = os.getenv('LLM_CACHE_BACKEND', 'memory').lower()
+    ttl_seconds = int(os.getenv('LLM_CACHE_TTL', 3600))
+    max_entries = int(os.getenv('LLM_CACHE_SIZE', 1024))
+
+    if backend_name in ('none', 'off', 'disabled'):
+        return None
+    if backend_name == 'sqlite':
+        backend = SQLiteResponseCache(os.getenv('LLM_CACHE_PATH', 'llm_cache.db'), max_entries=max_entries)
+    elif backend_name == 'memory':
+        backend = InMemoryResponseCache(max_entries=max_entries)
+    else:
+        raise ValueError(f"Unknown LLM_CACHE_BACKEND: {backend_name}")
+
+    logger.info(f"LLM response cache enabled ({backend_name}, ttl={ttl_seconds}s)")
+    return ResponseCache(backend, ttl_seconds=ttl_seconds)
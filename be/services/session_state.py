@@ -0,0 +1,152 @@
+import os
+import re
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Dict, Any, Optional, FrozenSet
+from models.chat_models import ChatSession, ChatMessage
+import logging
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_WORD_PATTERN = re.compile(r"[a-z0-9*#']+")
+
+def query_fingerprint(message: str) -> FrozenSet[str]:
+    """Order-insensitive fingerprint of the meaningful words of a query"""
+    return frozenset(word for word in FINGERPRINT_WORD_PATTERN.findall(message.lower()) if len(word) > 3)
+
+
+class SessionState:
+    """Running conversation statistics of one chat session"""
+
+    def __init__(self, session_id: int, started_at: datetime, window: int = 10):
+        self.session_id = session_id
+        self.started_at = started_at
+        self.message_count = 0
+        self.user_message_count = 0
+        self.fallback_count = 0
+        self.last_message_id = 0
+        self.recent_confidences = deque(maxlen=window)
+        self.recent_queries = deque(maxlen=window)
+        self.last_query_repeats = 0
+
+    @property
+    def rolling_confidence(self) -> Optional[float]:
+        if not self.recent_confidences:
+            return None
+        return sum(self.recent_confidences) / len(self.recent_confidences)
+
+    def duration_seconds(self, now: datetime = None) -> int:
+        now = now or datetime.utcnow()
+        return max(0, int((now - self.started_at).total_seconds()))
+
+    def similar_query_count(self, fingerprint: FrozenSet[str], threshold: float) -> int:
+        """Number of recent queries whose word sets overlap this one by at least ``threshold`` (Jaccard)"""
+        if not fingerprint:
+            return 0
+        count = 0
+        for previous in self.recent_queries:
+            union = len(fingerprint | previous)
+            if union and len(fingerprint & previous) / union >= threshold:
+                count += 1
+        return count
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'session_id': self.session_id,
+            'started_at': self.started_at.isoformat(),
+            'message_count': self.message_count,
+            'user_message_count': self.user_message_count,
+            'fallback_count': self.fallback_count,
+            'rolling_confidence': self.rolling_confidence,
+            'last_query_repeats': self.last_query_repeats
+        }
+
+
+class SessionStateStore:
+    """In-memory, incrementally updated conversation state per session.
+
+    State is updated as messages are saved and rebuilt from ``ChatMessage``
+    rows the first time a session is seen by this process, so escalation
+    rules get real message counts, durations, confidence and repetition
+    data without re-reading history on every turn.
+    """
+
+    def __init__(self,
+                 max_sessions: int = None,
+                 fallback_confidence_threshold: float = 0.4,
+                 similarity_threshold: float = 0.7):
+        self.max_sessions = max_sessions or int(os.getenv('SESSION_STATE_MAX_SESSIONS', 10000))
+        self.fallback_confidence_threshold = fallback_confidence_threshold
+        self.similarity_threshold = similarity_threshold
+        self._states = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, session_id: int) -> Optional[SessionState]:
+        """Get state for a session, rebuilding it from the database on a miss"""
+        with self._lock:
+            state = self._states.get(session_id)
+            if state:
+                self._states.move_to_end(session_id)
+                return state
+
+        state = self._rebuild(session_id)
+        if state is None:
+            return None
+
+        with self._lock:
+            # Another worker may have rebuilt it meanwhile; keep the first one
+            existing = self._states.get(session_id)
+            if existing:
+                return existing
+            self._states[session_id] = state
+            while len(self._states) > self.max_sessions:
+                self._states.popitem(last=False)
+            return state
+
+    def record_message(self, message: ChatMessage):
+        """Apply a newly saved message to its session's state"""
+        state = self.get(message.session_id)
+        if state is None:
+            return
+        with self._lock:
+            self._apply(state, message)
+
+    def evict(self, session_id: int):
+        with self._lock:
+            self._states.pop(session_id, None)
+
+    def _rebuild(self, session_id: int) -> Optional[SessionState]:
+        session = ChatSession.query.get(session_id)
+        if not session:
+            return None
+
+        state = SessionState(session_id, session.created_at or datetime.utcnow())
+        messages = ChatMessage.query.filter_by(session_id=session_id).order_by(ChatMessage.id.asc()).all()
+        for message in messages:
+            self._apply(state, message)
+
+        logger.info(f"Rebuilt conversation state for session {session_id} from {len(messages)} messages")
+        return state
+
+    def _apply(self, state: SessionState, message: ChatMessage):
+        # Messages already folded in by a rebuild are skipped
+        if message.id is not None and message.id <= state.last_message_id:
+            return
+        state.last_message_id = message.id or state.last_message_id
+        state.message_count += 1
+
+        metadata = message.message_metadata or {}
+        if message.role == 'user':
+            state.user_message_count += 1
+            fingerprint = query_fingerprint(message.content)
+            state.last_query_repeats = state.similar_query_count(fingerprint, self.similarity_threshold)
+            state.recent_queries.append(fingerprint)
+        elif message.role == 'ai' and 'confidence' in metadata:
+            confidence = metadata['confidence']
+            state.recent_confidences.append(confidence)
+            if metadata.get('fallback') or confidence < self.fallback_confidence_threshold:
+                state.fallback_count += 1
+
+# Global session state store instance
+session_state_store = SessionStateStore()
@@ -2,11 +2,17 @@ from typing import Dict, Any, List, Optional
 from models.chat_models import ChatSession, ChatMessage, Escalation
 from models.user_models import User
 from services.llm_service import llm_service
+from services.keyword_matcher import keyword_matcher, KeywordMatches
 from utils.db import db
+from flask import current_app
+from sqlalchemy import func
+from concurrent.futures import ThreadPoolExecutor
+import os
 import logging
+import threading
 from datetime import datetime, timedelta
 import re
-from collections import Counter
+from collections import Counter, OrderedDict
 
 logger = logging.getLogger(__name__)
 
@@ -27,8 +33,40 @@ class SessionSummaryService:
             'negative': ['bad', 'terrible', 'awful', 'angry', 'frustrated', 'annoyed', 'upset', 'mad'],
             'neutral': ['okay', 'fine', 'normal', 'average', 'standard']
         }
+        
+        self.key_point_keywords = {
+            'billing': ['billing', 'bill', 'charge', 'payment'],
+            'connectivity': ['internet', 'wifi', 'connection', 'speed'],
+            'phone': ['phone', 'calling', 'text'],
+            'frustration': ['frustrated', 'angry', 'upset', 'annoyed'],
+            'human_request': ['manager', 'supervisor', 'human', 'agent']
+        }
+        
+        self.flow_keywords = {
+            'frustration': ['frustrated', 'angry', 'upset'],
+            'human_request': ['manager', 'supervisor', 'human']
+        }
+        
+        tables = {}
+        for prefix, groups in (('issue', self.issue_keywords), ('sentiment', self.sentiment_keywords),
+                               ('keypoint', self.key_point_keywords), ('flow', self.flow_keywords)):
+            for name, keywords in groups.items():
+                tables[f'{prefix}.{name}'] = keywords
+        keyword_matcher.register('summary', tables)
+        
+        # Summary cache: session id -> {'summary', 'last_message_id'}
+        self._cache = OrderedDict()
+        self._cache_size = int(os.getenv('SUMMARY_CACHE_SIZE', 1000))
+        self._inflight = {}
+        self._cache_lock = threading.Lock()
+        self._refresh_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('SUMMARY_REFRESH_WORKERS', 2)),
+            thread_name_prefix='summary-refresh'
+        )
+        self.inflight_wait_seconds = float(os.getenv('SUMMARY_INFLIGHT_WAIT', 15))
 
-    def generate_session_summary(self, session_id: int) -> Dict[str, Any]:
+    def generate_session_summary(self, session_id: int, ai_summary: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """Build the agent-facing summary; a given ``ai_summary`` is reused instead of calling the LLM"""
         try:
             session = ChatSession.query.get(session_id)
             if not session:
@@ -37,18 +75,22 @@ class SessionSummaryService:
             escalation = Escalation.query.filter_by(session_id=session_id, status='pending').first()
             user = User.query.filter_by(user_id=session.user_id).first()
             
+            # Match every user message once and share the hits across analyzers
+            user_matches = self._match_user_messages(messages)
+            
             summary_data = {
                 'session_id': session_id,
                 'room_id': session.room_id,
                 'user': self._extract_user_info(user, session),
                 'session': self._extract_session_info(session, messages),
-                'issues': self._identify_issues(messages),
-                'sentiment': self._analyze_sentiment(messages),
+                'issues': self._identify_issues(messages, user_matches),
+                'sentiment': self._analyze_sentiment(messages, user_matches),
                 'escalationReason': escalation.reason if escalation else None,
-                'summary': self._generate_ai_summary(messages, escalation),
-                'keyPoints': self._extract_key_points(messages),
-                'conversationFlow': self._analyze_conversation_flow(messages),
-                'recommendedActions': self._suggest_actions(messages, escalation)
+                'summary': ai_summary if ai_summary is not None else self._generate_ai_summary(messages, escalation),
+                'keyPoints': self._extract_key_points(messages, user_matches),
+                'conversationFlow': self._analyze_conversation_flow(messages, user_matches),
+                'recommendedActions': self._suggest_actions(messages, escalation, user_matches),
+                'lastMessageId': max((msg.id for msg in messages), default=0)
             }
             
             logger.info(f"Generated session summary for session {session_id}")
@@ -93,27 +135,41 @@ class SessionSummaryService:
             'lastActivity': end_time.isoformat()
         }
 
-    def _identify_issues(self, messages: List[ChatMessage]) -> List[str]:
-        issue_counts = Counter()
-        all_text = ' '.join([msg.content.lower() for msg in messages if msg.role == 'user'])
+    def _match_user_messages(self, messages: List[ChatMessage]) -> List[KeywordMatches]:
+        """Run the shared keyword matcher once per user message"""
+        return [keyword_matcher.match(msg.content) for msg in messages if msg.role == 'user']
+
+    def _combined_matches(self, user_matches: List[KeywordMatches]) -> KeywordMatches:
+        combined = KeywordMatches({}, {})
+        for matches in user_matches:
+            combined = combined.merge(matches)
+        return combined
+
+    def _identify_issues(self, messages: List[ChatMessage],
+                         user_matches: Optional[List[KeywordMatches]] = None) -> List[str]:
+        if user_matches is None:
+            user_matches = self._match_user_messages(messages)
+        combined = self._combined_matches(user_matches)
         
-        for category, keywords in self.issue_keywords.items():
-            for keyword in keywords:
-                if keyword in all_text:
-                    issue_counts[category] += all_text.count(keyword)
+        issue_counts = Counter()
+        for category in self.issue_keywords:
+            count = combined.count(f'summary.issue.{category}')
+            if count:
+                issue_counts[category] = count
         
         return [issue for issue, count in issue_counts.most_common(3)]
 
-    def _analyze_sentiment(self, messages: List[ChatMessage]) -> str:
+    def _analyze_sentiment(self, messages: List[ChatMessage],
+                           user_matches: Optional[List[KeywordMatches]] = None) -> str:
         """Analyze customer sentiment"""
-        user_messages = [msg.content.lower() for msg in messages if msg.role == 'user']
-        all_text = ' '.join(user_messages)
-        
-        sentiment_scores = {'positive': 0, 'negative': 0, 'neutral': 0}
+        if user_matches is None:
+            user_matches = self._match_user_messages(messages)
+        combined = self._combined_matches(user_matches)
         
-        for sentiment, keywords in self.sentiment_keywords.items():
-            for keyword in keywords:
-                sentiment_scores[sentiment] += all_text.count(keyword)
+        sentiment_scores = {
+            sentiment: combined.count(f'summary.sentiment.{sentiment}')
+            for sentiment in self.sentiment_keywords
+        }
         
         if sentiment_scores['negative'] > sentiment_scores['positive']:
             return 'negative'
@@ -320,48 +376,51 @@ class SessionSummaryService:
         
         return structured
 
-    def _extract_key_points(self, messages: List[ChatMessage]) -> List[str]:
+    def _extract_key_points(self, messages: List[ChatMessage],
+                            user_matches: Optional[List[KeywordMatches]] = None) -> List[str]:
         """Extract key points from the conversation"""
-        key_points = []
-        user_messages = [msg.content for msg in messages if msg.role == 'user']
+        if user_matches is None:
+            user_matches = self._match_user_messages(messages)
         
-        for msg in user_messages:
-            msg_lower = msg.lower()
-            
-            if any(word in msg_lower for word in ['billing', 'bill', 'charge', 'payment']):
+        key_points = []
+        for matches in user_matches:
+            if matches.any('summary.keypoint.billing'):
                 key_points.append("Customer has billing-related concerns")
             
-            if any(word in msg_lower for word in ['internet', 'wifi', 'connection', 'speed']):
+            if matches.any('summary.keypoint.connectivity'):
                 key_points.append("Technical connectivity issues mentioned")
             
-            if any(word in msg_lower for word in ['phone', 'calling', 'text']):
+            if matches.any('summary.keypoint.phone'):
                 key_points.append("Phone service issues reported")
             
-            if any(word in msg_lower for word in ['frustrated', 'angry', 'upset', 'annoyed']):
+            if matches.any('summary.keypoint.frustration'):
                 key_points.append("Customer expressing frustration")
             
-            if any(word in msg_lower for word in ['manager', 'supervisor', 'human', 'agent']):
+            if matches.any('summary.keypoint.human_request'):
                 key_points.append("Customer requested human assistance")
         
         return list(set(key_points))[:5]
 
-    def _analyze_conversation_flow(self, messages: List[ChatMessage]) -> Dict[str, Any]:
+    def _analyze_conversation_flow(self, messages: List[ChatMessage],
+                                   user_matches: Optional[List[KeywordMatches]] = None) -> Dict[str, Any]:
         """Analyze conversation flow and patterns"""
         if not messages:
             return {'pattern': 'No conversation', 'escalation_triggers': []}
         
+        if user_matches is None:
+            user_matches = self._match_user_messages(messages)
+        user_messages = [msg for msg in messages if msg.role == 'user']
+        
         escalation_triggers = []
-        user_message_count = len([msg for msg in messages if msg.role == 'user'])
-        
-        for msg in messages:
-            if msg.role == 'user':
-                msg_lower = msg.content.lower()
-                if any(word in msg_lower for word in ['frustrated', 'angry', 'upset']):
-                    escalation_triggers.append('Customer frustration detected')
-                if any(word in msg_lower for word in ['manager', 'supervisor', 'human']):
-                    escalation_triggers.append('Human assistance requested')
-                if len(msg.content) > 100:  # Long messages might indicate complexity
-                    escalation_triggers.append('Complex issue requiring detailed explanation')
+        user_message_count = len(user_messages)
+        
+        for msg, matches in zip(user_messages, user_matches):
+            if matches.any('summary.flow.frustration'):
+                escalation_triggers.append('Customer frustration detected')
+            if matches.any('summary.flow.human_request'):
+                escalation_triggers.append('Human assistance requested')
+            if len(msg.content) > 100:  # Long messages might indicate complexity
+                escalation_triggers.append('Complex issue requiring detailed explanation')
         
         if user_message_count > 10:
             pattern = 'Extended conversation - multiple exchanges'
@@ -376,25 +435,28 @@ class SessionSummaryService:
             'total_exchanges': user_message_count
         }
 
-    def _suggest_actions(self, messages: List[ChatMessage], escalation: Optional[Escalation]) -> List[str]:
+    def _suggest_actions(self, messages: List[ChatMessage], escalation: Optional[Escalation],
+                         user_matches: Optional[List[KeywordMatches]] = None) -> List[str]:
         """Suggest recommended actions for the agent"""
+        if user_matches is None:
+            user_matches = self._match_user_messages(messages)
+        combined = self._combined_matches(user_matches)
+        
         actions = []
         
         # Base actions
         actions.append("Review the conversation history above")
         actions.append("Acknowledge the customer's concerns")
         
-        user_messages = ' '.join([msg.content.lower() for msg in messages if msg.role == 'user'])
-        
-        if any(word in user_messages for word in ['billing', 'bill', 'charge', 'payment']):
+        if combined.any('summary.keypoint.billing'):
             actions.append("Check customer's billing history and recent charges")
             actions.append("Explain any billing discrepancies clearly")
         
-        if any(word in user_messages for word in ['internet', 'wifi', 'connection', 'speed']):
+        if combined.any('summary.keypoint.connectivity'):
             actions.append("Run diagnostic tests on customer's connection")
             actions.append("Check for known service outages in their area")
         
-        if any(word in user_messages for word in ['phone', 'calling', 'text']):
+        if combined.any('summary.keypoint.phone'):
             actions.append("Verify phone service settings and configuration")
             actions.append("Test calling functionality if possible")
         
@@ -409,7 +471,89 @@ class SessionSummaryService:
         return actions[:6]  # Limit to 6 actions
 
     def get_session_summary_cached(self, session_id: int) -> Dict[str, Any]:
-        """Get session summary with caching (for future optimization)"""
-        return self.generate_session_summary(session_id)
+        """Get session summary from the cache with stale-while-revalidate semantics.
+        
+        A cached summary is fresh while the session's last message id is
+        unchanged. When newer messages exist, the cheap keyword analysis is
+        rebuilt immediately around the previous AI summary, which is then
+        refreshed in the background.
+        """
+        latest_message_id = db.session.query(func.max(ChatMessage.id)).filter(
+            ChatMessage.session_id == session_id
+        ).scalar() or 0
+        
+        with self._cache_lock:
+            entry = self._cache.get(session_id)
+            inflight = self._inflight.get(session_id)
+            if entry:
+                self._cache.move_to_end(session_id)
+        
+        if entry and entry['last_message_id'] == latest_message_id:
+            return dict(entry['summary'], cacheStatus='fresh')
+        
+        if entry:
+            summary = self.generate_session_summary(session_id, ai_summary=entry['summary']['summary'])
+            if 'error' not in summary:
+                self.schedule_refresh(session_id)
+                summary['cacheStatus'] = 'stale'
+            return summary
+        
+        if inflight:
+            # A refresh (e.g. pre-generation on escalation) is already running: wait for it
+            try:
+                summary = inflight.result(timeout=self.inflight_wait_seconds)
+                if 'error' not in summary:
+                    return dict(summary, cacheStatus='fresh')
+            except Exception as e:
+                logger.warning(f"Waiting for in-flight summary of session {session_id} failed: {str(e)}")
+        
+        summary = self.refresh_summary(session_id)
+        if 'error' not in summary:
+            summary = dict(summary, cacheStatus='fresh')
+        return summary
+
+    def refresh_summary(self, session_id: int) -> Dict[str, Any]:
+        """Generate a full summary (including the AI part) and store it in the cache"""
+        summary = self.generate_session_summary(session_id)
+        if 'error' not in summary:
+            with self._cache_lock:
+                current = self._cache.get(session_id)
+                # Never replace a summary of newer messages with an older one
+                if not current or current['last_message_id'] <= summary['lastMessageId']:
+                    self._cache[session_id] = {
+                        'summary': summary,
+                        'last_message_id': summary['lastMessageId']
+                    }
+                    self._cache.move_to_end(session_id)
+                while len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+        return summary
+
+    def schedule_refresh(self, session_id: int):
+        """Refresh a session summary in the background unless a refresh is already running"""
+        app = current_app._get_current_object()
+        with self._cache_lock:
+            if session_id in self._inflight:
+                return
+            future = self._refresh_executor.submit(self._refresh_in_app_context, app, session_id)
+            self._inflight[session_id] = future
+        future.add_done_callback(lambda _: self._clear_inflight(session_id, future))
+
+    def invalidate(self, session_id: int):
+        """Drop the cached summary of a session"""
+        with self._cache_lock:
+            self._cache.pop(session_id, None)
+
+    def _refresh_in_app_context(self, app, session_id: int) -> Dict[str, Any]:
+        with app.app_context():
+            try:
+                return self.refresh_summary(session_id)
+            finally:
+                db.session.remove()
+
+    def _clear_inflight(self, session_id: int, future):
+        with self._cache_lock:
+            if self._inflight.get(session_id) is future:
+                del self._inflight[session_id]
 
 session_summary_service = SessionSummaryService()
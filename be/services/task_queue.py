@@ -0,0 +1,180 @@
+import os
+import queue
+import threading
+import uuid
+from collections import deque, defaultdict
+from typing import Callable, Dict, Any, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+_current = threading.local()
+
+class Task:
+    """A unit of background work bound to a chat session"""
+
+    def __init__(self, session_key: Any, func: Callable, args: tuple, kwargs: dict, owner: Optional[str]):
+        self.id = uuid.uuid4().hex
+        self.session_key = session_key
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.owner = owner
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+
+class SessionTaskQueue:
+    """Bounded background executor with per-session ordering.
+
+    Tasks for the same session run one at a time in submission order, while
+    different sessions are processed concurrently by ``num_workers`` workers.
+    Workers are started through ``spawn`` (``socketio.start_background_task``)
+    so they cooperate with whichever async mode the server runs under.
+    """
+
+    def __init__(self,
+                 spawn: Callable = None,
+                 num_workers: int = None,
+                 max_pending: int = None,
+                 max_pending_per_session: int = None):
+        self._spawn = spawn or self._spawn_thread
+        self.num_workers = num_workers or int(os.getenv('CHAT_WORKERS', 4))
+        self.max_pending = max_pending or int(os.getenv('CHAT_QUEUE_MAX', 100))
+        self.max_pending_per_session = max_pending_per_session or int(os.getenv('CHAT_QUEUE_MAX_PER_SESSION', 5))
+
+        self._ready = queue.Queue()
+        self._pending = {}  # session key -> deque of tasks
+        self._scheduled = set()  # session keys queued in _ready or running
+        self._owners = defaultdict(set)  # owner (socket sid) -> session keys
+        self._running = {}  # session key -> running task
+        self._lock = threading.Lock()
+        self._total_pending = 0
+        self._started = False
+
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.cancelled = 0
+
+    @staticmethod
+    def _spawn_thread(target: Callable):
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        return thread
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        for _ in range(self.num_workers):
+            self._spawn(self._worker)
+        logger.info(f"Started {self.num_workers} chat workers (max {self.max_pending} pending tasks)")
+
+    def submit(self, session_key: Any, func: Callable, *args, owner: str = None, **kwargs) -> Optional[Task]:
+        """Queue a task; returns None when the queue is full (back-pressure)"""
+        if not self._started:
+            self.start()
+
+        with self._lock:
+            session_tasks = self._pending.setdefault(session_key, deque())
+            if self._total_pending >= self.max_pending or len(session_tasks) >= self.max_pending_per_session:
+                if not session_tasks:
+                    del self._pending[session_key]
+                self.rejected += 1
+                return None
+
+            task = Task(session_key, func, args, kwargs, owner)
+            session_tasks.append(task)
+            self._total_pending += 1
+            if owner:
+                self._owners[owner].add(session_key)
+
+            if session_key not in self._scheduled:
+                self._scheduled.add(session_key)
+                self._ready.put(session_key)
+
+        return task
+
+    def cancel_owner(self, owner: str) -> int:
+        """Cancel queued and running tasks submitted by a disconnected client"""
+        cancelled = 0
+        with self._lock:
+            for session_key in self._owners.pop(owner, set()):
+                for task in self._pending.get(session_key, ()):
+                    if task.owner == owner and not task.cancelled:
+                        task.cancel()
+                        cancelled += 1
+                running = self._running.get(session_key)
+                if running and running.owner == owner and not running.cancelled:
+                    running.cancel()
+                    cancelled += 1
+            self.cancelled += cancelled
+
+        if cancelled:
+            logger.info(f"Cancelled {cancelled} chat tasks for disconnected client {owner}")
+        return cancelled
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'workers': self.num_workers,
+                'pending': self._total_pending,
+                'running': len(self._running),
+                'max_pending': self.max_pending,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'cancelled': self.cancelled
+            }
+
+    def _worker(self):
+        while True:
+            session_key = self._ready.get()
+
+            with self._lock:
+                task = self._pending[session_key].popleft()
+                self._total_pending -= 1
+                self._running[session_key] = task
+
+            outcome = None
+            if not task.cancelled:
+                _current.task = task
+                try:
+                    task.func(*task.args, **task.kwargs)
+                    outcome = 'completed'
+                except Exception as e:
+                    outcome = 'failed'
+                    logger.error(f"Chat task for session {session_key} failed: {str(e)}")
+                finally:
+                    _current.task = None
+
+            with self._lock:
+                if outcome == 'completed':
+                    self.completed += 1
+                elif outcome == 'failed':
+                    self.failed += 1
+                del self._running[session_key]
+                if self._pending[session_key]:
+                    # Keep per-session order: the next task only becomes ready now
+                    self._ready.put(session_key)
+                else:
+                    del self._pending[session_key]
+                    self._scheduled.discard(session_key)
+
+
+def current_task() -> Optional[Task]:
+    """Task being executed by the calling worker, if any"""
+    return getattr(_current, 'task', None)
+
+
+def is_current_task_cancelled() -> bool:
+    task = current_task()
+    return bool(task and task.cancelled)
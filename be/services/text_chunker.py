@@ -0,0 +1,197 @@
+import os
+import re
+from typing import List, Dict, Any, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+PAGE_MARKER_PATTERN = re.compile(r'^--- Page (\d+)(?: \(([^)]*)\))? ---\s*$', re.MULTILINE)
+SENTENCE_BOUNDARY_PATTERN = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9*"\'(])')
+TOKEN_PATTERN = re.compile(r'\w+|[^\w\s]')
+
+
+class TextChunker:
+    def __init__(self,
+                 chunk_size: int = None,
+                 chunk_overlap: int = None,
+                 unit: str = None):
+        """Initialize chunker with window size and overlap.
+
+        ``unit`` is either ``'chars'`` or ``'tokens'``; token windows use a
+        word/punctuation approximation so no tokenizer has to be loaded.
+        """
+        self.chunk_size = chunk_size or int(os.getenv('RAG_CHUNK_SIZE', 600))
+        self.chunk_overlap = chunk_overlap if chunk_overlap is not None else int(os.getenv('RAG_CHUNK_OVERLAP', 100))
+        self.unit = unit or os.getenv('RAG_CHUNK_UNIT', 'chars')
+
+        if self.unit not in ('chars', 'tokens'):
+            raise ValueError(f"Unsupported chunk unit: {self.unit}")
+        if self.chunk_overlap >= self.chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+
+    def length(self, text: str) -> int:
+        """Measure text in the configured unit"""
+        if self.unit == 'tokens':
+            return len(TOKEN_PATTERN.findall(text))
+        return len(text)
+
+    def split_pages(self, text: str) -> List[Tuple[Optional[int], str, Optional[str]]]:
+        """Split text on ``--- Page N ---`` markers into (page, text, method) tuples"""
+        markers = list(PAGE_MARKER_PATTERN.finditer(text))
+        if not markers:
+            return [(None, text, None)]
+
+        pages = []
+        preamble = text[:markers[0].start()]
+        if preamble.strip():
+            pages.append((None, preamble, None))
+
+        for i, marker in enumerate(markers):
+            end = markers[i + 1].start() if i + 1 < len(markers) else len(text)
+            method = marker.group(2).lower() if marker.group(2) else None
+            pages.append((int(marker.group(1)), text[marker.end():end], method))
+
+        return pages
+
+    def _is_heading(self, line: str) -> bool:
+        """Heuristic heading detection for FAQ/manual style PDFs"""
+        stripped = line.strip()
+        if not stripped or len(stripped) > 80 or len(stripped.split()) > 12:
+            return False
+        if stripped.endswith(('.', ',', ';')):
+            return False
+        if stripped.endswith(':') or stripped.endswith('?'):
+            return True
+        letters = [c for c in stripped if c.isalpha()]
+        if len(letters) >= 3 and all(c.isupper() for c in letters):
+            return True
+        return False
+
+    def _split_sections(self, text: str) -> List[Tuple[Optional[str], str]]:
+        """Split page text into (heading, body) sections"""
+        sections = []
+        heading = None
+        body_lines = []
+
+        for line in text.splitlines():
+            if self._is_heading(line):
+                if any(l.strip() for l in body_lines):
+                    sections.append((heading, "\n".join(body_lines)))
+                heading = line.strip().rstrip(':').strip()
+                body_lines = []
+            else:
+                body_lines.append(line)
+
+        if any(l.strip() for l in body_lines):
+            sections.append((heading, "\n".join(body_lines)))
+        elif heading and not sections:
+            sections.append((None, heading))
+
+        return sections
+
+    def _split_segments(self, text: str) -> List[str]:
+        """Break a section into paragraph/sentence segments that fit the window"""
+        segments = []
+        for paragraph in re.split(r'\n\s*\n', text):
+            paragraph = re.sub(r'\s+', ' ', paragraph).strip()
+            if not paragraph:
+                continue
+            if self.length(paragraph) <= self.chunk_size:
+                segments.append(paragraph)
+                continue
+            for sentence in SENTENCE_BOUNDARY_PATTERN.split(paragraph):
+                if self.length(sentence) <= self.chunk_size:
+                    segments.append(sentence)
+                else:
+                    segments.extend(self._hard_split(sentence))
+        return segments
+
+    def _hard_split(self, text: str) -> List[str]:
+        """Split a single oversized sentence on word boundaries"""
+        pieces = []
+        current = []
+        for word in text.split(' '):
+            candidate = ' '.join(current + [word])
+            if current and self.length(candidate) > self.chunk_size:
+                pieces.append(' '.join(current))
+                current = [word]
+            else:
+                current.append(word)
+        if current:
+            pieces.append(' '.join(current))
+        return pieces
+
+    def _window(self, segments: List[str]) -> List[str]:
+        """Pack segments into overlapping windows"""
+        windows = []
+        current = []
+        current_length = 0
+
+        for segment in segments:
+            segment_length = self.length(segment)
+            if current and current_length + segment_length + 1 > self.chunk_size:
+                windows.append(' '.join(current))
+
+                # Carry trailing segments forward as overlap
+                overlap = []
+                overlap_length = 0
+                for previous in reversed(current):
+                    previous_length = self.length(previous)
+                    if overlap_length + previous_length > self.chunk_overlap:
+                        break
+                    overlap.insert(0, previous)
+                    overlap_length += previous_length + 1
+
+                if overlap_length + segment_length > self.chunk_size:
+                    overlap, overlap_length = [], 0
+                current = overlap
+                current_length = overlap_length
+
+            current.append(segment)
+            current_length += segment_length + 1
+
+        if current:
+            windows.append(' '.join(current))
+
+        return windows
+
+    def chunk_text(self, text: str, metadata: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        """Chunk a single text into passages with page and heading metadata"""
+        metadata = metadata or {}
+        chunks = []
+
+        for page, page_text, page_method in self.split_pages(text):
+            for heading, body in self._split_sections(page_text):
+                for window in self._window(self._split_segments(body)):
+                    chunk = dict(metadata)
+                    chunk['content'] = f"{heading}\n{window}" if heading else window
+                    chunk['chunk_index'] = len(chunks)
+                    if page is not None:
+                        chunk['page'] = page
+                    if heading:
+                        chunk['heading'] = heading
+                    if page_method:
+                        chunk['extraction_method'] = page_method
+                    chunks.append(chunk)
+
+        for chunk in chunks:
+            chunk['chunk_count'] = len(chunks)
+
+        return chunks
+
+    def chunk_documents(self, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Chunk a batch of RAG documents, carrying document fields into every chunk"""
+        chunks = []
+        for doc in documents:
+            content = doc.get('content', '')
+            if not content or not content.strip():
+                continue
+            metadata = {k: v for k, v in doc.items() if k != 'content'}
+            chunks.extend(self.chunk_text(content, metadata))
+
+        logger.info(f"Chunked {len(documents)} documents into {len(chunks)} chunks "
+                    f"(size={self.chunk_size} {self.unit}, overlap={self.chunk_overlap})")
+        return chunks
+
+# Global text chunker instance
+text_chunker = TextChunker()
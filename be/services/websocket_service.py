@@ -1,10 +1,16 @@
-from flask import request
+from flask import request, current_app
 from flask_socketio import emit, join_room, leave_room
 from models.chat_models import ChatSession, ChatMessage
 from services.rag_service import rag_service
 from services.llm_service import llm_service
 from services.escalation_service import escalation_service
+from services.task_queue import SessionTaskQueue, is_current_task_cancelled
+from services.session_state import session_state_store
+from services.ingestion_jobs import ingestion_job_manager
 from utils.db import db
+from sqlalchemy import or_
+import os
+import uuid
 import logging
 from datetime import datetime
 
@@ -13,6 +19,11 @@ logger = logging.getLogger(__name__)
 class WebSocketService:
     def __init__(self, socketio):
         self.socketio = socketio
+        self.streaming_enabled = os.getenv('LLM_STREAMING', 'true').lower() == 'true'
+        self.history_page_size = int(os.getenv('AGENT_HISTORY_PAGE_SIZE', 50))
+        # RAG, LLM and escalation work runs off the Socket.IO handler
+        self.task_queue = SessionTaskQueue(spawn=socketio.start_background_task)
+        self.task_queue.start()
         self.setup_handlers()
     
     def setup_handlers(self):
@@ -29,6 +40,7 @@ class WebSocketService:
         @self.socketio.on('disconnect')
         def handle_disconnect():
             logger.info(f'Client disconnected: {request.sid}')
+            self.task_queue.cancel_owner(request.sid)
         
         @self.socketio.on('error')
         def handle_error(error):
@@ -94,6 +106,10 @@ class WebSocketService:
                     if session:
                         session.status = 'closed'
                         db.session.commit()
+                        # Closed sessions take no more turns: free their cached state
+                        from services.session_summary_service import session_summary_service
+                        session_state_store.evict(session.id)
+                        session_summary_service.invalidate(session.id)
                     
                     # Emit session_closed event
                     self.socketio.emit('session_closed', {
@@ -144,6 +160,21 @@ class WebSocketService:
                 logger.error(f"Error joining session: {str(e)}")
                 emit('error', {'message': 'Failed to join session'})
         
+        @self.socketio.on('watch_ingest_job')
+        def handle_watch_ingest_job(data):
+            """Subscribe to ingest_progress events of an upload's ingestion job"""
+            job_id = (data or {}).get('jobId')
+            if not job_id:
+                emit('error', {'message': 'Missing jobId'})
+                return
+            
+            # The job may run on another worker; its events reach this room through the message queue
+            join_room(ingestion_job_manager.room(job_id))
+            # Send the current state so updates made before joining are not missed
+            status = ingestion_job_manager.get_status(job_id)
+            if status:
+                emit('ingest_progress', status)
+        
         @self.socketio.on('user_message')
         def handle_user_message(data):
             """Handle user messages directly"""
@@ -173,6 +204,7 @@ class WebSocketService:
                     )
                     db.session.add(user_message)
                     db.session.commit()
+                    session_state_store.record_message(user_message)
                     logger.info(f"Saved user message to database for session {session.id}")
                 except Exception as e:
                     logger.error(f"Error saving user message to database: {str(e)}")
@@ -186,8 +218,29 @@ class WebSocketService:
                     'session_id': session.id
                 }, room=session.room_id)
                 
-                # Handle user message
-                self._handle_user_message(session, message, session.room_id)
+                # Handle user message in the background, in order for this session
+                task = self.task_queue.submit(
+                    session.id,
+                    self._run_in_app_context,
+                    current_app._get_current_object(),
+                    self._handle_user_message_task,
+                    session.id,
+                    message,
+                    session.room_id,
+                    owner=request.sid
+                )
+                if task is None:
+                    logger.warning(f"Chat queue full, rejecting message for session {session.id}")
+                    emit('server_busy', {
+                        'session_id': session.id,
+                        'message': 'Too many requests are being processed. Please try again in a moment.'
+                    })
+                    emit('new_message', {
+                        'role': 'system',
+                        'content': "We're receiving a lot of messages right now. Please send your message again in a moment.",
+                        'timestamp': datetime.utcnow().isoformat(),
+                        'session_id': session.id
+                    })
                     
             except Exception as e:
                 logger.error(f"Error handling user message: {str(e)}")
@@ -222,17 +275,38 @@ class WebSocketService:
             return None
     
     
+    @staticmethod
+    def _run_in_app_context(app, func, *args):
+        """Run a background task with its own application context"""
+        with app.app_context():
+            try:
+                func(*args)
+            finally:
+                db.session.remove()
+    
+    def _handle_user_message_task(self, session_id, message, room_id):
+        """Background entry point: reload the session in this worker's DB session"""
+        if is_current_task_cancelled():
+            return
+        session = ChatSession.query.get(session_id)
+        if not session:
+            logger.warning(f"Session {session_id} no longer exists, dropping message")
+            return
+        self._handle_user_message(session, message, room_id)
+    
     def _handle_user_message(self, session, message, room_id):
         """Handle user message - either respond with AI or escalate"""
         try:
             # Enable escalation service with proper error handling
             try:
+                state = session_state_store.get(session.id)
+                rolling_confidence = state.rolling_confidence if state else None
                 escalation_check = escalation_service.should_escalate(
                     session.id, 
                     message, 
-                    confidence=0.8,  # Default confidence
-                    message_count=1,  # This would need to be calculated from session history
-                    session_duration=0  # This would need to be calculated from session start time
+                    confidence=rolling_confidence if rolling_confidence is not None else 0.8,
+                    message_count=state.user_message_count if state else 1,
+                    session_duration=state.duration_seconds() if state else 0
                 )
             except Exception as e:
                 logger.error(f"Error in escalation check: {str(e)}")
@@ -248,14 +322,6 @@ class WebSocketService:
                     escalation_analysis=escalation_check.get('analysis', {})
                 )
                 
-                # Pre-generate session summary for faster agent loading
-                try:
-                    from services.session_summary_service import session_summary_service
-                    session_summary_service.generate_session_summary(session.id)
-                    logger.info(f"Pre-generated session summary for session {session.id}")
-                except Exception as e:
-                    logger.warning(f"Failed to pre-generate session summary: {str(e)}")
-                
                 # Notify agents
                 self._notify_agents_escalation(session, escalation_check)
                 
@@ -269,15 +335,26 @@ class WebSocketService:
                         role='ai',
                         content=escalation_msg,
                         message_type='escalation',
+                        escalation_id=escalation.id,
                         message_metadata={'escalation_id': escalation.id, 'reasons': escalation_check.get('reasons', [])}
                     )
                     db.session.add(escalation_message)
                     db.session.commit()
+                    session_state_store.record_message(escalation_message)
                     logger.info(f"Saved escalation message to database for session {session.id}")
                 except Exception as e:
                     logger.error(f"Error saving escalation message to database: {str(e)}")
                     db.session.rollback()
                 
+                # Pre-generate session summary in the background for faster agent loading;
+                # it is cached against the escalation message so agents get it instantly
+                try:
+                    from services.session_summary_service import session_summary_service
+                    session_summary_service.schedule_refresh(session.id)
+                    logger.info(f"Scheduled session summary pre-generation for session {session.id}")
+                except Exception as e:
+                    logger.warning(f"Failed to pre-generate session summary: {str(e)}")
+                
                 self.socketio.emit('new_message', {
                     'role': 'ai',
                     'content': escalation_msg,
@@ -346,19 +423,23 @@ class WebSocketService:
             # Emit typing indicator
             self.socketio.emit('ai_typing', {'typing': True}, room=room_id)
             
-            # Get relevant context
-            context = rag_service.get_context_for_query(user_message)
-            
+            # Retrieve once: the same search yields the context and the confidence
+            retrieval = rag_service.retrieve(user_message)
+            confidence = retrieval.confidence
             
-            # Generate response
-            response = llm_service.generate_response(
-                user_message=user_message,
-                context=context
-            )
-            
-            # Calculate confidence
-            confidence = rag_service.calculate_confidence(user_message, response['response'])
+            if is_current_task_cancelled():
+                self.socketio.emit('ai_typing', {'typing': False}, room=room_id)
+                return
             
+            # Generate response, streaming deltas to the room as they arrive
+            message_id = uuid.uuid4().hex
+            if self.streaming_enabled:
+                response = self._stream_ai_response(session, user_message, retrieval.context, room_id, message_id)
+            else:
+                response = llm_service.generate_response(
+                    user_message=user_message,
+                    context=retrieval.context
+                )
             
             # Save AI response to database
             try:
@@ -367,10 +448,16 @@ class WebSocketService:
                     role='ai',
                     content=response['response'],
                     message_type='text',
-                    message_metadata={'confidence': confidence}
+                    message_metadata={
+                        'confidence': confidence,
+                        'fallback': 'error' in response,
+                        'context_tokens': retrieval.context_tokens,
+                        'tokens_used': response.get('tokens_used', 0)
+                    }
                 )
                 db.session.add(ai_message)
                 db.session.commit()
+                session_state_store.record_message(ai_message)
                 logger.info(f"Saved AI response to database for session {session.id}")
             except Exception as e:
                 logger.error(f"Error saving AI response to database: {str(e)}")
@@ -383,7 +470,8 @@ class WebSocketService:
                 'content': response['response'],
                 'timestamp': datetime.utcnow().isoformat(),
                 'session_id': session.id,
-                'confidence': confidence
+                'confidence': confidence,
+                'message_id': message_id
             }, room=room_id)
             
             # Emit typing complete
@@ -400,6 +488,39 @@ class WebSocketService:
                 'session_id': session.id
             }, room=room_id)
     
+    def _stream_ai_response(self, session, user_message, context, room_id, message_id):
+        """Relay LLM deltas to the room as ai_message_delta events and return the final response"""
+        response = None
+        index = 0
+        parts = []
+        stream = llm_service.stream_response(user_message=user_message, context=context)
+        try:
+            for event in stream:
+                if event.get('done'):
+                    response = event
+                    break
+                if is_current_task_cancelled():
+                    # Client went away: stop relaying and keep what was generated so far
+                    partial = ''.join(parts)
+                    response = {'response': partial or llm_service.fallback_response, 'cancelled': True}
+                    break
+                parts.append(event['delta'])
+                
+                self.socketio.emit('ai_message_delta', {
+                    'message_id': message_id,
+                    'session_id': session.id,
+                    'delta': event['delta'],
+                    'index': index
+                }, room=room_id)
+                index += 1
+                # Let the async server flush the frame before waiting on the next token
+                self.socketio.sleep(0)
+        finally:
+            # Closes the upstream completion stream when relaying stops early
+            stream.close()
+        
+        return response
+    
     def _notify_agents_escalation(self, session, escalation_info):
         """Notify available agents about escalation"""
         try:
@@ -446,75 +567,78 @@ class WebSocketService:
             logger.error(f"Error joining agents room: {str(e)}")
             return False
     
-    def _get_relevant_chat_history(self, session_id):
-        """Get relevant chat history for agent - only current escalation context"""
+    def _get_chat_history_page(self, session_id, before_id=None):
+        """Get one page of chat history for an agent.
+
+        The first page (no ``before_id``) covers the current escalation context:
+        messages since the latest open escalation was triggered, without older
+        escalation notices. Older pages walk back by message id. Returns the
+        messages in chronological order and the cursor for the next older page.
+        """
         try:
-            from models.chat_models import Escalation
-            
-            # Get the most recent pending escalation for this session
-            recent_escalation = Escalation.query.filter_by(
-                session_id=session_id, 
-                status='pending'
-            ).order_by(Escalation.created_at.desc()).first()
+            # Most recent open escalation; joining the room already marks it handled
+            recent_escalation = escalation_service.open_escalations_query(session_id).first()
             
+            query = ChatMessage.query.filter(ChatMessage.session_id == session_id)
             if recent_escalation:
-                # Get messages from the escalation time onwards, excluding old escalation messages
-                chat_messages = ChatMessage.query.filter(
-                    ChatMessage.session_id == session_id,
-                    ChatMessage.timestamp >= recent_escalation.triggered_at,
-                    ChatMessage.message_type != 'escalation'  # Exclude old escalation messages
-                ).order_by(ChatMessage.timestamp.asc()).all()
-                
-                # Add the current escalation message at the beginning
-                escalation_message = ChatMessage.query.filter(
-                    ChatMessage.session_id == session_id,
-                    ChatMessage.message_type == 'escalation',
-                    ChatMessage.message_metadata.contains({'escalation_id': recent_escalation.id})
-                ).first()
-                
-                if escalation_message:
-                    chat_messages.insert(0, escalation_message)
-                
-                logger.info(f"Loading chat history from escalation {recent_escalation.id} onwards ({len(chat_messages)} messages)")
-                return chat_messages
+                # Keep only this escalation's own notice (saved right after it was triggered)
+                query = query.filter(or_(
+                    ChatMessage.message_type != 'escalation',
+                    ChatMessage.escalation_id == recent_escalation.id
+                ))
+            visible = query
+            
+            if before_id is not None:
+                query = query.filter(ChatMessage.id < before_id).order_by(ChatMessage.id.desc())
+                page_size = self.history_page_size
+            elif recent_escalation:
+                # Range scan on (session_id, timestamp); ids grow with timestamps
+                query = query.filter(
+                    ChatMessage.timestamp >= recent_escalation.triggered_at
+                ).order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc())
+                page_size = self.history_page_size
             else:
-                # Fallback: get only the last 10 messages to avoid overwhelming the agent
-                chat_messages = ChatMessage.query.filter_by(
-                    session_id=session_id
-                ).order_by(ChatMessage.timestamp.desc()).limit(10).all()
-                
-                # Reverse to get chronological order
-                chat_messages.reverse()
-                logger.info(f"Loading last 10 messages as fallback ({len(chat_messages)} messages)")
-                return chat_messages
+                # No escalation context: start with the last few messages
+                query = query.order_by(ChatMessage.id.desc())
+                page_size = 10
+            
+            chat_messages = query.limit(page_size).all()
+            chat_messages.reverse()
+            
+            next_cursor = None
+            if chat_messages:
+                oldest_id = chat_messages[0].id
+                has_older = visible.with_entities(ChatMessage.id).filter(
+                    ChatMessage.id < oldest_id
+                ).first() is not None
+                next_cursor = oldest_id if has_older else None
+            
+            logger.info(f"Loaded {len(chat_messages)} history messages for session {session_id} "
+                        f"(before {before_id}, escalation {recent_escalation.id if recent_escalation else None})")
+            return chat_messages, next_cursor
                 
         except Exception as e:
-            logger.error(f"Error getting relevant chat history: {str(e)}")
-            return []
+            logger.error(f"Error getting chat history page: {str(e)}")
+            return [], None
 
     def _send_existing_escalations(self):
         """Send existing pending escalations to connected agents"""
         try:
-            from models.chat_models import Escalation
-            from routes.admin_routes import get_escalations
-            
-            # Get pending escalations
-            escalations = Escalation.query.filter_by(status='pending').order_by(Escalation.created_at.desc()).limit(50).all()
+            # Escalations, sessions and users come back in a single joined query
+            escalations = escalation_service.list_escalations(status='pending', limit=50)['escalations']
             
             for escalation in escalations:
-                session = ChatSession.query.get(escalation.session_id)
-                if session:
-                    emit('escalation_pending', {
-                        'roomId': session.room_id,
-                        'sessionId': session.id,
-                        'userName': session.user_id,
-                        'status': escalation.status,
-                        'priority': escalation.priority,
-                        'reason': escalation.reason,
-                        'createdAt': escalation.created_at.isoformat(),
-                        'escalationId': escalation.id,
-                        'uniqueKey': f'escalation_{escalation.id}'
-                    })
+                emit('escalation_pending', {
+                    'roomId': escalation['session']['room_id'],
+                    'sessionId': escalation['session_id'],
+                    'userName': escalation['session']['user_id'],
+                    'status': escalation['status'],
+                    'priority': escalation['priority'],
+                    'reason': escalation['reason'],
+                    'createdAt': escalation['created_at'],
+                    'escalationId': escalation['id'],
+                    'uniqueKey': f"escalation_{escalation['id']}"
+                })
             
             logger.info(f"Sent {len(escalations)} existing escalations to agent")
             
@@ -566,30 +690,12 @@ class WebSocketService:
                 else:
                     logger.warning(f"No session found for room {room_id}")
                 
-                # Load and send chat history to agent
-                if session:
-                    try:
-                        # Get relevant chat history (only current escalation context)
-                        chat_messages = self._get_relevant_chat_history(session.id)
-                        
-                        # Send chat history directly to the agent's socket connection
-                        # Add a small delay to ensure the agent dashboard is ready
-                        import time
-                        time.sleep(0.1)  # 100ms delay
-                        
-                        for msg in chat_messages:
-                            emit('chat_history', {
-                                'role': msg.role,
-                                'content': msg.content,
-                                'timestamp': msg.timestamp.isoformat(),
-                                'session_id': session.id,
-                                'message_type': msg.message_type,
-                                'metadata': msg.message_metadata
-                            })
-                        
-                        logger.info(f"Sent {len(chat_messages)} relevant chat history messages to agent {agent_id}")
-                    except Exception as e:
-                        logger.error(f"Error loading chat history: {str(e)}")
+                # Tell the agent the room is joined; the dashboard then asks for
+                # history with 'request_chat_history' once it is ready to render it
+                emit('agent_room_joined', {
+                    'roomId': room_id,
+                    'sessionId': session.id if session else None
+                })
                 
                 # Always send notifications, even if session update failed
                 try:
@@ -616,6 +722,34 @@ class WebSocketService:
                 logger.error(f"Error handling agent join room: {str(e)}")
                 emit('error', {'message': 'Error joining room'})
         
+        @self.socketio.on('request_chat_history')
+        def handle_request_chat_history(data):
+            """Send one page of chat history to the requesting agent"""
+            try:
+                room_id = data.get('roomId')
+                before_id = data.get('cursor')
+                
+                session = ChatSession.query.filter_by(room_id=room_id).first() if room_id else None
+                if not session:
+                    emit('error', {'message': 'Chat session not found'})
+                    return
+                
+                chat_messages, next_cursor = self._get_chat_history_page(
+                    session.id, int(before_id) if before_id is not None else None
+                )
+                
+                emit('chat_history_batch', {
+                    'roomId': room_id,
+                    'session_id': session.id,
+                    'messages': [msg.to_dict() for msg in chat_messages],
+                    'cursor': before_id,
+                    'next_cursor': next_cursor
+                })
+                
+            except Exception as e:
+                logger.error(f"Error handling chat history request: {str(e)}")
+                emit('error', {'message': 'Error loading chat history'})
+        
         @self.socketio.on('agent_leave_room')
         def handle_agent_leave_room(data):
             """Handle agent leaving a chat room"""
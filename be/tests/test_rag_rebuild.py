@@ -0,0 +1,117 @@
+"""
+Knowledge-base rebuilds running concurrently with uploads.
+
+Runs against a real (temporary) Chroma store; the embedding model is
+replaced by a small deterministic embedder so no model has to be loaded.
+
+Usage (from the ``be`` directory):
+    python -m pytest tests
+"""
+import os
+import sys
+import types
+import hashlib
+import threading
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+chromadb = pytest.importorskip('chromadb')
+
+
+class HashEmbedder(chromadb.EmbeddingFunction):
+    """Unit-length embeddings derived from the words of a text"""
+
+    def __init__(self):
+        self.model = None
+
+    def encode(self, texts):
+        rows = np.zeros((len(texts), 32), dtype=np.float32)
+        for row, text in zip(rows, texts):
+            for word in text.lower().split():
+                row[int(hashlib.md5(word.encode('utf-8')).hexdigest(), 16) % 32] += 1.0
+            row /= np.linalg.norm(row) or 1.0
+        return rows
+
+    def embed_query(self, query):
+        return self.encode([query])[0]
+
+    def __call__(self, input):
+        return self.encode(input).tolist()
+
+
+def pdf_document(path, content):
+    return {'content': content, 'title': os.path.basename(path), 'source': 'pdf_file',
+            'file_path': path, 'extraction_method': 'text'}
+
+
+@pytest.fixture
+def rag(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('RAG_RELOAD_MIN_RATIO', '0')
+    monkeypatch.setitem(sys.modules, 'services.embedding_service',
+                        types.SimpleNamespace(SentenceTransformerEmbedder=HashEmbedder))
+    from services.rag_service import RAGService
+    from services.pdf_processor import pdf_processor
+
+    resources = tmp_path / 'resources'
+    resources.mkdir()
+    manual = str(resources / 'manual.pdf')
+    open(manual, 'wb').close()
+    monkeypatch.setattr(pdf_processor, 'resources_folder', str(resources))
+    monkeypatch.setattr(pdf_processor, 'get_documents_for_rag',
+                        lambda: [pdf_document(manual, 'Dial *121# to check your prepaid balance.')])
+
+    service = RAGService()
+    service.resources = resources
+    yield service
+    # Chroma keeps one system per path; the next test's ./chroma_db is a different directory
+    from chromadb.api.client import SharedSystemClient
+    SharedSystemClient.clear_system_cache()
+
+
+def indexed_files(service):
+    metadatas = service.collection.get(include=['metadatas'])['metadatas']
+    return {os.path.basename(metadata['file_path']) for metadata in metadatas if metadata.get('file_path')}
+
+
+def test_upload_finishing_during_rebuild_extraction_is_kept(rag, monkeypatch):
+    from services.pdf_processor import pdf_processor
+
+    upload = str(rag.resources / 'roaming.pdf')
+    extract = pdf_processor.get_documents_for_rag
+
+    def extract_while_uploading():
+        # The upload lands after the rebuild listed the folder and is ingested before the swap
+        open(upload, 'wb').close()
+        ingest = threading.Thread(target=rag.ingest_documents, args=([{
+            'content': 'International roaming packs start at 399 rupees.',
+            'title': 'roaming.pdf', 'source': 'pdf_upload', 'file_path': upload
+        }],), kwargs={'prune_stale': True})
+        ingest.start()
+        ingest.join(timeout=30)
+        assert not ingest.is_alive(), 'ingest blocked by the rebuild during extraction'
+        return extract()
+
+    monkeypatch.setattr(pdf_processor, 'get_documents_for_rag', extract_while_uploading)
+    result = rag.rebuild_collection()
+
+    assert 'error' not in result
+    assert indexed_files(rag) == {'manual.pdf', 'roaming.pdf'}
+    assert any('roaming' in doc['content'] for doc in rag.search_relevant_docs('roaming packs', n_results=2))
+
+
+def test_rebuild_drops_chunks_of_deleted_uploads(rag):
+    upload = str(rag.resources / 'old_offer.pdf')
+    open(upload, 'wb').close()
+    rag.ingest_documents([{'content': 'Festive offer: double data on recharge.', 'title': 'old_offer.pdf',
+                           'source': 'pdf_upload', 'file_path': upload}])
+    assert indexed_files(rag) == {'manual.pdf', 'old_offer.pdf'}
+
+    os.remove(upload)
+    result = rag.rebuild_collection()
+
+    assert 'error' not in result
+    assert indexed_files(rag) == {'manual.pdf'}
@@ -4,6 +4,7 @@ Database utilities and configuration
 import os
 from flask_sqlalchemy import SQLAlchemy
 from flask import Flask
+from sqlalchemy import text
 
 db = SQLAlchemy()
 
@@ -20,3 +21,12 @@ def get_db_uri():
         return os.getenv('DATABASE_URL')
     else:
         return 'sqlite:///chatbot.db'
+
+def check_db_connection() -> str:
+    """Return 'connected', or the error that prevented a trivial query"""
+    try:
+        db.session.execute(text('SELECT 1'))
+        return 'connected'
+    except Exception as e:
+        db.session.rollback()
+        return f'error: {str(e)}'
@@ -0,0 +1,123 @@
+"""
+Lightweight schema migrations for existing SQLite and Postgres databases
+"""
+import logging
+from datetime import datetime
+from sqlalchemy import text, inspect
+from utils.db import db
+
+logger = logging.getLogger(__name__)
+
+def _create_model_indexes(conn, model, *names):
+    """Create indexes declared on a model if they are missing.
+
+    Indexes are named explicitly so a migration keeps creating the same set
+    when later migrations declare more indexes on the model.
+    """
+    indexes = {index.name: index for index in model.__table__.indexes}
+    for name in names:
+        indexes[name].create(bind=conn, checkfirst=True)
+        logger.info(f"Ensured index {name} on {model.__tablename__}")
+
+
+def _column_names(conn, table_name):
+    return {column['name'] for column in inspect(conn).get_columns(table_name)}
+
+
+def add_hot_query_indexes(conn):
+    """Indexes for chat history, escalation listing and session listing queries"""
+    from models.chat_models import ChatSession, ChatMessage, Escalation
+    _create_model_indexes(conn, ChatSession, 'ix_chat_sessions_status_created_at', 'ix_chat_sessions_created_at')
+    _create_model_indexes(conn, ChatMessage, 'ix_chat_messages_session_timestamp',
+                          'ix_chat_messages_session_type', 'ix_chat_messages_session_id_id')
+    _create_model_indexes(conn, Escalation, 'ix_escalations_status_created_at_id',
+                          'ix_escalations_session_status_created_at')
+
+
+def add_message_escalation_reference(conn):
+    """Indexed chat_messages.escalation_id, backfilled from escalation message metadata"""
+    from models.chat_models import ChatMessage
+
+    if 'escalation_id' not in _column_names(conn, 'chat_messages'):
+        conn.execute(text("ALTER TABLE chat_messages ADD COLUMN escalation_id INTEGER REFERENCES escalations(id)"))
+    _create_model_indexes(conn, ChatMessage, 'ix_chat_messages_escalation_id')
+
+    table = ChatMessage.__table__
+    escalation_ids = {row[0] for row in conn.execute(text("SELECT id FROM escalations"))}
+    rows = conn.execute(
+        table.select().with_only_columns(table.c.id, table.c.message_metadata).where(
+            table.c.message_type == 'escalation',
+            table.c.escalation_id.is_(None)
+        )
+    ).fetchall()
+
+    backfilled = 0
+    for message_id, metadata in rows:
+        escalation_id = (metadata or {}).get('escalation_id')
+        if escalation_id in escalation_ids:
+            conn.execute(table.update().where(table.c.id == message_id).values(escalation_id=escalation_id))
+            backfilled += 1
+    logger.info(f"Backfilled escalation_id on {backfilled} of {len(rows)} escalation messages")
+
+
+def add_open_escalation_index(conn):
+    """Index for the latest open escalation of a session"""
+    from models.chat_models import Escalation
+    _create_model_indexes(conn, Escalation, 'ix_escalations_session_created_at')
+
+
+# Ordered list of (version, description, migration). Never reorder or renumber
+# applied migrations; append new ones at the end.
+MIGRATIONS = [
+    (1, 'Add indexes for hot chat queries', add_hot_query_indexes),
+    (2, 'Reference escalations from chat messages', add_message_escalation_reference),
+    (3, 'Index open escalations of a session by creation time', add_open_escalation_index),
+]
+
+
+def _ensure_migrations_table(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, "
+        "description VARCHAR(200) NOT NULL, "
+        "applied_at TIMESTAMP NOT NULL)"
+    ))
+
+
+def get_applied_versions(conn):
+    return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def run_migrations():
+    """Create missing tables, then apply pending migrations in order.
+
+    Must be called inside an application context. Each migration runs in
+    its own transaction together with its schema_migrations record.
+    """
+    db.create_all()
+
+    with db.engine.begin() as conn:
+        _ensure_migrations_table(conn)
+        applied = get_applied_versions(conn)
+
+    pending = [migration for migration in MIGRATIONS if migration[0] not in applied]
+    for version, description, migration in pending:
+        try:
+            with db.engine.begin() as conn:
+                migration(conn)
+                conn.execute(
+                    text("INSERT INTO schema_migrations (version, description, applied_at) "
+                         "VALUES (:version, :description, :applied_at)"),
+                    {'version': version, 'description': description, 'applied_at': datetime.utcnow()}
+                )
+            logger.info(f"Applied migration {version}: {description}")
+        except Exception as e:
+            # Another worker may have applied it concurrently
+            with db.engine.connect() as conn:
+                if version in get_applied_versions(conn):
+                    logger.info(f"Migration {version} already applied by another process")
+                    continue
+            logger.error(f"Migration {version} failed: {str(e)}")
+            raise
+
+    return [version for version, _, _ in pending]
@@ -0,0 +1,106 @@
+"""
+Socket.IO client managers for multi-worker deployments
+"""
+import os
+import time
+import pickle
+import sqlite3
+import threading
+import logging
+import socketio
+
+logger = logging.getLogger(__name__)
+
+class SQLiteManager(socketio.PubSubManager):
+    """Socket.IO pub/sub backplane on a shared SQLite file.
+
+    A stand-in for Redis when running several workers on one host (local
+    development and tests): every worker appends published events to a
+    table and polls it for events from the others. Old rows are pruned
+    after ``retention`` seconds.
+    """
+    name = 'sqlite'
+
+    def __init__(self, url='sqlite:///socketio_queue.db', channel='socketio', write_only=False,
+                 logger=None, poll_interval=0.05, retention=60):
+        self.path = url[len('sqlite:///'):] if url.startswith('sqlite:///') else url
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._local = threading.local()
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS socketio_messages ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "channel TEXT NOT NULL, "
+                "payload BLOB NOT NULL, "
+                "created_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _connection(self):
+        # One connection per thread; SQLite connections are not shared
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _publish(self, data):
+        self._connection().execute(
+            "INSERT INTO socketio_messages (channel, payload, created_at) VALUES (?, ?, ?)",
+            (self.channel, pickle.dumps(data), time.time())
+        )
+
+    def _listen(self):
+        conn = self._connect()
+        last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM socketio_messages").fetchone()[0]
+        last_prune = time.time()
+
+        while True:
+            rows = conn.execute(
+                "SELECT id, payload FROM socketio_messages WHERE id > ? AND channel = ? ORDER BY id",
+                (last_id, self.channel)
+            ).fetchall()
+            for message_id, payload in rows:
+                last_id = message_id
+                yield pickle.loads(payload)
+
+            now = time.time()
+            if now - last_prune > self.retention:
+                conn.execute("DELETE FROM socketio_messages WHERE created_at < ?", (now - self.retention,))
+                last_prune = now
+
+            self.server.sleep(self.poll_interval)
+
+
+def create_client_manager(url=None, channel=None, write_only=False):
+    """Build the Socket.IO client manager for ``SOCKETIO_MESSAGE_QUEUE``.
+
+    Without a URL the default in-process manager is used (rooms live in this
+    process only). ``sqlite:///path`` selects the file-backed stand-in;
+    redis://, rediss://, kafka:// and amqp:// URLs use the python-socketio
+    backends, which need the matching client library installed.
+    """
+    url = url if url is not None else os.getenv('SOCKETIO_MESSAGE_QUEUE', '')
+    channel = channel or os.getenv('SOCKETIO_CHANNEL', 'flask-socketio')
+    if not url:
+        return None
+
+    if url.startswith('sqlite:///'):
+        manager_class = SQLiteManager
+    elif url.startswith(('redis://', 'rediss://')):
+        manager_class = socketio.RedisManager
+    elif url.startswith('kafka://'):
+        manager_class = socketio.KafkaManager
+    elif url.startswith('zmq'):
+        manager_class = socketio.ZmqManager
+    else:
+        manager_class = socketio.KombuManager
+
+    logger.info(f"Using {manager_class.__name__} Socket.IO message queue on channel '{channel}'")
+    return manager_class(url, channel=channel, write_only=write_only)
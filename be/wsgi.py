@@ -0,0 +1,22 @@
+"""
+Production entry point.
+
+Run one single-worker server process per port and put them behind a load
+balancer, sharing rooms through SOCKETIO_MESSAGE_QUEUE, e.g.:
+
+    SOCKETIO_MESSAGE_QUEUE=redis://localhost:6379/0 gunicorn -k eventlet -w 1 -b 0.0.0.0:5000 wsgi:app
+"""
+import os
+
+# Green-thread servers must patch the standard library before anything else is imported
+async_mode = os.environ.setdefault('SOCKETIO_ASYNC_MODE', 'eventlet')
+if async_mode == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+elif async_mode.startswith('gevent'):
+    from gevent import monkey
+    monkey.patch_all()
+
+from app import create_app
+
+app, socketio = create_app()
@@ -68,14 +68,19 @@ const ChatWindow = () => {
         // Only process if it's not a user message (to avoid duplicates)
         if (data.sender !== 'user') {
           const newMessage = {
-            id: Date.now() + Math.random(),
+            id: data.messageId || Date.now() + Math.random(),
             message: data.message || data.text,
             sender: data.sender || (data.type === 'agent' ? 'agent' : 'ai'),
             timestamp: data.timestamp || new Date().toISOString(),
             confidence: data.confidence
           };
           
-          setMessages(prev => [...prev, newMessage]);
+          // A final message replaces the bubble built from its streamed deltas
+          setMessages(prev => (
+            data.messageId && prev.some(msg => msg.id === data.messageId)
+              ? prev.map(msg => (msg.id === data.messageId ? newMessage : msg))
+              : [...prev, newMessage]
+          ));
           setIsTyping(false);
           
           // Check if agent has joined
@@ -91,6 +96,26 @@ const ChatWindow = () => {
 
     socketManager.onMessage(messageHandler);
 
+    // Listen for streamed AI tokens
+    const deltaHandler = (data) => {
+      setMessages(prev => {
+        if (prev.some(msg => msg.id === data.messageId)) {
+          return prev.map(msg => (
+            msg.id === data.messageId ? { ...msg, message: msg.message + data.delta } : msg
+          ));
+        }
+        return [...prev, {
+          id: data.messageId,
+          message: data.delta,
+          sender: 'ai',
+          timestamp: new Date().toISOString()
+        }];
+      });
+      setIsTyping(false);
+    };
+
+    socketManager.onMessageDelta(deltaHandler);
+
     // Listen for typing indicators
     const typingHandler = (data) => {
       if (data.isTyping) {
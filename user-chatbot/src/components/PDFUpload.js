@@ -22,6 +22,19 @@ import {
   CheckCircle,
   Error
 } from '@mui/icons-material';
+import socketManager from '../socket';
+
+const API_URL = 'http://localhost:5000';
+const JOB_POLL_INTERVAL = 3000;
+
+const STAGE_LABELS = {
+  queued: 'Waiting to be processed',
+  extracting: 'Extracting text',
+  chunking: 'Splitting into chunks',
+  embedding: 'Indexing',
+  completed: 'Done',
+  failed: 'Failed'
+};
 
 const PDFUpload = ({ open, onClose }) => {
   const [uploading, setUploading] = useState(false);
@@ -30,6 +43,42 @@ const PDFUpload = ({ open, onClose }) => {
   const [uploadedFiles, setUploadedFiles] = useState([]);
   const [error, setError] = useState('');
 
+  // Resolves when the ingestion job completes; progress arrives over Socket.IO,
+  // with polling as a fallback when the socket is not connected
+  const waitForJob = (jobId, onProgress) => new Promise((resolve, reject) => {
+    let done = false;
+    let unwatch = () => {};
+    let timer = null;
+
+    const handleJob = (job) => {
+      if (done) return;
+      onProgress(job);
+      if (job.state === 'completed' || job.state === 'failed') {
+        done = true;
+        clearInterval(timer);
+        unwatch();
+        if (job.state === 'completed') {
+          resolve(job);
+        } else {
+          reject(new Error(job.error || 'Processing failed'));
+        }
+      }
+    };
+
+    unwatch = socketManager.watchIngestJob(jobId, handleJob);
+    timer = setInterval(async () => {
+      try {
+        const response = await fetch(`${API_URL}/api/ingest/jobs/${jobId}`);
+        if (response.ok) {
+          const data = await response.json();
+          handleJob(data.job);
+        }
+      } catch (err) {
+        console.error('Error polling ingestion job:', err);
+      }
+    }, JOB_POLL_INTERVAL);
+  });
+
   const handleFileUpload = async (event) => {
     const files = Array.from(event.target.files);
     if (files.length === 0) return;
@@ -48,9 +97,9 @@ const PDFUpload = ({ open, onClose }) => {
           throw new Error(`${file.name} is not a PDF file`);
         }
 
-        // Validate file size (max 10MB)
-        if (file.size > 10 * 1024 * 1024) {
-          throw new Error(`${file.name} is too large. Maximum size is 10MB`);
+        // Validate file size (max 100MB)
+        if (file.size > 100 * 1024 * 1024) {
+          throw new Error(`${file.name} is too large. Maximum size is 100MB`);
         }
 
         const formData = new FormData();
@@ -59,31 +108,34 @@ const PDFUpload = ({ open, onClose }) => {
         setUploadStatus(`Uploading ${file.name}...`);
         setUploadProgress((i / files.length) * 100);
 
-        const response = await fetch('http://localhost:5000/api/upload-pdf', {
+        const response = await fetch(`${API_URL}/api/upload-pdf`, {
           method: 'POST',
           body: formData,
         });
 
         if (!response.ok) {
           const errorData = await response.json();
-          throw new Error(errorData.message || 'Upload failed');
+          throw new Error(errorData.error || errorData.message || 'Upload failed');
         }
 
-        const result = await response.json();
+        // The server answers right away; extraction and indexing run as a background job
+        const { job_id: jobId } = await response.json();
+        const job = await waitForJob(jobId, (progress) => {
+          setUploadStatus(`${file.name}: ${STAGE_LABELS[progress.state] || progress.state}...`);
+          setUploadProgress(((i + progress.progress / 100) / files.length) * 100);
+        });
+
         setUploadedFiles(prev => [...prev, {
           name: file.name,
           size: file.size,
           status: 'success',
-          message: result.message
+          message: `Indexed ${job.result.chunks} chunks (${job.result.extraction_method})`
         }]);
       }
 
       setUploadProgress(100);
       setUploadStatus('All files uploaded successfully!');
       
-      // Reload PDFs to update the knowledge base
-      await reloadPDFs();
-      
     } catch (err) {
       setError(err.message);
       setUploadStatus('Upload failed');
@@ -92,26 +144,9 @@ const PDFUpload = ({ open, onClose }) => {
     }
   };
 
-  const reloadPDFs = async () => {
-    try {
-      const response = await fetch('http://localhost:5000/api/reload-pdfs', {
-        method: 'POST',
-      });
-
-      if (!response.ok) {
-        throw new Error('Failed to reload PDFs');
-      }
-
-      const result = await response.json();
-      console.log('PDFs reloaded:', result);
-    } catch (err) {
-      console.error('Error reloading PDFs:', err);
-    }
-  };
-
   const getPDFList = async () => {
     try {
-      const response = await fetch('http://localhost:5000/api/pdfs');
+      const response = await fetch(`${API_URL}/api/pdfs`);
       if (response.ok) {
         const data = await response.json();
         return data.pdfs || [];
@@ -87,7 +87,8 @@ class SocketManager {
           message: data.content,
           sender: data.role,
           timestamp: data.timestamp,
-          confidence: data.confidence
+          confidence: data.confidence,
+          messageId: data.message_id
         });
       });
       
@@ -98,6 +99,22 @@ class SocketManager {
     }
   }
 
+  onMessageDelta(callback) {
+    if (this.socket) {
+      // Remove existing listeners to prevent duplicates
+      this.socket.off('ai_message_delta');
+      
+      // Streamed AI tokens; the complete text follows in a new_message with the same message_id
+      this.socket.on('ai_message_delta', (data) => {
+        callback({
+          messageId: data.message_id,
+          delta: data.delta,
+          index: data.index
+        });
+      });
+    }
+  }
+
   onTypingIndicator(callback) {
     if (this.socket) {
       // Remove existing listeners to prevent duplicates
@@ -130,6 +147,27 @@ class SocketManager {
     }
   }
 
+  watchIngestJob(jobId, callback) {
+    if (!this.socket) {
+      return () => {};
+    }
+
+    // Progress of a PDF upload's extraction and indexing job
+    const listener = (job) => {
+      if (job.job_id === jobId) {
+        callback(job);
+      }
+    };
+    this.socket.on('ingest_progress', listener);
+    this.socket.emit('watch_ingest_job', { jobId });
+
+    return () => {
+      if (this.socket) {
+        this.socket.off('ingest_progress', listener);
+      }
+    };
+  }
+
   disconnect() {
     if (this.socket) {
       this.socket.disconnect();
@@ -141,12 +179,14 @@ class SocketManager {
   removeAllListeners() {
     if (this.socket) {
       this.socket.off('new_message');
+      this.socket.off('ai_message_delta');
       this.socket.off('ai_response');
       this.socket.off('agent_response');
       this.socket.off('escalation');
       this.socket.off('escalation_triggered');
       this.socket.off('ai_typing');
       this.socket.off('typing');
+      this.socket.off('ingest_progress');
       this.socket.off('connected');
       this.socket.off('joined_session');
     }